@@ -1,105 +1,576 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import AsyncIterator, Literal
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from app.schemas.posts import (
     CreatePost,
     UpdatePost,
     ResponsePost,
     ResponsePosts,
-    row_to_response_post,
+    ResponseBulkPosts,
+    ResponseThread,
+    row_to_post_dict,
+    rows_to_response_posts,
+    rows_to_response_thread,
+)
+from app.db.session import call_with_db, get_db, get_writer
+from app.crud import aio, follows, likes, posts, users
+from app.core.dependencies import (
+    authenticate_user,
+    get_user_cached,
+    get_post_cached,
+    is_following_author,
+    resolve_following,
+    write_and_publish,
+)
+from app.core.events import event_bus
+from app.core.conf import (
+    DEFAULT_LIMIT,
+    MAX_LIMIT,
+    SEARCH_MAX_QUERY_LENGTH,
+    BULK_TRANSACTION_SIZE,
+    BULK_MAX_POSTS,
+    ARCHIVE_BATCH_SIZE,
+    THREAD_DEFAULT_DEPTH,
+    THREAD_MAX_DEPTH,
+    THREAD_DEFAULT_BREADTH,
+    THREAD_MAX_BREADTH,
+    THREAD_MAX_NODES,
+    THREAD_MAX_ANCESTORS,
+    EVENT_HEARTBEAT_INTERVAL,
+    EVENT_RETRY_MS,
+)
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.http_cache import (
+    make_etag,
+    make_list_etag,
+    cache_headers,
+    is_not_modified,
+    not_modified,
 )
-from app.db.session import get_db
-from app.crud import posts, users
-from app.core.dependencies import authenticate_user
 
 router = APIRouter()
 
-# ==================== Create ====================
-# TODO：API仕様書からルーティングを設定する
-# ヒント：他のエンドポイントのルーティングを参考にすること
-# @router.hoge("hoge", response_model=ResponsePost)
+logger = logging.getLogger(__name__)
+
+# ==================== Pagination ====================
+def parse_cursor(cursor: str | None) -> tuple[str, int] | None:
+    """
+    クエリパラメータのカーソルを (created_at, post_id) に変換する
+
+    Raises:
+        HTTPException: カーソルが不正な場合
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, str, int)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def paginate(
+    conn,
+    user_id: int,
+    rows: list,
+    limit: int,
+    request: Request | None = None,
+) -> Response:
+    """
+    limit + 1 件取得した結果からページのレスポンスを作る
+
+    limit 件を超えていれば次ページがあるので、最後のポストから next_cursor を作る。
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["post_id"])
+    return await posts_response(conn, user_id, rows, next_cursor, request)
+
+# ==================== Response ====================
+async def posts_response(
+    conn,
+    user_id: int,
+    rows: list,
+    next_cursor: str | None = None,
+    request: Request | None = None,
+) -> Response:
+    """
+    ポスト一覧のレスポンスを作る
+
+    is_liked はページ内の全ポスト分を1回のクエリで、is_following はページ内の
+    全投稿者分をフォロー中ユーザーのキャッシュからまとめて解決する。
+    ETag は各行のバージョンから作り、request の If-None-Match と一致すれば
+    本文を作らずに 304 を返す。
+    ResponsePosts を経由せずに直接JSONにする（response_model での再検証も行われない）。
+    """
+    liked_post_ids = await aio.likes.get_liked_post_ids(
+        conn, user_id, [row["post_id"] for row in rows]
+    )
+    following_ids = await resolve_following(conn, user_id, [row["user_id"] for row in rows])
+    etag = make_list_etag([
+        (
+            row["post_id"],
+            row["version"],
+            row["user_version"],
+            row["repost_version"],
+            row["post_id"] in liked_post_ids,
+            row["user_id"] in following_ids,
+        )
+        for row in rows
+    ] + [next_cursor])
+    headers = cache_headers(etag)
+    if request is not None and is_not_modified(request, etag):
+        return not_modified(headers)
+    return JSONResponse(
+        rows_to_response_posts(rows, next_cursor, liked_post_ids, following_ids),
+        headers=headers,
+    )
+
+async def post_response(conn, user_id: int, row, request: Request | None = None) -> Response:
+    """
+    1ポストのレスポンスを作る
+
+    ETag はポスト・投稿者・リポスト元のバージョンと閲覧者ごとの状態から、
+    Last-Modified はポストと投稿者の更新日時の新しい方から作る。
+    """
+    is_liked = row["post_id"] in await aio.likes.get_liked_post_ids(conn, user_id, [row["post_id"]])
+    is_following = row["user_id"] in await resolve_following(conn, user_id, [row["user_id"]])
+    etag = make_etag(
+        "p",
+        row["post_id"],
+        row["version"],
+        row["user_version"],
+        row["repost_version"],
+        int(is_liked),
+        int(is_following),
+    )
+    last_modified = max(row["updated_at"], row["user_updated_at"])
+    headers = cache_headers(etag, last_modified)
+    if request is not None and is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    return JSONResponse(row_to_post_dict(row, is_liked, is_following), headers=headers)
+
+def load_archive_batch(
+    conn,
+    user_id: int,
+    author_id: int,
+    after: tuple[str, int] | None,
+) -> tuple[list, set[int], bool]:
+    """
+    アーカイブの1バッチ分のポストと、閲覧者から見た is_liked / is_following を読む
+
+    Returns:
+        tuple[list, set[int], bool]: ポストの行、いいねしているポストIDの集合、投稿者をフォローしているか
+    """
+    rows = posts.get_posts_by_user_id(conn, author_id, ARCHIVE_BATCH_SIZE, after)
+    liked_post_ids = likes.get_liked_post_ids(conn, user_id, [row["post_id"] for row in rows])
+    is_following = bool(rows) and author_id in follows.filter_following_ids(
+        conn, user_id, [author_id]
+    )
+    return rows, liked_post_ids, is_following
+
+async def stream_posts(
+    user_id: int,
+    author_id: int,
+    format: str,
+) -> AsyncIterator[bytes]:
+    """
+    ユーザーの投稿を ARCHIVE_BATCH_SIZE 件ずつ読み、JSON配列またはNDJSONとして順に送る
+
+    カーソルで1ページずつ読んでは送るため、件数に関係なくメモリ使用量は一定になる。
+    DB接続はバッチごとに借りて読み終えたら返すため、遅いクライアントへの送信中に
+    プールの接続を占有しない。is_liked / is_following はバッチごとにまとめて解決する。
+    """
+    if format == "json":
+        yield b"["
+    after = None
+    first = True
+    while True:
+        rows, liked_post_ids, is_following = await aio.run(
+            call_with_db, load_archive_batch, user_id, author_id, after
+        )
+        if not rows:
+            break
+        lines = [
+            json.dumps(
+                row_to_post_dict(row, row["post_id"] in liked_post_ids, is_following),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            for row in rows
+        ]
+        if format == "json":
+            chunk = ("" if first else ",") + ",".join(lines)
+        else:
+            chunk = "\n".join(lines) + "\n"
+        yield chunk.encode()
+        first = False
+        if len(rows) < ARCHIVE_BATCH_SIZE:
+            break
+        last = rows[-1]
+        after = (last["created_at"], last["post_id"])
+    if format == "json":
+        yield b"]"
+
+async def stream_events(
+    user_id: int,
+    scope: str,
+    last_event_id: int | None,
+) -> AsyncIterator[bytes]:
+    """
+    全てのワーカーで発行されたポストのイベントを Server-Sent Events として送り続ける
+
+    scope が timeline の場合は、自分とフォローしているユーザーのポストのイベントだけを送る。
+    last_event_id 以降のイベントがリングバッファに残っていれば先に送り、
+    残っていなければ reset イベントで一覧の再取得を促す。
+    送信が追いつかずキューがあふれた場合は、溜まった分を送ってから接続を閉じる
+    （クライアントは Last-Event-ID を付けて再接続すれば続きから受け取れる）。
+    """
+    async def wanted(event) -> bool:
+        return scope == "all" or await is_following_author(user_id, event.user_id)
+
+    with event_bus.subscribe() as subscription:
+        backlog = []
+        if last_event_id is not None:
+            backlog = event_bus.events_after(last_event_id)
+        yield f"retry: {EVENT_RETRY_MS}\n\n".encode()
+        if backlog is None:
+            yield f"id: {event_bus.last_event_id}\nevent: reset\ndata: {{}}\n\n".encode()
+            backlog = []
+        for event in backlog:
+            if await wanted(event):
+                yield event.encode()
+
+        while not (subscription.overflowed and subscription.queue.empty()):
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), EVENT_HEARTBEAT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                # 無通信の間もコメント行を送り、切れた接続を検出する
+                yield b": ping\n\n"
+                continue
+            if await wanted(event):
+                yield event.encode()
+
+def post_event_data(conn, post_id: int) -> dict:
+    """
+    イベントの本文にするポストを読む（書き込みジョブの中で、書き込みと同じ接続から呼ぶ）
+
+    閲覧者によらない値にするため、is_liked / is_following は常に False にする。
+    """
+    return row_to_post_dict(posts.get_post_by_id(conn, post_id))
+
+async def get_existing_post(conn, post_id: int):
+    """
+    ポストを取得する（キャッシュあり）
 
+    Raises:
+        HTTPException: ポストが存在しない場合
+    """
+    post = await get_post_cached(conn, post_id)
+    if post is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    return post
+
+# ==================== Create ====================
+@router.post("/", response_model=ResponsePost, status_code=201)
 async def create_post(
     post: CreatePost,
     conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
     """投稿を作成する"""
-    new_post_id = posts.create_post(
-        conn,
+    new_post_id = await write_and_publish(
+        writer,
+        posts.create_post,
         user_id,
         post.content,
         post.reply_to_id,
         post.repost_of_id,
+        # 返信先・リポスト元の件数が変わる
+        invalidate={"posts": [post.reply_to_id, post.repost_of_id]},
+        event=lambda conn, new_post_id: (
+            "post.created", user_id, post_event_data(conn, new_post_id)
+        ),
+    )
+    created_post = await get_post_cached(conn, new_post_id)
+    # 作成直後のポストはまだ誰にもいいねされていない
+    return JSONResponse(row_to_post_dict(created_post), status_code=201)
+
+_create_posts_adapter = TypeAdapter(list[CreatePost])
+
+def parse_bulk_body(body: bytes, content_type: str) -> list:
+    """
+    一括投稿のリクエストボディを、検証前のポストのリストに変換する
+
+    Content-Type が NDJSON（application/x-ndjson）の場合は1行1ポスト、
+    それ以外は JSON の配列として読む。
+
+    Raises:
+        HTTPException: JSONとして読めない場合
+    """
+    try:
+        if "ndjson" in content_type:
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON"
+        )
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request body must be a JSON array"
+        )
+    return items
+
+@router.post("/bulk", response_model=ResponseBulkPosts, status_code=201)
+async def create_posts_bulk(
+    request: Request,
+    conn=Depends(get_db),
+    writer=Depends(get_writer),
+    user_id: int = Depends(authenticate_user)
+):
+    """投稿をまとめて作成する（JSON配列またはNDJSON）"""
+    items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > BULK_MAX_POSTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many posts (max {BULK_MAX_POSTS})"
+        )
+    try:
+        new_posts = _create_posts_adapter.validate_python(items)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+    # 返信先・リポスト元はまとめて存在確認する
+    referenced_ids = {
+        post_id
+        for post in new_posts
+        for post_id in (post.reply_to_id, post.repost_of_id)
+        if post_id is not None
+    }
+    missing_ids = await aio.posts.find_missing_post_ids(conn, referenced_ids)
+    if missing_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Referenced posts not found: {sorted(missing_ids)}"
+        )
+
+    # BULK_TRANSACTION_SIZE 件ごとに1つの書き込みジョブにし、1つずつ順にコミットする
+    # （まとめて積むと Writer が1トランザクションにまとめ、その間ほかの書き込みが待たされる）。
+    # 途中のチャンクが失敗した場合は、それまでにコミットしたポストのIDを返す。
+    # 大量のイベントで購読者のキューがあふれるため、一括投稿は /posts/stream には配信しない。
+    rows = [(post.content, post.reply_to_id, post.repost_of_id) for post in new_posts]
+    post_ids = []
+    for start in range(0, len(rows), BULK_TRANSACTION_SIZE):
+        chunk = rows[start:start + BULK_TRANSACTION_SIZE]
+        try:
+            post_ids += await write_and_publish(
+                writer,
+                posts.create_posts_bulk,
+                user_id,
+                chunk,
+                # 返信先・リポスト元の件数が変わる
+                invalidate={"posts": list({
+                    post_id
+                    for _, reply_to_id, repost_of_id in chunk
+                    for post_id in (reply_to_id, repost_of_id)
+                })},
+            )
+        except sqlite3.Error:
+            logger.exception("bulk import failed after %d posts", len(post_ids))
+            return JSONResponse(
+                {
+                    "detail": "Failed to create posts",
+                    "post_ids": post_ids,
+                    "total_posts": len(post_ids),
+                },
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+    return JSONResponse(
+        {"post_ids": post_ids, "total_posts": len(post_ids)},
+        status_code=201,
     )
-    created_post = posts.get_post_by_id(conn, new_post_id)
-    return row_to_response_post(created_post)
 
 # ==================== Read ====================
 @router.get("/", response_model=ResponsePosts)
 async def get_timeline(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
     conn=Depends(get_db),
     user_id: int = Depends(authenticate_user)
 ):
-    """タイムラインを取得する"""
-    all_posts = posts.get_all_posts(conn)
-    return ResponsePosts(
-        posts=[row_to_response_post(p) for p in all_posts],
-        total_posts=len(all_posts),
+    """タイムライン（自分とフォローしているユーザーのポスト）を取得する"""
+    timeline_posts = await aio.posts.get_timeline_posts(conn, user_id, limit + 1, parse_cursor(cursor))
+    return await paginate(conn, user_id, timeline_posts, limit, request)
+
+@router.get("/search", response_model=ResponsePosts)
+async def search_posts(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=SEARCH_MAX_QUERY_LENGTH),
+    sort: Literal["relevance", "recent"] = "relevance",
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    conn=Depends(get_db),
+    user_id: int = Depends(authenticate_user)
+):
+    """ポストを本文で検索する"""
+    after = None
+    if cursor is not None:
+        # relevance は (score, post_id)、recent は (post_id,)
+        for types in ((float, int), (int,)):
+            try:
+                after = decode_cursor(cursor, *types)
+                break
+            except ValueError:
+                continue
+    if cursor is not None and after is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    try:
+        used_sort, hits = await aio.posts.search_post_ids(conn, q, limit + 1, after, sort)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        post_id, score = hits[-1]
+        next_cursor = (
+            encode_cursor(score, post_id) if used_sort == "relevance"
+            else encode_cursor(post_id)
+        )
+    found_posts = await aio.posts.get_posts_by_ids(conn, [post_id for post_id, _ in hits])
+    return await posts_response(conn, user_id, found_posts, next_cursor, request)
+
+@router.get("/stream")
+async def stream_timeline(
+    scope: Literal["timeline", "all"] = "timeline",
+    last_event_id: int | None = Header(None, alias="Last-Event-ID"),
+    user_id: int = Depends(authenticate_user)
+):
+    """ポストの作成・更新・削除を Server-Sent Events で受け取る"""
+    return StreamingResponse(
+        stream_events(user_id, scope, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 @router.get("/{username}/posts", response_model=ResponsePosts)
 async def get_user_posts(
+    request: Request,
     username: str,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
     conn=Depends(get_db),
     user_id: int = Depends(authenticate_user)
 ):
     """ユーザーの投稿を取得する"""
-    user = users.get_user_by_username(conn, username)
+    user = await get_user_cached(conn, username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    user_posts = posts.get_posts_by_user_id(conn, user["id"])
-    return ResponsePosts(
-        posts=[row_to_response_post(p) for p in user_posts],
-        total_posts=len(user_posts),
+    user_posts = await aio.posts.get_posts_by_user_id(
+        conn, user["id"], limit + 1, parse_cursor(cursor)
+    )
+    return await paginate(conn, user_id, user_posts, limit, request)
+
+@router.get("/{username}/archive")
+async def get_user_archive(
+    username: str,
+    format: Literal["json", "ndjson"] = "json",
+    user_id: int = Depends(authenticate_user)
+):
+    """ユーザーの全ての投稿を、新しい順にストリーミングで取得する"""
+    # Depends(get_db) の接続はレスポンスを送り終えるまで返却されないため使わない
+    user = await aio.run(call_with_db, users.get_user_by_username, username)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_posts(user_id, user["id"], format),
+        media_type=media_type,
     )
 
 @router.get("/{post_id}", response_model=ResponsePost)
 async def get_post(
+    request: Request,
     post_id: int,
     conn=Depends(get_db),
     user_id: int = Depends(authenticate_user)
 ):
     """投稿を取得する"""
-    post = posts.get_post_by_id(conn, post_id)
-    if post is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
-    return row_to_response_post(post)
+    post = await get_existing_post(conn, post_id)
+    return await post_response(conn, user_id, post, request)
 
 @router.get("/{post_id}/replies", response_model=ResponsePosts)
 async def get_post_replies(
+    request: Request,
     post_id: int,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
     conn=Depends(get_db),
     user_id: int = Depends(authenticate_user)
 ):
     """投稿への返信を取得する"""
     # 元の投稿が存在するか確認
-    original_post = posts.get_post_by_id(conn, post_id)
-    if original_post is None:
+    await get_existing_post(conn, post_id)
+
+    replies = await aio.posts.get_post_replies(conn, post_id, limit + 1, parse_cursor(cursor))
+    return await paginate(conn, user_id, replies, limit, request)
+
+@router.get("/{post_id}/thread", response_model=ResponseThread)
+async def get_post_thread(
+    post_id: int,
+    depth: int = Query(THREAD_DEFAULT_DEPTH, ge=0, le=THREAD_MAX_DEPTH),
+    breadth: int = Query(THREAD_DEFAULT_BREADTH, ge=1, le=THREAD_MAX_BREADTH),
+    format: Literal["nested", "flat"] = "nested",
+    conn=Depends(get_db),
+    user_id: int = Depends(authenticate_user)
+):
+    """投稿の会話（返信元と返信の木）を取得する"""
+    rows = await aio.posts.get_post_thread(
+        conn, post_id, depth, breadth, THREAD_MAX_NODES, THREAD_MAX_ANCESTORS
+    )
+    if not any(row["post_id"] == post_id for row in rows):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
-    
-    replies = posts.get_post_replies(conn, post_id)
-    return ResponsePosts(
-        posts=[row_to_response_post(r) for r in replies],
-        total_posts=len(replies),
+    liked_post_ids = await aio.likes.get_liked_post_ids(
+        conn, user_id, [row["post_id"] for row in rows]
     )
+    following_ids = await resolve_following(conn, user_id, [row["user_id"] for row in rows])
+    return JSONResponse(rows_to_response_thread(
+        rows, post_id, format == "nested", liked_post_ids, following_ids
+    ))
 
 # ==================== Update ====================
 @router.put("/{post_id}", response_model=ResponsePost)
@@ -107,49 +578,89 @@ async def update_post(
     post_id: int,
     post: UpdatePost,
     conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
     """投稿を更新する"""
-    # 投稿が存在するか確認
-    existing_post = posts.get_post_by_id(conn, post_id)
-    if existing_post is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
+    # 投稿が存在するか確認（投稿者は変わらないため、キャッシュの値で判定する）
+    existing_post = await get_existing_post(conn, post_id)
 
     # 自分の投稿か確認
-    if existing_post.user_id != user_id:
+    if existing_post["user_id"] != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to update this post"
         )
     
-    success = posts.update_post(conn, post_id, post.content)
+    success = await write_and_publish(
+        writer,
+        posts.update_post,
+        post_id,
+        post.content,
+        invalidate={"posts": [post_id], "reposts_of": [post_id]},
+        event=lambda conn, success: (
+            ("post.updated", user_id, post_event_data(conn, post_id)) if success else None
+        ),
+    )
     if not success:
+        # キャッシュが古く、他のワーカーで既に削除されていた場合
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update post"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
         )
     
-    updated_post = posts.get_post_by_id(conn, post_id)
-    return row_to_response_post(updated_post)
+    # 無効化した直後なので、DBから読み直した値がキャッシュされる
+    updated_post = await get_existing_post(conn, post_id)
+    return await post_response(conn, user_id, updated_post)
+
+# ==================== Likes ====================
+@router.post("/{post_id}/like", response_model=ResponsePost)
+async def like_post(
+    post_id: int,
+    conn=Depends(get_db),
+    writer=Depends(get_writer),
+    user_id: int = Depends(authenticate_user)
+):
+    """投稿にいいねする（いいね済みの場合は何もしない）"""
+    await get_existing_post(conn, post_id)
+    await write_and_publish(
+        writer, likes.like_post, user_id, post_id, invalidate={"posts": [post_id]}
+    )
+    liked_post = await get_existing_post(conn, post_id)
+    following_ids = await resolve_following(conn, user_id, [liked_post["user_id"]])
+    return JSONResponse(
+        row_to_post_dict(liked_post, True, liked_post["user_id"] in following_ids)
+    )
+
+@router.delete("/{post_id}/like", response_model=ResponsePost)
+async def unlike_post(
+    post_id: int,
+    conn=Depends(get_db),
+    writer=Depends(get_writer),
+    user_id: int = Depends(authenticate_user)
+):
+    """投稿のいいねを取り消す（いいねしていない場合は何もしない）"""
+    await get_existing_post(conn, post_id)
+    await write_and_publish(
+        writer, likes.unlike_post, user_id, post_id, invalidate={"posts": [post_id]}
+    )
+    unliked_post = await get_existing_post(conn, post_id)
+    following_ids = await resolve_following(conn, user_id, [unliked_post["user_id"]])
+    return JSONResponse(
+        row_to_post_dict(unliked_post, False, unliked_post["user_id"] in following_ids)
+    )
 
 # ==================== Delete ====================
 @router.delete("/{post_id}", status_code=204)
 async def delete_post(
     post_id: int,
     conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
     """投稿を削除する"""
     # 投稿が存在するか確認
-    existing_post = posts.get_post_by_id(conn, post_id)
-    if existing_post is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
+    existing_post = await get_existing_post(conn, post_id)
     
     # 自分の投稿か確認
     if existing_post["user_id"] != user_id:
@@ -158,11 +669,24 @@ async def delete_post(
             detail="You are not authorized to delete this post"
         )
     
-    success = posts.delete_post(conn, post_id)
+    success = await write_and_publish(
+        writer,
+        posts.delete_post,
+        post_id,
+        # 返信先・リポスト元の件数と、リポストしたポストの本文が変わる
+        invalidate={
+            "posts": [post_id, existing_post["reply_to_id"], existing_post["repost_of_id"]],
+            "reposts_of": [post_id],
+        },
+        event=lambda conn, success: (
+            ("post.deleted", user_id, {"post_id": post_id}) if success else None
+        ),
+    )
     if not success:
+        # キャッシュが古く、他のワーカーで既に削除されていた場合
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to delete post"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
         )
     
     return None  # 204 No Content
@@ -1,81 +1,257 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from app.db.session import get_db
-from app.core.dependencies import authenticate_user
-from app.schemas.users import Signup, Login, UpdateUser, UpdatePassword, ResponseUser, ResponseToken, row_to_response_user
-from app.crud import users
-from app.core.password import pwd_context
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from app.db.session import call_with_db, get_db, get_writer
+from app.core.dependencies import (
+    authenticate_user,
+    get_token_claims,
+    revoke_tokens,
+    get_user_cached,
+    write_and_publish,
+)
+from app.schemas.users import Signup, Login, UpdateUser, UpdatePassword, ResponseUser, ResponseUsers, ResponseToken, row_to_response_user
+from app.crud import aio, follows, users
+from app.core.conf import DEFAULT_LIMIT, MAX_LIMIT
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.http_cache import make_etag, cache_headers, is_not_modified, not_modified
+from app.core.password import password_hasher, PasswordHasherBusy
+from app.core.tokens import TokenClaims, issue_token
 
 router = APIRouter()
 
+def token_response(user_id: int, username: str, issued_after: int | None = None) -> ResponseToken:
+    """
+    アクセストークンを発行し、レスポンスを作る
+    """
+    token, claims = issue_token(user_id, issued_after=issued_after)
+    return ResponseToken(
+        access_token=token,
+        expires_in=claims.expires_at - claims.issued_at,
+        username=username,
+    )
+
+def password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password operations in progress",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/signup", response_model=ResponseToken, status_code=201)
 async def signup(
     user: Signup,
-    conn=Depends(get_db),
+    writer=Depends(get_writer),
 ):
     """ユーザーを新規登録する"""
     # Passwordをハッシュ化
-    hashed_password = pwd_context.hash(user.password)
-    user_id = users.create_user(conn, user.username, hashed_password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+    user_id = await writer.run_async(users.create_user, user.username, hashed_password)
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to create user"
         )
 
-    return ResponseToken(
-        username=user.username,
-    )
+    return token_response(user_id, user.username)
 
 @router.post("/login", response_model=ResponseToken)
 async def login(
     user: Login,
-    conn=Depends(get_db),
+    writer=Depends(get_writer),
 ):
     """ログインする"""
-    registered_user_pw_hash = users.get_user_password_hash_by_username(conn, user.username)
+    # bcrypt の検証中はプールの接続を持たないよう、問い合わせの間だけ借りる
+    registered_user_pw_hash = await aio.run(
+        call_with_db, users.get_user_password_hash_by_username, user.username
+    )
+    if registered_user_pw_hash is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials"
+        )
 
-    if registered_user_pw_hash is None or \
-      not pwd_context.verify(user.password, registered_user_pw_hash["password_hash"]):
+    try:
+        verified, new_hash = await password_hasher.verify_and_update(
+            user.password, registered_user_pw_hash["password_hash"]
+        )
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
-    return ResponseToken(
-        username=user.username,
-    )
+    # 古い設定のハッシュは、平文が手元にあるログイン時に作り直す
+    if new_hash is not None:
+        await writer.run_async(users.update_password, registered_user_pw_hash["id"], new_hash)
+    return token_response(registered_user_pw_hash["id"], user.username)
 
 @router.post("/logout", status_code=204)
 async def logout(
-    conn=Depends(get_db),
-    user_id: int = Depends(authenticate_user)
+    writer=Depends(get_writer),
+    claims: TokenClaims = Depends(get_token_claims)
 ):
-    """ログアウトする"""
-    pass
+    """ログアウトする（使ったアクセストークンを失効させる）"""
+    await revoke_tokens(writer, claims.user_id, claims.jti)
     
 
 @router.get("/{username}", response_model=ResponseUser)
 async def read_user_profile(
     username: str,
+    request: Request,
+    response: Response,
     conn=Depends(get_db),
     user_id: int = Depends(authenticate_user)
 ):
     """ユーザーのプロフィールを取得する"""
-    user = users.get_user_by_username(conn, username)
+    user = await get_user_cached(conn, username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    etag = make_etag("u", user["id"], user["version"])
+    headers = cache_headers(etag, user["updated_at"])
+    if is_not_modified(request, etag, user["updated_at"]):
+        return not_modified(headers)
+    response.headers.update(headers)
     return row_to_response_user(user)
 
+# ==================== Follows ====================
+async def get_target_user(conn, username: str) -> dict:
+    """
+    フォロー操作・一覧の対象ユーザーを取得する
+
+    Raises:
+        HTTPException: ユーザーが存在しない場合
+    """
+    user = await get_user_cached(conn, username)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
+
+def paginate_users(rows: list, limit: int) -> ResponseUsers:
+    """
+    limit + 1 件取得した結果から、フォロー日時のカーソル付きでページのレスポンスを作る
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["followed_at"], last["id"])
+    return ResponseUsers(
+        users=[row_to_response_user(row) for row in rows],
+        total_users=len(rows),
+        next_cursor=next_cursor,
+    )
+
+def parse_follow_cursor(cursor: str | None) -> tuple[str, int] | None:
+    """
+    クエリパラメータのカーソルを (フォロー日時, ユーザーID) に変換する
+
+    Raises:
+        HTTPException: カーソルが不正な場合
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, str, int)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def follow_invalidation(user_id: int, target: dict) -> dict:
+    """
+    フォロー・フォロー解除で無効化するキャッシュ
+
+    自分のフォロー中の集合と、両者のフォロー数・フォロワー数。
+    相手はユーザー名、自分はユーザーID（タグ）でキーを直接消す。
+    """
+    return {"following": [user_id], "usernames": [target["username"]], "users": [user_id]}
+
+@router.post("/{username}/follow", response_model=ResponseUser)
+async def follow_user(
+    username: str,
+    conn=Depends(get_db),
+    writer=Depends(get_writer),
+    user_id: int = Depends(authenticate_user)
+):
+    """ユーザーをフォローする（フォロー済みの場合は何もしない）"""
+    target = await get_target_user(conn, username)
+    if target["id"] == user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot follow yourself"
+        )
+    await write_and_publish(
+        writer, follows.follow_user, user_id, target["id"],
+        invalidate=follow_invalidation(user_id, target),
+    )
+    return row_to_response_user(await get_target_user(conn, username))
+
+@router.delete("/{username}/follow", response_model=ResponseUser)
+async def unfollow_user(
+    username: str,
+    conn=Depends(get_db),
+    writer=Depends(get_writer),
+    user_id: int = Depends(authenticate_user)
+):
+    """ユーザーのフォローを解除する（フォローしていない場合は何もしない）"""
+    target = await get_target_user(conn, username)
+    await write_and_publish(
+        writer, follows.unfollow_user, user_id, target["id"],
+        invalidate=follow_invalidation(user_id, target),
+    )
+    return row_to_response_user(await get_target_user(conn, username))
+
+@router.get("/{username}/followers", response_model=ResponseUsers)
+async def get_followers(
+    username: str,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    conn=Depends(get_db),
+    user_id: int = Depends(authenticate_user)
+):
+    """ユーザーのフォロワーを取得する"""
+    target = await get_target_user(conn, username)
+    followers = await aio.follows.get_followers(
+        conn, target["id"], limit + 1, parse_follow_cursor(cursor)
+    )
+    return paginate_users(followers, limit)
+
+@router.get("/{username}/following", response_model=ResponseUsers)
+async def get_following(
+    username: str,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    conn=Depends(get_db),
+    user_id: int = Depends(authenticate_user)
+):
+    """ユーザーがフォローしているユーザーを取得する"""
+    target = await get_target_user(conn, username)
+    following = await aio.follows.get_following(
+        conn, target["id"], limit + 1, parse_follow_cursor(cursor)
+    )
+    return paginate_users(following, limit)
+
 @router.put("/me", response_model=ResponseUser)
 async def update_user(
     user: UpdateUser,
-    conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
     """ユーザーのプロフィールを更新する"""
-    new_user = users.update_user(conn, user_id, user.username, user.biography, user.avatar_img)
+    # ポストには投稿者のユーザー名・アイコンが含まれる
+    new_user = await write_and_publish(
+        writer, users.update_user, user_id, user.username, user.biography, user.avatar_img,
+        invalidate={"users": [user_id], "posts_by_user": [user_id]},
+    )
     if new_user is None:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -83,34 +259,53 @@ async def update_user(
         )
     return row_to_response_user(new_user)
 
-@router.put("/me/password", status_code=204)
+@router.put("/me/password", response_model=ResponseToken)
 async def update_password(
     user: UpdatePassword,
-    conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
-    """ユーザーのパスワードを更新する"""
+    """ユーザーのパスワードを更新する（発行済みのトークンは失効させ、新しいトークンを返す）"""
     # Passwordをハッシュ化
-    hashed_password = pwd_context.hash(user.password)
-    success = users.update_password(conn, user_id, hashed_password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+    success = await writer.run_async(users.update_password, user_id, hashed_password)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update password"
         )
-    return None
+    # 古いパスワードで発行されたトークンを全て失効させ、呼び出し元にだけ新しいトークンを渡す
+    revoked_at = await revoke_tokens(writer, user_id)
+    user_info = await aio.run(call_with_db, users.get_user_by_id, user_id)
+    if user_info is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return token_response(user_id, user_info["username"], issued_after=revoked_at)
 
     
 @router.delete("/me", status_code=204)
 async def delete_user(
-    conn=Depends(get_db),
+    writer=Depends(get_writer),
     user_id: int = Depends(authenticate_user)
 ):
     """ユーザーを削除する"""
-    success = users.delete_user(conn, user_id)
+    # フォロー関係も削除され、相手のフォロー数・フォロワー数が変わるためユーザーは全て無効化する。
+    # 削除したユーザーのポストは取得できなくなる（投稿者との JOIN で除かれる）
+    success = await write_and_publish(
+        writer, users.delete_user, user_id,
+        invalidate=lambda deleted: {
+            "all_users": True, "posts_by_user": [user_id], "following": [user_id]
+        } if deleted else None,
+    )
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete user"
         )
-    # ログアウトする
+    # 発行済みの全てのトークンを失効させる（ログアウトする）
+    await revoke_tokens(writer, user_id)
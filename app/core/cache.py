@@ -0,0 +1,500 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+from app.core.conf import (
+    CACHE_BACKEND,
+    CACHE_REDIS_URL,
+    REDIS_KEY_PREFIX,
+    REDIS_SOCKET_TIMEOUT,
+)
+
+# redis は任意の依存。CACHE_BACKEND=redis の場合だけ必要
+try:
+    import redis
+    import redis.asyncio
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    有効期限付きのLRUキャッシュ
+
+    - 保持件数が maxsize を超えると、最も長く使われていないものから削除する
+    - 保存から ttl 秒を過ぎたものは期限切れとして扱う
+    - スレッドセーフ（スレッドプールとイベントループの両方から使える）
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize (int): 最大保持件数
+            ttl (float): 有効期限（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (有効期限, 値)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        キャッシュから値を取得する
+
+        Args:
+            key (Hashable): キー
+            default (Any, optional): 見つからない場合に返す値。デフォルトはNone。
+
+        Returns:
+            Any: キャッシュされた値。存在しないか期限切れの場合はdefault。
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        キャッシュに値を保存する
+
+        Args:
+            key (Hashable): キー
+            value (Any): 値
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """
+        キャッシュから値を削除する
+
+        Args:
+            key (Hashable): キー
+        """
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def delete_if(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        """
+        条件に一致する値をキャッシュから削除する
+
+        Args:
+            predicate (Callable[[Hashable, Any], bool]): (キー, 値) を受け取り、削除する場合にTrueを返す関数
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._invalidations += len(keys)
+
+    def clear(self) -> None:
+        """
+        キャッシュを空にする
+        """
+        with self._lock:
+            self._data.clear()
+
+    def keys(self) -> frozenset[Hashable]:
+        """
+        保持しているキーの集合を返す（期限切れでまだ削除されていないものを含む）
+
+        Returns:
+            frozenset[Hashable]: キーの集合
+        """
+        with self._lock:
+            return frozenset(self._data)
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュの統計情報を返す
+
+        Returns:
+            dict[str, int]: 保持件数・ヒット数・ミス数・追い出し数・無効化数
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+class LocalBackend:
+    """
+    TTLCache に値を保存する、ReadThroughCache のバックエンド（プロセス内）
+
+    タグ（"user:1" など）ごとに、そのタグを付けて保存したキーを覚えておき、
+    delete_tag でまとめて削除する。追い出されたキーは索引が大きくなったときに取り除く。
+    イベントループ上から使うこと。
+    """
+
+    # 他のワーカーとは共有しない（他のワーカーでの無効化は、各ワーカーで反映する必要がある）
+    shared = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Args:
+            maxsize (int): 最大保持件数
+            ttl (float): 有効期限（秒）
+        """
+        self.cache = TTLCache(maxsize, ttl)
+        # タグ -> そのタグを付けて保存したキーの集合
+        self._tags: dict[str, set[Hashable]] = {}
+        self._tagged = 0
+
+    async def get(self, key: Hashable) -> Any:
+        return self.cache.get(key)
+
+    async def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        self.cache.set(key, value)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+            self._tagged += 1
+        if self._tagged > 4 * self.cache.maxsize:
+            self._prune()
+
+    async def delete(self, *keys: Hashable) -> None:
+        for key in keys:
+            self.cache.delete(key)
+
+    async def delete_tag(self, tag: str) -> None:
+        keys = self._tags.pop(tag, ())
+        self._tagged -= len(keys)
+        for key in keys:
+            self.cache.delete(key)
+
+    async def clear(self) -> None:
+        self.cache.clear()
+        self._tags.clear()
+        self._tagged = 0
+
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
+
+    # ==================== OTHER ====================
+    def _prune(self) -> None:
+        # 追い出された・期限切れのキーを索引から取り除く
+        live = self.cache.keys()
+        tags = {}
+        for tag, keys in self._tags.items():
+            keys &= live
+            if keys:
+                tags[tag] = keys
+        self._tags = tags
+        self._tagged = sum(len(keys) for keys in tags.values())
+
+
+class RedisBackend:
+    """
+    Redis（互換サーバーを含む）に値を保存する、ReadThroughCache のバックエンド
+
+    redis.asyncio を使い、イベントループを止めずに読み書きする。
+    値は JSON で保存するため、dict・list・文字列・数値などJSONにできる値だけを扱う。
+    タグごとにキーの集合（SET）を持ち、delete_tag はその集合のキーだけを削除する
+    （名前空間全体は走査しない）。複数のワーカーで同じキャッシュを共有でき、
+    無効化も全てのワーカーに反映される。
+    Redis に接続できない場合はキャッシュなし（常にミス）として動き、例外は出さない。
+    """
+
+    # 全てのワーカーで共有する
+    shared = True
+
+    def __init__(self, url: str, namespace: str, ttl: float):
+        """
+        Args:
+            url (str): 接続先（例: "redis://localhost:6379/0"）
+            namespace (str): キーの接頭辞（例: "posts"）
+            ttl (float): 有効期限（秒）
+
+        Raises:
+            RuntimeError: redis パッケージがインストールされていない場合
+        """
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        self.client = redis.asyncio.Redis.from_url(url, socket_timeout=REDIS_SOCKET_TIMEOUT)
+        self.prefix = f"{REDIS_KEY_PREFIX}:{namespace}:"
+        self.ttl_ms = max(1, int(ttl * 1000))
+
+        # 統計情報（このプロセスの分）
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._errors = 0
+
+    async def get(self, key: Hashable) -> Any:
+        try:
+            data = await self.client.get(self._key(key))
+        except redis.RedisError as e:
+            self._error("get", e)
+            data = None
+        if data is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return json.loads(data)
+
+    async def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        name = self._key(key)
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(name, json.dumps(value), px=self.ttl_ms)
+                for tag in tags:
+                    # タグの集合は、含むキーのうち最後に保存したものと同じだけ残す
+                    pipe.sadd(self._tag(tag), name)
+                    pipe.pexpire(self._tag(tag), self.ttl_ms)
+                await pipe.execute()
+        except redis.RedisError as e:
+            self._error("set", e)
+
+    async def delete(self, *keys: Hashable) -> None:
+        if not keys:
+            return
+        try:
+            self._invalidations += await self.client.delete(*(self._key(key) for key in keys))
+        except redis.RedisError as e:
+            self._error("delete", e)
+
+    async def delete_tag(self, tag: str) -> None:
+        try:
+            names = await self.client.smembers(self._tag(tag))
+            deleted = await self.client.delete(self._tag(tag), *names)
+        except redis.RedisError as e:
+            self._error("delete_tag", e)
+            return
+        self._invalidations += max(0, deleted - 1)
+
+    async def clear(self) -> None:
+        # ユーザーの削除など、まれな操作でだけ使う
+        try:
+            names = []
+            async for name in self.client.scan_iter(match=self.prefix + "*", count=500):
+                names.append(name)
+                if len(names) >= 500:
+                    await self.client.delete(*names)
+                    names = []
+            if names:
+                await self.client.delete(*names)
+        except redis.RedisError as e:
+            self._error("clear", e)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "invalidations": self._invalidations,
+            "errors": self._errors,
+        }
+
+    # ==================== OTHER ====================
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}k:{key}"
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}t:{tag}"
+
+    def _error(self, operation: str, error: Exception) -> None:
+        self._errors += 1
+        logger.warning("cache %s failed (%s): %s", operation, self.prefix, error)
+
+
+def make_cache_backend(namespace: str, maxsize: int, ttl: float) -> LocalBackend | RedisBackend:
+    """
+    CACHE_BACKEND の設定に従ってキャッシュのバックエンドを作る
+
+    Args:
+        namespace (str): キャッシュの名前（Redis のキーの接頭辞に使う）
+        maxsize (int): 最大保持件数（プロセス内のキャッシュのみ）
+        ttl (float): 有効期限（秒）
+
+    Returns:
+        LocalBackend | RedisBackend: "redis" の場合は RedisBackend、それ以外は LocalBackend
+    """
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(CACHE_REDIS_URL, namespace, ttl)
+    return LocalBackend(maxsize, ttl)
+
+
+class _Flight:
+    """読み込み中のキー。同じキーを待つリクエストはこの結果を共有する"""
+
+    __slots__ = ("future", "invalidated")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        # 読み込み中に無効化された場合は、読んだ値をキャッシュに保存しない
+        self.invalidated = False
+
+
+class ReadThroughCache:
+    """
+    読み込み関数の前に置くキャッシュ
+
+    ミスした場合だけ loader を呼んで値を保存する。同じキーのミスが同時に
+    起きた場合は loader を1回だけ呼び、他のリクエストはその結果を待つ
+    （人気のポストの期限切れで、DBへの問い合わせが殺到するのを防ぐ）。
+    loader が None を返した場合（存在しない）は保存しない。
+    読み込み中に無効化されたキーは、読んだ値を保存しない。
+
+    値を保存するときに tags(値) のタグを付け、delete_tag でタグごとに無効化できる
+    （例: 投稿者のユーザーIDのタグで、そのユーザーのポストをまとめて消す）。
+
+    イベントループ上から使うこと（スレッドセーフではない）。
+    保存した値は呼び出し元で共有されるため、書き換えないこと。
+
+    Example:
+        post_cache = ReadThroughCache(
+            LocalBackend(10000, 30.0), tags=lambda post: [f"user:{post['user_id']}"]
+        )
+        post = await post_cache.get_or_load(post_id, lambda: load_post(post_id))
+        await post_cache.delete(post_id)
+        await post_cache.delete_tag("user:1")
+    """
+
+    def __init__(
+        self,
+        backend: LocalBackend | RedisBackend,
+        tags: Callable[[Any], Iterable[str]] | None = None,
+    ):
+        """
+        Args:
+            backend (LocalBackend | RedisBackend): 値を保存するバックエンド
+            tags (Callable[[Any], Iterable[str]] | None, optional): 値から無効化用のタグを作る関数
+        """
+        self.backend = backend
+        self.tags = tags
+        self._flights: dict[Hashable, _Flight] = {}
+
+        # 統計情報
+        self._loads = 0
+        self._coalesced = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        キャッシュから値を取得し、なければ loader で読み込んで保存する
+
+        Args:
+            key (Hashable): キー
+            loader (Callable[[], Awaitable[Any]]): 値を読み込むコルーチン関数。存在しない場合はNoneを返す
+
+        Returns:
+            Any: 値。存在しない場合はNone。
+
+        Raises:
+            Exception: loader で発生した例外（待っていたリクエストにも同じ例外を送る）
+        """
+        value = await self.backend.get(key)
+        if value is not None:
+            return value
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(flight.future)
+            except asyncio.CancelledError:
+                # 読み込んでいたリクエストが切断された場合は自分で読み込む
+                if not flight.future.cancelled():
+                    raise
+            return await self.get_or_load(key, loader)
+
+        flight = _Flight(asyncio.get_running_loop().create_future())
+        self._flights[key] = flight
+        self._loads += 1
+        try:
+            value = await loader()
+            if value is not None and not flight.invalidated:
+                tags = self.tags(value) if self.tags is not None else ()
+                await self.backend.set(key, value, tags)
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except Exception as e:
+            flight.future.set_exception(e)
+            # 待っているリクエストがいなくても警告が出ないようにする
+            flight.future.exception()
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.future.set_result(value)
+        return value
+
+    async def delete(self, *keys: Hashable) -> None:
+        """
+        キャッシュから値を削除する
+
+        Args:
+            *keys (Hashable): キー
+        """
+        for key in keys:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.invalidated = True
+        await self.backend.delete(*keys)
+
+    async def delete_tag(self, tag: str) -> None:
+        """
+        タグを付けて保存した値をまとめて削除する
+
+        読み込み中の値はタグが分からないため、全て保存しない。
+
+        Args:
+            tag (str): タグ
+        """
+        self._invalidate_flights()
+        await self.backend.delete_tag(tag)
+
+    async def clear(self) -> None:
+        """
+        キャッシュを空にする
+        """
+        self._invalidate_flights()
+        await self.backend.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュの統計情報を返す
+
+        Returns:
+            dict[str, int]: バックエンドの統計情報に、読み込み数・読み込みを待った数を加えたもの
+        """
+        return {
+            **self.backend.stats(),
+            "loads": self._loads,
+            "coalesced": self._coalesced,
+        }
+
+    # ==================== OTHER ====================
+    def _invalidate_flights(self) -> None:
+        for flight in self._flights.values():
+            flight.invalidated = True
@@ -0,0 +1,105 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# brotli は任意の依存。インストールされていない場合は gzip のみを使う
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# レスポンスの圧縮
+#
+# Accept-Encoding を見て br（brotli がある場合）→ gzip の順に選び、
+# minimum_size バイト未満の小さなレスポンスは圧縮しない。
+# StreamingResponse はチャンクごとに圧縮して送るため、全体をメモリに溜めない。
+# Server-Sent Events（text/event-stream）と、既に Content-Encoding が
+# 付いているレスポンスは圧縮しない。
+
+
+class BrotliResponder(IdentityResponder):
+    """brotli でレスポンスを圧縮する"""
+
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body)
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Accept-Encoding に応じて、レスポンスを brotli または gzip で圧縮するミドルウェア
+
+    Example:
+        app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        """
+        Args:
+            app (ASGIApp): ラップするアプリケーション
+            minimum_size (int, optional): 圧縮する最小のレスポンスサイズ（バイト）
+            gzip_level (int, optional): gzip の圧縮レベル（1〜9）
+            brotli_quality (int, optional): brotli の品質（0〜11）
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder: ASGIApp
+        if brotli is not None and _is_accepted(accepted, "br"):
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif _is_accepted(accepted, "gzip"):
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+def parse_accept_encoding(value: str) -> dict[str, float]:
+    """
+    Accept-Encoding ヘッダーを {エンコーディング: q値} に変換する
+
+    Args:
+        value (str): Accept-Encoding ヘッダーの値（例: "br;q=1.0, gzip;q=0.8, *;q=0"）
+
+    Returns:
+        dict[str, float]: エンコーディングごとのq値。q値が不正な場合は0として扱う
+    """
+    accepted = {}
+    for item in value.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def _is_accepted(accepted: dict[str, float], coding: str) -> bool:
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
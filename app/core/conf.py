@@ -1,3 +1,5 @@
+import os
+
 # config
 # データベースの名前
 DB_NAME = "sns.db"
@@ -5,3 +7,135 @@ DB_NAME = "sns.db"
 DB_BASE_PATH = "./data/"
 # デフォルトの取得件数
 DEFAULT_LIMIT = 30
+# 1回に取得できる最大件数
+MAX_LIMIT = 100
+# 検索文字列の最大長
+SEARCH_MAX_QUERY_LENGTH = 200
+# コネクションプールの最大接続数
+DB_POOL_SIZE = 8
+# コネクションプールから接続を取得する際の待ち時間の上限（秒）
+DB_POOL_TIMEOUT = 10.0
+# この秒数以上使われていない接続は、払い出し前にヘルスチェックする
+DB_POOL_PING_INTERVAL = 30.0
+# ジャーナルモード（WALでは読み込みと書き込みが互いをブロックしない）
+DB_JOURNAL_MODE = "WAL"
+# 同期モード（WALではNORMALでも整合性は保たれる）
+DB_SYNCHRONOUS = "NORMAL"
+# メモリマップI/Oに使う最大バイト数
+DB_MMAP_SIZE = 256 * 1024 * 1024
+# ページキャッシュのサイズ（負の値はKiB単位）
+DB_CACHE_SIZE = -64000
+# ロック待ちの上限（ミリ秒）
+DB_BUSY_TIMEOUT_MS = 5000
+# 書き込みスレッドが1回のコミットにまとめるジョブの最大数
+DB_WRITER_BATCH_SIZE = 64
+# ホームタイムライン（フィード）に保持するポストの最大件数
+FEED_MAX_LENGTH = 800
+# フォロワー数がこれを超えるユーザーのポストはファンアウトせず、読み込み時に取得する
+FEED_FANOUT_THRESHOLD = 10000
+# フィードが上限をこの件数だけ超えたら、古いポストを削除する
+FEED_TRIM_SLACK = 200
+# ユーザー情報キャッシュの最大件数
+USER_CACHE_SIZE = 10000
+# ユーザー情報キャッシュの有効期限（秒）
+USER_CACHE_TTL = 60.0
+# 1ポストのキャッシュの最大件数
+POST_CACHE_SIZE = 10000
+# 1ポストのキャッシュの有効期限（秒）。他のワーカーでの更新は最大でこの時間だけ反映が遅れる
+POST_CACHE_TTL = 30.0
+# ユーザー情報・ポストのキャッシュの保存先（"local": プロセス内のLRU、"redis": Redis互換サーバー）
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "local")
+# CACHE_BACKEND=redis の場合の接続先
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Redis のキーの接頭辞（同じサーバーを他の用途と共有する場合の衝突避け）
+REDIS_KEY_PREFIX = "sns"
+# Redis の応答待ちの上限（秒）。超えた場合はキャッシュなしとして扱う
+REDIS_SOCKET_TIMEOUT = 0.1
+# フォロー中ユーザーIDの集合のキャッシュの最大件数（ユーザー数）
+FOLLOWING_CACHE_SIZE = 10000
+# フォロー中ユーザーIDの集合のキャッシュの有効期限（秒）
+FOLLOWING_CACHE_TTL = 300.0
+# フォロー数がこれを超えるユーザーは集合をキャッシュせず、ページごとに問い合わせる
+FOLLOWING_CACHE_MAX_IDS = 5000
+# アクセストークンの署名鍵（環境変数 SNS_TOKEN_SECRET）。未設定の場合は TOKEN_SECRET_FILE の鍵を使う
+TOKEN_SECRET = os.environ.get("SNS_TOKEN_SECRET")
+# 署名鍵のファイル（環境変数 SNS_TOKEN_SECRET_FILE）。無ければ最初に使うときにランダムな鍵で作る
+TOKEN_SECRET_FILE = os.environ.get("SNS_TOKEN_SECRET_FILE", os.path.join(DB_BASE_PATH, "token_secret.key"))
+# アクセストークンの有効期限（秒）
+TOKEN_TTL = 24 * 60 * 60
+# 失効したトークンの一覧をDBから読み直す間隔（秒）。他のワーカーでのログアウトは最大でこの時間だけ反映が遅れる
+TOKEN_REVOCATION_REFRESH_INTERVAL = 5.0
+# bcryptのコスト（ラウンド数）。これより低いコストのハッシュはログイン時に作り直す
+BCRYPT_ROUNDS = 12
+# パスワードのハッシュ化・検証に使うスレッド数
+PASSWORD_HASH_WORKERS = 4
+# パスワードのハッシュ化・検証で、実行中と待ちを合わせた最大件数
+PASSWORD_HASH_MAX_PENDING = 64
+# 1ワーカーで同時に実行するDBクエリの最大数
+DB_MAX_CONCURRENCY = DB_POOL_SIZE
+# 一括投稿で、1つのINSERT文にまとめる行数
+BULK_INSERT_BATCH_SIZE = 500
+# 一括投稿で、1回の書き込みジョブ（トランザクション）にまとめる行数
+BULK_TRANSACTION_SIZE = 5000
+# 一括投稿で、1リクエストに含められる最大件数
+BULK_MAX_POSTS = 100000
+# これより小さいレスポンスは圧縮しない（バイト）
+COMPRESSION_MINIMUM_SIZE = 1000
+# gzip の圧縮レベル（1〜9）
+GZIP_COMPRESSLEVEL = 6
+# brotli の品質（0〜11）。brotli がインストールされている場合のみ使う
+BROTLI_QUALITY = 4
+# アーカイブのストリーミングで、1回のクエリで読むポスト数
+ARCHIVE_BATCH_SIZE = 500
+# 会話の取得で、返信を辿る深さのデフォルトと上限
+THREAD_DEFAULT_DEPTH = 5
+THREAD_MAX_DEPTH = 20
+# 会話の取得で、1ポストあたりに展開する返信数のデフォルトと上限
+THREAD_DEFAULT_BREADTH = 10
+THREAD_MAX_BREADTH = 50
+# 会話の取得で、返信の木に含めるポスト数の上限
+THREAD_MAX_NODES = 500
+# 会話の取得で、遡る返信元の数の上限
+THREAD_MAX_ANCESTORS = 100
+# 再接続時の再開（Last-Event-ID）用に保持するイベント数
+EVENT_BUFFER_SIZE = 1000
+# 1接続あたりの未送信イベントの上限。超えた接続は切断し、再接続で再開させる
+EVENT_QUEUE_SIZE = 256
+# ストリームが無通信の間に送るハートビートの間隔（秒）
+EVENT_HEARTBEAT_INTERVAL = 15.0
+# クライアントが切断後に再接続するまでの待ち時間（ミリ秒）
+EVENT_RETRY_MS = 3000
+# 他のワーカーで記録したイベント（ポストのイベント・キャッシュの無効化）をDBから取り込む間隔（秒）
+EVENT_POLL_INTERVAL = 0.25
+# eventsテーブルに残すイベント数（EVENT_BUFFER_SIZE 以上にすること）
+EVENT_RETENTION = 10000
+# 何件発行するごとに、EVENT_RETENTION より古いイベントを削除するか
+EVENT_PRUNE_INTERVAL = 1000
+# ログレベル
+LOG_LEVEL = "INFO"
+# SQLの計測（クエリ数・DB時間・スロークエリログ）を有効にするか（環境変数 SNS_DB_PROFILE_QUERIES=1 で有効）
+DB_PROFILE_QUERIES = os.environ.get("SNS_DB_PROFILE_QUERIES") == "1"
+# この時間（ミリ秒）以上かかったSQLをスロークエリとしてログに出す
+SLOW_QUERY_MS = 100.0
+# スロークエリログに EXPLAIN QUERY PLAN の結果を含めるか
+SLOW_QUERY_EXPLAIN = True
+# 1リクエストで同じSQLがこの回数以上実行されたら、N+1 の疑いとしてログに出す
+QUERY_REPEAT_WARNING = 20
+# 1リクエストあたりに保持するSQLの記録の上限
+QUERY_STATS_MAX_RECORDS = 1000
+# 複数ワーカーのメトリクスを合算するためのディレクトリ（環境変数 METRICS_DIR）。未設定の場合はワーカーごとの値を返す
+METRICS_DIR = os.environ.get("METRICS_DIR")
+# 各ワーカーがメトリクスをファイルに書き出す間隔（秒）
+METRICS_FLUSH_INTERVAL = 5.0
+# リクエストのレイテンシのヒストグラムのバケット（秒）
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# サーバーの待ち受けアドレス
+SERVER_HOST = "127.0.0.1"
+# サーバーの待ち受けポート
+SERVER_PORT = 8000
+# ワーカープロセス数（デフォルトはCPUコア数）
+SERVER_WORKERS = os.cpu_count() or 1
+# 停止・再起動時に、処理中のリクエストの完了を待つ時間の上限（秒）
+SERVER_GRACEFUL_TIMEOUT = 30
+# 親プロセスでマイグレーション済みであることをワーカーに伝える（ランチャーが設定する）
+DB_INIT_DONE = os.environ.get("SNS_DB_INIT_DONE") == "1"
@@ -1,28 +1,415 @@
-from fastapi import Header, Depends, HTTPException, status
-from app.crud import users
-from app.db.session import get_db
+import json
+import time
+from typing import Any, Callable
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from app.crud import aio, events, follows, tokens
+from app.db.session import call_with_db
+from app.core.cache import TTLCache, ReadThroughCache, make_cache_backend
+from app.core.events import CACHE_INVALIDATE, event_bus
+from app.core.tokens import InvalidToken, TokenClaims, revocations, verify_token
+from app.core.conf import (
+    TOKEN_TTL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    POST_CACHE_SIZE,
+    POST_CACHE_TTL,
+    FOLLOWING_CACHE_SIZE,
+    FOLLOWING_CACHE_TTL,
+    FOLLOWING_CACHE_MAX_IDS,
+    EVENT_BUFFER_SIZE,
+)
 
-async def authenticate_user(
-    user_name: str = Header(..., alias="User-name"),
-    conn = Depends(get_db)
-) -> int:
+# キャッシュはワーカーごとに持つ（CACHE_BACKEND=redis の場合、user_cache と post_cache は共有）。
+# 書き込み時の無効化は write_and_publish の invalidate で eventsテーブルに記録し、全てのワーカーで反映する。
+
+# ユーザー名 -> ユーザーの公開情報 のキャッシュ
+# プロフィール・フォロー一覧のたびにDBを引かないようにする。プロフィールの更新・削除時に無効化すること。
+# "user:<ID>" のタグを付け、ユーザーIDでも無効化できるようにする。
+user_cache = ReadThroughCache(
+    make_cache_backend("users", USER_CACHE_SIZE, USER_CACHE_TTL),
+    tags=lambda user: [f"user:{user['id']}"],
+)
+
+# ポストID -> ポスト（get_post_by_id の行）のキャッシュ
+# 閲覧者によらない値だけを持つ（is_liked / is_following はレスポンスを作るときに解決する）。
+# ポストの更新・削除、いいね、返信・リポストの作成、投稿者のプロフィールの更新時に無効化すること。
+# 投稿者の "user:<ID>" と、リポストの場合はリポスト元の "repost_of:<ID>" のタグを付ける。
+post_cache = ReadThroughCache(
+    make_cache_backend("posts", POST_CACHE_SIZE, POST_CACHE_TTL),
+    tags=lambda post: [f"user:{post['user_id']}"] + (
+        [f"repost_of:{post['repost_of_id']}"] if post["repost_of_id"] is not None else []
+    ),
+)
+
+# ユーザーID -> フォローしているユーザーIDの集合 のキャッシュ
+# 一覧の is_following を解決するたびにDBを引かないようにする。
+# フォロー・フォロー解除時に無効化すること。
+following_cache = TTLCache(FOLLOWING_CACHE_SIZE, FOLLOWING_CACHE_TTL)
+
+# フォロー数が FOLLOWING_CACHE_MAX_IDS を超え、集合をキャッシュしないユーザーの印
+_TOO_MANY_FOLLOWING = object()
+
+async def get_user_cached(conn, username: str) -> dict | None:
     """
-    リクエストヘッダーからユーザーを認証し、user_idを返す
-    
+    ユーザー名でユーザーの公開情報を取得する（キャッシュあり）
+
     Args:
-        user_name: User_name ヘッダーの値
         conn: データベース接続
-    
+        username: ユーザー名
+
     Returns:
-        int: ユーザーID
-    
+        dict | None: ユーザーの公開情報。存在しない場合はNone。
+    """
+    async def load() -> dict | None:
+        row = await aio.users.get_user_by_username(conn, username)
+        return None if row is None else dict(row)
+
+    return await user_cache.get_or_load(username, load)
+
+async def invalidate_user(user_id: int) -> None:
+    """
+    ユーザーのキャッシュを無効化する
+
+    Args:
+        user_id: ユーザーID
+    """
+    await user_cache.delete_tag(f"user:{user_id}")
+
+async def get_post_cached(conn, post_id: int) -> dict | None:
+    """
+    IDでポストを取得する（キャッシュあり）
+
+    Args:
+        conn: データベース接続
+        post_id: ポストID
+
+    Returns:
+        dict | None: ポスト。存在しない場合はNone。
+    """
+    async def load() -> dict | None:
+        row = await aio.posts.get_post_by_id(conn, post_id)
+        return None if row is None else dict(row)
+
+    return await post_cache.get_or_load(post_id, load)
+
+async def invalidate_posts(*post_ids: int | None) -> None:
+    """
+    ポストのキャッシュを無効化する
+
+    Args:
+        *post_ids: ポストID（None は無視する）
+    """
+    await post_cache.delete(*(post_id for post_id in post_ids if post_id is not None))
+
+async def invalidate_posts_by_user(user_id: int) -> None:
+    """
+    ユーザーのポストのキャッシュを無効化する
+
+    ポストには投稿者のユーザー名・アイコンが含まれるため、プロフィールの更新・削除時に呼ぶ。
+
+    Args:
+        user_id: ユーザーID
+    """
+    await post_cache.delete_tag(f"user:{user_id}")
+
+async def invalidate_reposts(post_id: int) -> None:
+    """
+    post_id をリポストしたポストのキャッシュを無効化する
+
+    リポストにはリポスト元の本文が含まれるため、リポスト元の更新・削除時に呼ぶ。
+
+    Args:
+        post_id: リポスト元のポストID
+    """
+    await post_cache.delete_tag(f"repost_of:{post_id}")
+
+async def resolve_following(conn, user_id: int, author_ids: list[int]) -> set[int]:
+    """
+    ユーザーIDのうち、user_id がフォローしているものを返す（キャッシュあり）
+
+    フォローしているユーザーIDの集合をキャッシュし、ページ内の全ての投稿者を
+    まとめて判定する。フォロー数が多いユーザーは集合を持たず、
+    ページの投稿者だけを1回のクエリで問い合わせる。
+
+    Args:
+        conn: データベース接続
+        user_id: ユーザーID
+        author_ids: 調べるユーザーIDのリスト
+
+    Returns:
+        set[int]: author_ids のうち、フォローしているユーザーIDの集合
+    """
+    following = following_cache.get(user_id)
+    if following is None:
+        following = await aio.run(load_following, conn, user_id)
+    if following is _TOO_MANY_FOLLOWING:
+        return await aio.follows.filter_following_ids(conn, user_id, list(set(author_ids)))
+    return following.intersection(author_ids)
+
+def load_following(conn, user_id: int) -> frozenset[int] | object:
+    """
+    フォローしているユーザーIDの集合をDBから読み、キャッシュに入れる
+
+    同期関数のため、スレッドプール（aio.run）から呼ぶ。
+
+    Args:
+        conn: データベース接続
+        user_id: ユーザーID
+
+    Returns:
+        frozenset[int] | object: フォローしているユーザーIDの集合。
+            フォロー数が FOLLOWING_CACHE_MAX_IDS を超える場合は _TOO_MANY_FOLLOWING。
+    """
+    following = follows.get_following_ids(conn, user_id, FOLLOWING_CACHE_MAX_IDS + 1)
+    if len(following) > FOLLOWING_CACHE_MAX_IDS:
+        following = _TOO_MANY_FOLLOWING
+    else:
+        following = frozenset(following)
+    following_cache.set(user_id, following)
+    return following
+
+def _is_following(conn, user_id: int, author_id: int) -> bool:
+    """
+    user_id が author_id をフォローしているかをDBで調べる（is_following_author から呼ぶ）
+
+    フォロー数が多すぎると分かっているユーザーは、集合を読まずに1件だけ問い合わせる。
+    """
+    following = following_cache.get(user_id)
+    if following is None:
+        following = load_following(conn, user_id)
+    if following is _TOO_MANY_FOLLOWING:
+        return bool(follows.filter_following_ids(conn, user_id, [author_id]))
+    return author_id in following
+
+async def is_following_author(user_id: int, author_id: int) -> bool:
+    """
+    user_id が author_id のポストをタイムラインで見るかどうか（自分自身またはフォロー中）
+
+    キャッシュにない場合だけ、スレッドプール上でDB接続を一時的に借りて問い合わせる
+    （プールの空きを待つ間もイベントループを止めない）。
+    接続を持たない長時間のストリームから使う。
+
+    Args:
+        user_id: ユーザーID
+        author_id: 投稿者のユーザーID
+
+    Returns:
+        bool: 自分自身またはフォローしている場合はTrue
+    """
+    if author_id == user_id:
+        return True
+    following = following_cache.get(user_id)
+    if isinstance(following, frozenset):
+        return author_id in following
+    return await aio.run(call_with_db, _is_following, user_id, author_id)
+
+def invalidate_following(user_id: int) -> None:
+    """
+    フォローしているユーザーIDの集合のキャッシュを無効化する
+
+    Args:
+        user_id: ユーザーID
+    """
+    following_cache.delete(user_id)
+
+# Authorization: Bearer <token> を読む。ヘッダーが無い場合のエラーは自前で返す
+_bearer = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def get_token_claims(
+    credentials: HTTPAuthorizationCredentials | None = Depends(_bearer),
+) -> TokenClaims:
+    """
+    Authorization ヘッダーのアクセストークンを検証し、中身を返す
+
+    署名・有効期限・失効の確認はメモリ上で行い、DBには触れない。
+
+    Args:
+        credentials: Authorization ヘッダーの値
+
+    Returns:
+        TokenClaims: トークンの中身
+
     Raises:
-        HTTPException: ユーザーが見つからない場合
-    """
-    user = users.get_user_by_username(conn, user_name)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
-    return user["id"]
+        HTTPException: トークンが無い・正しくない・失効している場合
+    """
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    try:
+        claims = verify_token(credentials.credentials)
+    except InvalidToken:
+        raise _unauthorized("Invalid token")
+    if revocations.is_revoked(claims):
+        raise _unauthorized("Token revoked")
+    return claims
+
+async def authenticate_user(claims: TokenClaims = Depends(get_token_claims)) -> int:
+    """
+    アクセストークンからユーザーを認証し、user_idを返す
+
+    Args:
+        claims: 検証済みのトークンの中身
+
+    Returns:
+        int: ユーザーID
+    """
+    return claims.user_id
+
+async def revoke_tokens(writer, user_id: int, jti: str | None = None) -> int:
+    """
+    アクセストークンを失効させる
+
+    DBに記録してから、このワーカーの失効一覧に加える。
+    他のワーカーには refresh_revocations で反映される。
+
+    Args:
+        writer: 書き込みスレッド
+        user_id: ユーザーID
+        jti: トークンのID。Noneの場合はユーザーの今までに発行した全てのトークン
+
+    Returns:
+        int: 失効させた日時（UNIX秒）
+    """
+    revoked_at = int(time.time())
+    expires_at = revoked_at + TOKEN_TTL
+    await writer.run_async(tokens.revoke_token, user_id, jti, revoked_at, expires_at)
+    revocations.add(user_id, jti, revoked_at, expires_at)
+    return revoked_at
+
+async def refresh_revocations() -> None:
+    """
+    他のワーカーで失効させたトークンをDBから取り込む（前回からの差分のみ）
+
+    接続の取得も問い合わせもスレッドプールで行い、イベントループを止めない。
+    """
+    rows = await aio.run(call_with_db, tokens.get_revoked_tokens, revocations.last_id)
+    revocations.apply(rows)
+
+def _normalize_invalidation(invalidate: dict) -> dict | None:
+    """
+    空の項目と None を除く。何も無効化しない場合は None
+    """
+    invalidate = {
+        key: [value for value in values if value is not None]
+        if isinstance(values, list) else values
+        for key, values in invalidate.items()
+    }
+    return {key: values for key, values in invalidate.items() if values} or None
+
+def _write_with_events(
+    conn,
+    fn: Callable[..., Any],
+    args: tuple,
+    invalidate: dict | Callable | None,
+    event: Callable | None,
+) -> Any:
+    """
+    書き込みジョブの本体。fn を実行し、同じトランザクションで無効化とイベントを記録する
+    """
+    result = fn(conn, *args)
+    if callable(invalidate):
+        invalidate = invalidate(result)
+    if invalidate:
+        invalidate = _normalize_invalidation(invalidate)
+    if invalidate:
+        payload = json.dumps(invalidate, separators=(",", ":"))
+        events.insert_event(conn, CACHE_INVALIDATE, 0, payload)
+    if event is not None:
+        recorded = event(conn, result)
+        if recorded is not None:
+            type, user_id, data = recorded
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            events.insert_event(conn, type, user_id, payload)
+    return result
+
+async def write_and_publish(
+    writer,
+    fn: Callable[..., Any],
+    *args,
+    invalidate: dict | Callable[[Any], dict | None] | None = None,
+    event: Callable[[Any, Any], tuple[str, int, Any] | None] | None = None,
+) -> Any:
+    """
+    書き込みジョブを実行し、同じジョブ（同じトランザクション）でキャッシュの無効化と
+    ポストのイベントを記録する
+
+    書き込みと記録は一緒にコミットされるため、データだけが変わって無効化やイベントが
+    残らないということはない。コミット後に refresh_events を呼び、このワーカーの
+    キャッシュと購読者にはすぐ反映する。他のワーカーには refresh_events の定期実行で反映される。
+
+    Args:
+        writer: 書き込みスレッド
+        fn: 第1引数に接続を受け取る crud 関数
+        *args: fn に渡す引数
+        invalidate: 無効化するキャッシュ（apply_invalidation の引数と同じ形）。
+            書き込みの結果で決まる場合は、invalidate(fn の戻り値) でそれを返す関数
+            （書き込みスレッド上で呼ばれる。None を返した場合は記録しない）。
+        event: event(conn, fn の戻り値) で (種類, 投稿者のユーザーID, 本文) を返す関数。
+            書き込みスレッド上で呼ばれる。None を返した場合は記録しない。
+
+    Returns:
+        Any: fn の戻り値
+    """
+    if invalidate and not callable(invalidate):
+        invalidate = _normalize_invalidation(invalidate)
+    result = await writer.run_async(_write_with_events, fn, args, invalidate, event)
+    if invalidate or (event is not None and event_bus.has_subscribers):
+        await refresh_events()
+    return result
+
+async def apply_invalidation(invalidate: dict) -> None:
+    """
+    このワーカーのキャッシュを無効化する
+
+    Args:
+        invalidate: 次のキーを持つ dict（全て省略可）
+            posts: ポストID（None は無視する）
+            reposts_of: リポスト元のポストID（そのリポストを無効化する）
+            posts_by_user: ユーザーID（そのユーザーのポストを無効化する）
+            users: ユーザーID
+            usernames: ユーザー名
+            following: フォローしているユーザーIDの集合を無効化するユーザーID
+            all_users: True の場合はユーザーのキャッシュを全て無効化する
+    """
+    await invalidate_posts(*invalidate.get("posts", ()))
+    for post_id in invalidate.get("reposts_of", ()):
+        await invalidate_reposts(post_id)
+    for user_id in invalidate.get("posts_by_user", ()):
+        await invalidate_posts_by_user(user_id)
+    if invalidate.get("all_users"):
+        await user_cache.clear()
+    else:
+        await user_cache.delete(*invalidate.get("usernames", ()))
+        for user_id in invalidate.get("users", ()):
+            await invalidate_user(user_id)
+    for user_id in invalidate.get("following", ()):
+        invalidate_following(user_id)
+
+async def refresh_events() -> None:
+    """
+    全てのワーカーで記録されたイベントをDBから取り込む（前回からの差分のみ）
+
+    ポストのイベントはこのワーカーの購読者に配り、キャッシュの無効化はこのワーカーの
+    キャッシュに反映する。接続の取得も問い合わせもスレッドプールで行い、イベントループを止めない。
+    差分が EVENT_BUFFER_SIZE 件を超える場合は新しい方だけを読む。読まなかった無効化が
+    あり得るため、このワーカーだけが持つキャッシュは全て捨てる（購読者は再接続で reset を受け取る）。
+    """
+    rows = await aio.run(
+        call_with_db, events.get_events_after, event_bus.last_event_id, EVENT_BUFFER_SIZE
+    )
+    new_rows, gap = event_bus.apply(rows)
+    if gap:
+        for cache in (user_cache, post_cache):
+            if not cache.backend.shared:
+                await cache.clear()
+        following_cache.clear()
+    for row in new_rows:
+        if row["type"] == CACHE_INVALIDATE:
+            await apply_invalidation(json.loads(row["data"]))
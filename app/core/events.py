@@ -0,0 +1,212 @@
+import asyncio
+from collections import deque
+from typing import Iterable
+from app.core.conf import EVENT_BUFFER_SIZE, EVENT_QUEUE_SIZE
+
+# ワーカー内の Pub/Sub
+#
+# ポストの作成・更新・削除のイベントは eventsテーブルに記録し（全ワーカーで共通のID）、
+# 各ワーカーがDBから読んだイベントをこのバスで購読者（SSE の接続）に配る。
+# 同じテーブルにはキャッシュの無効化（CACHE_INVALIDATE）も記録する。これは購読者には配らず、
+# 読んだワーカーが自分のキャッシュに反映する。
+# DBとのやり取りは app.core.dependencies（write_and_publish / refresh_events）で行う。
+# 配ったイベントは直近 EVENT_BUFFER_SIZE 件をリングバッファに残し、
+# 再接続したクライアントが Last-Event-ID 以降を取りこぼさずに受け取れるようにする。
+# イベントループ上からのみ使うこと（スレッドセーフではない）。
+
+# キャッシュの無効化を表すイベントの種類（SSE では送らない）
+CACHE_INVALIDATE = "cache.invalidate"
+
+
+class Event:
+    """
+    発行されたイベント
+
+    本文のJSONは発行時に1回だけ作り、全ての購読者で共有する。
+    """
+
+    __slots__ = ("id", "type", "user_id", "data")
+
+    def __init__(self, id: int, type: str, user_id: int, data: str):
+        self.id = id
+        self.type = type
+        # イベントの対象ポストの投稿者（購読者ごとの絞り込みに使う）
+        self.user_id = user_id
+        self.data = data
+
+    def encode(self) -> bytes:
+        """
+        Server-Sent Events の形式に変換する
+
+        Returns:
+            bytes: "id: ...\\nevent: ...\\ndata: ...\\n\\n"
+        """
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n".encode()
+
+
+class Subscription:
+    """
+    1つの購読（1接続）
+
+    キューがあふれた場合（クライアントの受信が追いつかない場合）は overflowed を立てて
+    配信を止める。接続を切られたクライアントは Last-Event-ID で再開できる。
+    """
+
+    def __init__(self, bus: "EventBus"):
+        self._bus = bus
+        self.queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=bus.queue_size)
+        self.overflowed = False
+
+    def offer(self, event: Event) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self) -> None:
+        """購読をやめる"""
+        self._bus._subscribers.discard(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class EventBus:
+    """
+    イベントの配信と購読
+
+    Example:
+        bus.apply(rows)  # eventsテーブルから読んだ行
+
+        with bus.subscribe() as subscription:
+            event = await subscription.queue.get()
+    """
+
+    def __init__(self, buffer_size: int, queue_size: int):
+        """
+        Args:
+            buffer_size (int): 再開用に保持するイベント数
+            queue_size (int): 購読者ごとの未送信イベントの上限
+        """
+        self.queue_size = queue_size
+        self._buffer: deque[Event] = deque(maxlen=buffer_size)
+        self._last_id = 0
+        # このIDより後であれば、リングバッファから取りこぼしなく再開できる
+        self._resumable_after = 0
+        self._subscribers: set[Subscription] = set()
+
+        # 統計情報
+        self._received = 0
+        self._overflows = 0
+
+    @property
+    def last_event_id(self) -> int:
+        """最後に配信したイベントのID。未配信の場合は0"""
+        return self._last_id
+
+    @property
+    def has_subscribers(self) -> bool:
+        """購読者がいるか"""
+        return bool(self._subscribers)
+
+    def apply(self, rows: Iterable) -> tuple[list, bool]:
+        """
+        eventsテーブルから読んだイベントのうち、まだ読んでいないものを購読者に配る
+
+        IDが飛んでいる場合（取り込みが追いつかず、間のイベントを読まなかった場合）は、
+        取りこぼしたまま配信を続けないよう、購読中の接続を全て切って再接続させる。
+        CACHE_INVALIDATE のイベントは配らず、戻り値で呼び出し元に返す。
+
+        Args:
+            rows (Iterable): (id, type, user_id, data) の行。ID順
+
+        Returns:
+            tuple[list, bool]: まだ読んでいなかった行と、IDが飛んでいたかどうか
+        """
+        new_rows = []
+        gap = False
+        for row in rows:
+            if row["id"] <= self._last_id:
+                continue
+            if row["id"] > self._last_id + 1:
+                # 初回（起動時）に読んだ行より前からは再開できない
+                self._buffer.clear()
+                self._resumable_after = row["id"] - 1
+                if self._last_id:
+                    gap = True
+                    for subscription in self._subscribers:
+                        if not subscription.overflowed:
+                            subscription.overflowed = True
+                            self._overflows += 1
+            new_rows.append(row)
+            self._last_id = row["id"]
+            if row["type"] == CACHE_INVALIDATE:
+                continue
+            event = Event(row["id"], row["type"], row["user_id"], row["data"])
+            if len(self._buffer) == self._buffer.maxlen:
+                self._resumable_after = self._buffer[0].id
+            self._buffer.append(event)
+            self._received += 1
+            for subscription in self._subscribers:
+                was_overflowed = subscription.overflowed
+                subscription.offer(event)
+                if subscription.overflowed and not was_overflowed:
+                    self._overflows += 1
+        return new_rows, gap
+
+    def subscribe(self) -> Subscription:
+        """
+        購読を開始する
+
+        配信側は全ての購読者のキューに積むだけで、購読者ごとの絞り込みは受信側で行う。
+
+        Returns:
+            Subscription: 購読
+        """
+        subscription = Subscription(self)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def events_after(self, last_event_id: int) -> list[Event] | None:
+        """
+        指定したIDより後のイベントをリングバッファから取得する
+
+        Args:
+            last_event_id (int): クライアントが最後に受け取ったイベントID
+
+        Returns:
+            list[Event] | None: イベントのリスト。バッファから既に消えていて
+                取りこぼしなく再開できない場合はNone。
+        """
+        last = self.last_event_id
+        if last_event_id > last:
+            # DBを作り直したなどでIDが巻き戻っている
+            return None
+        if last_event_id == last:
+            return []
+        if last_event_id < self._resumable_after:
+            return None
+        return [event for event in self._buffer if event.id > last_event_id]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Pub/Sub の統計情報を返す
+
+        Returns:
+            dict[str, int]: 購読者数、配信数、キューあふれによる切断数など
+        """
+        return {
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._buffer),
+            "received": self._received,
+            "overflows": self._overflows,
+            "last_event_id": self.last_event_id,
+        }
+
+
+event_bus = EventBus(EVENT_BUFFER_SIZE, EVENT_QUEUE_SIZE)
@@ -0,0 +1,129 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+# HTTPキャッシュ（条件付きGET）
+#
+# レスポンスに弱いETag・Last-Modified・Cache-Control を付け、
+# クライアントが If-None-Match / If-Modified-Since で再検証してきた場合は、
+# 本文を作る前に 304 Not Modified を返す。
+# ETag は行のバージョン（posts.version / users.version）から作るため、
+# 本文をシリアライズしてハッシュを取る必要がない。
+#
+# Example:
+#     headers = cache_headers(etag, last_modified)
+#     if is_not_modified(request, etag, last_modified):
+#         return not_modified(headers)
+#     return JSONResponse(body, headers=headers)
+
+# 認証ユーザーごとに内容が変わるため共有キャッシュには置かせず、毎回再検証させる
+CACHE_CONTROL = "private, no-cache"
+# レスポンスが閲覧者によって変わることを示す
+VARY = "Authorization"
+
+def make_etag(*parts: object) -> str:
+    """
+    値の並びから弱いETagを作る
+
+    Args:
+        *parts: ETagに含める値（ID・バージョンなど）。Noneは空文字列になる。
+
+    Returns:
+        str: 弱いETag（例: make_etag("p", 1, 2, 0, None, 0, 0) → W/"p-1-2-0--0-0"）
+    """
+    return 'W/"' + "-".join("" if part is None else str(part) for part in parts) + '"'
+
+def make_list_etag(items: list[tuple]) -> str:
+    """
+    一覧の各行のバージョン情報から弱いETagを作る
+
+    Args:
+        items (list[tuple]): 行ごとの (ID, バージョン, ...) のリスト
+
+    Returns:
+        str: 弱いETag（ダイジェストの16進文字列）
+    """
+    digest = hashlib.blake2b(repr(items).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+def to_http_date(value: str) -> str:
+    """
+    SQLiteの日時文字列（UTC）をHTTPの日付形式に変換する
+
+    Args:
+        value (str): SQLiteの日時文字列（例: "2024-01-01 12:00:00"）
+
+    Returns:
+        str: HTTPの日付形式（例: "Mon, 01 Jan 2024 12:00:00 GMT"）
+    """
+    parsed = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    return format_datetime(parsed, usegmt=True)
+
+def cache_headers(etag: str, last_modified: str | None = None) -> dict[str, str]:
+    """
+    キャッシュ関連のレスポンスヘッダーを作る
+
+    Args:
+        etag (str): ETag
+        last_modified (str | None, optional): SQLiteの日時文字列（最終更新日時）
+
+    Returns:
+        dict[str, str]: レスポンスヘッダー
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY}
+    if last_modified is not None:
+        headers["Last-Modified"] = to_http_date(last_modified)
+    return headers
+
+def is_not_modified(
+    request: Request,
+    etag: str,
+    last_modified: str | None = None,
+) -> bool:
+    """
+    条件付きリクエストに対して 304 を返せるか判定する
+
+    If-None-Match がある場合はそれだけで判定し（弱い比較）、
+    無い場合のみ If-Modified-Since を秒単位で比較する。
+
+    Args:
+        request (Request): リクエスト
+        etag (str): 現在のETag
+        last_modified (str | None, optional): SQLiteの日時文字列（最終更新日時）
+
+    Returns:
+        bool: クライアントのキャッシュが最新であればTrue
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = etag.removeprefix("W/")
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == current:
+                return True
+        return False
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    modified = datetime.fromisoformat(last_modified).replace(tzinfo=timezone.utc)
+    return modified.replace(microsecond=0) <= since
+
+def not_modified(headers: dict[str, str]) -> Response:
+    """
+    304 Not Modified のレスポンスを作る
+
+    Args:
+        headers (dict[str, str]): cache_headers() で作ったヘッダー
+
+    Returns:
+        Response: 本文なしのレスポンス
+    """
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,28 @@
+import logging
+from app.core.conf import LOG_LEVEL
+
+# ログの設定
+#
+# app 以下のロガー（logging.getLogger(__name__)）の出力先を標準エラーにする。
+# ルートロガーには触れないため、uvicorn のログ設定とは干渉しない。
+
+
+def setup_logging(level: str = LOG_LEVEL) -> None:
+    """
+    app のロガーにハンドラーとレベルを設定する
+
+    既に設定済みの場合は何もしない。
+
+    Args:
+        level (str, optional): ログレベル。デフォルトはLOG_LEVEL。
+    """
+    logger = logging.getLogger("app")
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
@@ -0,0 +1,404 @@
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.conf import METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_LATENCY_BUCKETS
+
+# メトリクス（Prometheus のテキスト形式）
+#
+# 値はワーカープロセスごとにメモリ上で集計する。更新はイベントループ上
+# （ミドルウェア）からのみ行うため、ロックは取らない。
+# 複数のワーカーで動かす場合は、各ワーカーが自分の値を directory/<pid>.json に
+# 定期的に書き出し、/metrics を受けたワーカーが全てのファイルを合算して返す。
+# 終了したワーカーのカウンター・ヒストグラムは合算に残し、ゲージは捨てる。
+#
+# Example:
+#     requests = registry.counter("requests_total", "リクエスト数", ("method",))
+#     requests.inc(("GET",))
+#     text = registry.expose()
+
+# ヒストグラムのデフォルトのバケット（秒）
+DEFAULT_BUCKETS = METRICS_LATENCY_BUCKETS
+
+# テキスト形式のレスポンスの Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric:
+    """メトリクスの基底クラス"""
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        """
+        Args:
+            name (str): メトリクス名
+            help (str): 説明
+            labelnames (tuple[str, ...], optional): ラベル名
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        # ラベル値のタプル -> 値
+        self._values: dict[tuple, object] = {}
+
+    def snapshot(self) -> list:
+        """書き出し用に [ラベル値のリスト, 値] のリストを返す"""
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    """単調に増える値"""
+
+    type = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """増減する値"""
+
+    type = "gauge"
+
+    def set(self, labels: tuple, value: float) -> None:
+        self._values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """
+    値の分布
+
+    ラベルごとに [バケットごとの件数..., +Infの件数, 合計, 件数] を持つ。
+    バケットの件数は累積せずに持ち、出力時に累積する。
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels: tuple, value: float) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+
+class Registry:
+    """
+    メトリクスと、スクレイプ時に値を集めるコレクターの登録先
+    """
+
+    def __init__(self, directory: str | None = None, flush_interval: float = 5.0):
+        """
+        Args:
+            directory (str | None, optional): 複数ワーカーの値を合算するためのディレクトリ。
+                Noneの場合はこのプロセスの値だけを返す
+            flush_interval (float, optional): 値をファイルに書き出す最短の間隔（秒）
+        """
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], Iterable[Metric]]] = []
+        self._last_flush = 0.0
+
+    # ==================== Register ====================
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        """
+        スクレイプ時に呼ばれ、その時点の値を持つメトリクスを返す関数を登録する
+
+        Args:
+            collector (Callable[[], Iterable[Metric]]): メトリクスを返す関数
+        """
+        self._collectors.append(collector)
+
+    def register_stats(
+        self,
+        prefix: str,
+        stats: Callable[[], dict[str, int]],
+        help: str,
+        counters: Iterable[str] = (),
+    ) -> None:
+        """
+        stats() の辞書をそのままメトリクスとして公開する
+
+        キーごとに "<prefix>_<キー>" のゲージ（counters に含まれるキーは
+        "<prefix>_<キー>_total" のカウンター）になる。
+
+        Args:
+            prefix (str): メトリクス名の接頭辞（例: "db_pool"）
+            stats (Callable[[], dict[str, int]]): 統計情報を返す関数（例: pool.stats）
+            help (str): 説明
+            counters (Iterable[str], optional): 単調に増えるキー
+
+        Example:
+            registry.register_stats("db_pool", db.pool.stats, "コネクションプール",
+                                    counters=("checkouts", "waits"))
+        """
+        counters = frozenset(counters)
+
+        def collect() -> Iterable[Metric]:
+            for key, value in stats().items():
+                if key in counters:
+                    metric: Metric = Counter(f"{prefix}_{key}_total", f"{help}: {key}")
+                else:
+                    metric = Gauge(f"{prefix}_{key}", f"{help}: {key}")
+                metric._values[()] = value
+                yield metric
+
+        self.register_collector(collect)
+
+    # ==================== Expose ====================
+    def collect(self) -> list[Metric]:
+        """このプロセスの全てのメトリクス（コレクターの値を含む）を返す"""
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def maybe_flush(self) -> None:
+        """前回の書き出しから flush_interval 秒以上経っていれば、値をファイルに書き出す"""
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self) -> None:
+        """このプロセスの値を directory/<pid>.json に書き出す"""
+        if self.directory is None:
+            return
+        data = {
+            metric.name: {
+                "type": metric.type,
+                "help": metric.help,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "values": metric.snapshot(),
+            }
+            for metric in self.collect()
+        }
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        # 読み込み側が書きかけのファイルを読まないように置き換える
+        os.replace(tmp_path, path)
+
+    def expose(self) -> str:
+        """
+        全てのワーカーの値を合算し、Prometheus のテキスト形式で返す
+
+        Returns:
+            str: テキスト形式のメトリクス
+        """
+        if self.directory is None:
+            families = {}
+            for metric in self.collect():
+                _merge(families, metric.name, metric.type, metric.help,
+                       metric.labelnames, getattr(metric, "buckets", ()), metric.snapshot())
+            return _render(families)
+
+        self.flush()
+        self._last_flush = time.monotonic()
+        families: dict[str, dict] = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                pid = int(filename[:-5])
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+            except (ValueError, OSError):
+                continue
+            alive = _is_alive(pid)
+            for name, family in data.items():
+                # 終了したワーカーのゲージ（実行中の件数など）は意味を持たない
+                if family["type"] == "gauge" and not alive:
+                    continue
+                _merge(families, name, family["type"], family["help"],
+                       tuple(family["labelnames"]), tuple(family["buckets"]), family["values"])
+        return _render(families)
+
+    # ==================== OTHER ====================
+    def _register(self, metric: Metric):
+        # 同じ名前・同じ種類で登録済みの場合は、既存のメトリクスを返す
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"metric already registered: {metric.name}")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのリクエスト数・レイテンシ・実行中のリクエスト数を記録するミドルウェア
+
+    ルートのラベルには実際のパスではなくパスのテンプレート（例: "/posts/{post_id}"）を使う。
+    どのルートにも一致しなかったリクエストは "unmatched" にまとめる。
+
+    Example:
+        app.add_middleware(MetricsMiddleware, registry=registry)
+    """
+
+    def __init__(self, app: ASGIApp, registry: Registry):
+        """
+        Args:
+            app (ASGIApp): ラップするアプリケーション
+            registry (Registry): 記録先
+        """
+        self.app = app
+        self.registry = registry
+        self.requests = registry.counter(
+            "http_requests_total", "リクエスト数", ("method", "route", "status")
+        )
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "レスポンスを返し終えるまでの時間",
+            ("method", "route"),
+        )
+        self.in_progress = registry.gauge(
+            "http_requests_in_progress", "処理中のリクエスト数", ("method",)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started = time.perf_counter()
+        self.in_progress.inc((method,))
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.in_progress.dec((method,))
+            self.requests.inc((method, path, str(status_code)))
+            self.duration.observe((method, path), time.perf_counter() - started)
+            self.registry.maybe_flush()
+
+
+def _merge(
+    families: dict[str, dict],
+    name: str,
+    type: str,
+    help: str,
+    labelnames: tuple,
+    buckets: tuple,
+    values: list,
+) -> None:
+    family = families.setdefault(name, {
+        "type": type, "help": help, "labelnames": labelnames, "buckets": buckets, "values": {},
+    })
+    merged = family["values"]
+    for labels, value in values:
+        key = tuple(labels)
+        if type == "histogram":
+            current = merged.get(key)
+            merged[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            merged[key] = merged.get(key, 0) + value
+
+
+def _render(families: dict[str, dict]) -> str:
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {_escape_help(family['help'])}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        labelnames = family["labelnames"]
+        for labels, value in sorted(family["values"].items()):
+            pairs = list(zip(labelnames, labels))
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*family["buckets"], math.inf), value):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(pairs)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _escape_label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def _is_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry(METRICS_DIR, METRICS_FLUSH_INTERVAL)
@@ -0,0 +1,48 @@
+import base64
+import json
+
+# カーソル（キーセット）ページネーション
+#
+# 次ページの取得位置を「最後に返した行の並び替えキー」で表し、
+# クライアントには中身を意識させない不透明な文字列として渡す。
+# OFFSET と違い、何ページ目でも取得コストは先頭ページと変わらない。
+
+def encode_cursor(*values: str | int | float) -> str:
+    """
+    並び替えキーをカーソル文字列にエンコードする
+
+    Args:
+        *values: 最後に返した行の並び替えキー（例: created_at, post_id）
+
+    Returns:
+        str: URLセーフなカーソル文字列
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """
+    カーソル文字列を並び替えキーにデコードする
+
+    Args:
+        cursor (str): encode_cursor() で作成したカーソル文字列
+        *types: 各キーに期待する型
+
+    Returns:
+        tuple: 並び替えキーのタプル
+
+    Raises:
+        ValueError: カーソルが不正な場合
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        # bool は int のサブクラスなので明示的に弾く
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return tuple(values)
@@ -1,3 +1,172 @@
-from passlib.context import CryptContext
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable
+from app.core.conf import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
\ No newline at end of file
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+@functools.cache
+def get_pwd_context() -> "CryptContext":
+    """
+    passlib のコンテキストを返す
+
+    passlib の import と bcrypt のバックエンドの読み込みには数十ミリ秒かかるため、
+    import 時ではなく最初に使うときに作る。
+    BCRYPT_ROUNDS より低いコストで作られたハッシュは、ログイン時に作り直す対象になる。
+
+    Returns:
+        CryptContext: bcrypt のコンテキスト
+    """
+    from passlib.context import CryptContext
+
+    context = CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+    )
+    # バックエンドを読み込んでおき、最初のハッシュ計算が遅くならないようにする
+    context.handler().get_backend()
+    return context
+
+
+class PasswordHasherBusy(Exception):
+    """ハッシュ計算の待ちが上限に達している場合のエラー"""
+
+
+class PasswordHasher:
+    """
+    パスワードのハッシュ化・検証を専用のスレッドプールで実行する
+
+    bcrypt は1回に数十〜数百ミリ秒かかるため、イベントループ上で直接呼ぶと
+    その間ほかのリクエストが全て止まる。bcrypt は計算中に GIL を解放するので、
+    スレッドプールに逃がせばイベントループを止めずに並列に計算できる。
+    待ちが max_pending を超えた場合は、キューを伸ばさずに PasswordHasherBusy を送出する。
+    """
+
+    def __init__(
+        self,
+        context_factory: Callable[[], "CryptContext"],
+        workers: int,
+        max_pending: int,
+    ):
+        """
+        Args:
+            context_factory (Callable[[], CryptContext]): passlib のコンテキストを返す関数。
+                最初のハッシュ計算のときに呼ばれる
+            workers (int): ハッシュ計算に使うスレッド数
+            max_pending (int): 実行中と待ちを合わせた最大件数
+        """
+        self._context_factory = context_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # 統計情報
+        self._completed = 0
+        self._rejected = 0
+        self._max_pending_seen = 0
+
+    async def hash(self, password: str) -> str:
+        """
+        パスワードをハッシュ化する
+
+        Args:
+            password (str): 平文のパスワード
+
+        Returns:
+            str: パスワードハッシュ
+
+        Raises:
+            PasswordHasherBusy: 待ちが上限に達している場合
+        """
+        # コンテキストの初回作成もイベントループではなくスレッドプール上で行う
+        return await self._run(lambda: self.context.hash(password))
+
+    async def verify_and_update(
+        self,
+        password: str,
+        password_hash: str,
+    ) -> tuple[bool, str | None]:
+        """
+        パスワードを検証し、必要であれば新しい設定で作り直したハッシュを返す
+
+        Args:
+            password (str): 平文のパスワード
+            password_hash (str): 保存されているパスワードハッシュ
+
+        Returns:
+            tuple[bool, str | None]: (検証結果, 作り直したハッシュ。不要な場合はNone)
+
+        Raises:
+            PasswordHasherBusy: 待ちが上限に達している場合
+        """
+        return await self._run(
+            lambda: self.context.verify_and_update(password, password_hash)
+        )
+
+    @property
+    def context(self) -> "CryptContext":
+        """passlib のコンテキスト"""
+        return self._context_factory()
+
+    def warm_up(self) -> None:
+        """
+        コンテキストをスレッドプール上で作っておく
+
+        起動を待たせずに、最初のログインまでに passlib を読み込み終えるために使う。
+        """
+        self._executor.submit(self._context_factory)
+
+    def close(self) -> None:
+        """実行中のハッシュ計算の完了を待ってから、スレッドプールを止める"""
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict[str, int]:
+        """
+        ハッシュ計算の統計情報を返す
+
+        Returns:
+            dict[str, int]: 実行中・待ち件数、完了数、拒否数など
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": min(self._pending, self.workers),
+                "queue_depth": max(self._pending - self.workers, 0),
+                "max_pending": self.max_pending,
+                "max_pending_seen": self._max_pending_seen,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy("Too many pending password operations")
+            self._pending += 1
+            self._max_pending_seen = max(self._max_pending_seen, self._pending)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, _) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+
+password_hasher = PasswordHasher(
+    get_pwd_context,
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,91 @@
+import logging
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.db.profiling import QueryStats, query_stats
+
+# リクエストごとのSQLの集計
+#
+# リクエストの間だけ QueryStats を ContextVar に置き、そのリクエストで実行した
+# SQL の件数と合計時間を Server-Timing ヘッダーで返す。
+# crud の呼び出しはスレッドプール（app.crud.aio）や書き込みスレッド（Writer）で
+# 実行されるが、どちらもコンテキストを引き継ぐため同じ QueryStats に集計される。
+#
+# Example:
+#     Server-Timing: db;dur=3.42;desc="7 queries", app;dur=5.10
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """
+    リクエストごとにSQLを集計し、Server-Timing ヘッダーを付けるミドルウェア
+
+    同じ文が repeat_warning 回以上実行されたリクエストは N+1 の疑いとしてログに出す。
+    レスポンスヘッダーを送った後（ストリーミング中など）に実行された SQL は
+    ヘッダーには含まれず、ログにのみ反映される。
+
+    Example:
+        app.add_middleware(QueryProfilingMiddleware, repeat_warning=20)
+    """
+
+    def __init__(self, app: ASGIApp, repeat_warning: int = 20):
+        """
+        Args:
+            app (ASGIApp): ラップするアプリケーション
+            repeat_warning (int, optional): N+1 の疑いとしてログに出す実行回数
+        """
+        self.app = app
+        self.repeat_warning = repeat_warning
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(stats, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+            self._log(scope, stats, time.perf_counter() - started)
+
+    def _log(self, scope: Scope, stats: QueryStats, elapsed: float) -> None:
+        path = f"{scope['method']} {scope['path']}"
+        for sql, count in stats.repeated(self.repeat_warning):
+            logger.warning("possible N+1: ran %d times in %s: %s", count, path, sql)
+        if logger.isEnabledFor(logging.DEBUG):
+            callers = ", ".join(
+                f"{caller} x{int(item['count'])} {item['duration_ms']:.1f}ms"
+                for caller, item in stats.by_caller().items()
+            )
+            logger.debug(
+                "%s: %d queries, db %.1f ms, total %.1f ms (%s)",
+                path, stats.count, stats.total * 1000, elapsed * 1000, callers,
+            )
+
+
+def server_timing(stats: QueryStats, elapsed: float) -> str:
+    """
+    Server-Timing ヘッダーの値を作る
+
+    Args:
+        stats (QueryStats): リクエストのSQLの集計
+        elapsed (float): リクエストの開始からの経過秒数
+
+    Returns:
+        str: ヘッダーの値（例: 'db;dur=3.42;desc="7 queries", app;dur=5.10'）
+    """
+    return (
+        f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries", '
+        f"app;dur={elapsed * 1000:.2f}"
+    )
@@ -0,0 +1,227 @@
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Iterable, NamedTuple
+from app.core.conf import TOKEN_SECRET, TOKEN_SECRET_FILE, TOKEN_TTL
+
+# アクセストークン
+#
+# JWT（HS256）形式の署名付きトークン。ユーザーID（sub）・発行日時（iat）・
+# 有効期限（exp）・トークンID（jti）を持ち、署名と有効期限の確認だけで
+# 認証できる（DBを引かない）。ログアウト・ユーザー削除で失効させたトークンは
+# RevocationList で弾く。
+#
+# Example:
+#     token, claims = issue_token(user_id)
+#     claims = verify_token(token)    # InvalidToken
+#     if revocations.is_revoked(claims): ...
+
+# 受け付けるヘッダーは1種類だけ（alg の差し替えによる署名の回避を防ぐ）
+_HEADER = base64.urlsafe_b64encode(
+    json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode()
+).rstrip(b"=")
+
+
+class InvalidToken(Exception):
+    """トークンの形式・署名・有効期限のいずれかが正しくない"""
+
+
+class TokenClaims(NamedTuple):
+    """トークンの中身"""
+
+    user_id: int
+    jti: str
+    issued_at: int
+    expires_at: int
+
+
+@functools.cache
+def get_secret() -> bytes:
+    """
+    署名鍵を取得する
+
+    TOKEN_SECRET が設定されていればそれを、無ければ TOKEN_SECRET_FILE の内容を使う。
+    ファイルが無い場合はランダムな鍵で作る。複数のワーカーが同時に作ろうとしても、
+    最初に作られた1つの鍵を全員が使う。
+
+    Returns:
+        bytes: 署名鍵
+    """
+    if TOKEN_SECRET:
+        return TOKEN_SECRET.encode()
+    try:
+        with open(TOKEN_SECRET_FILE, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(TOKEN_SECRET_FILE) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{TOKEN_SECRET_FILE}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_hex(32).encode())
+    try:
+        # 書き終えたファイルを置くので、他のワーカーが書きかけの鍵を読むことはない
+        os.link(tmp, TOKEN_SECRET_FILE)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(TOKEN_SECRET_FILE, "rb") as f:
+        return f.read().strip()
+
+
+def issue_token(
+    user_id: int,
+    ttl: int = TOKEN_TTL,
+    issued_after: int | None = None,
+) -> tuple[str, TokenClaims]:
+    """
+    アクセストークンを発行する
+
+    Args:
+        user_id (int): ユーザーID
+        ttl (int, optional): 有効期限（秒）
+        issued_after (int | None, optional): 発行日時をこの時刻（UNIX秒）より後にする。
+            全てのトークンを失効させた直後に発行する場合に、失効日時を渡す
+            （失効は秒単位のため、同じ秒に発行したトークンも失効扱いになる）
+
+    Returns:
+        tuple[str, TokenClaims]: トークンと、その中身
+    """
+    now = int(time.time())
+    if issued_after is not None:
+        now = max(now, issued_after + 1)
+    claims = TokenClaims(user_id, secrets.token_urlsafe(16), now, now + ttl)
+    payload = json.dumps(
+        {"sub": str(user_id), "jti": claims.jti, "iat": claims.issued_at, "exp": claims.expires_at},
+        separators=(",", ":"),
+    ).encode()
+    signing_input = _HEADER + b"." + base64.urlsafe_b64encode(payload).rstrip(b"=")
+    return (signing_input + b"." + _sign(signing_input)).decode(), claims
+
+
+def verify_token(token: str) -> TokenClaims:
+    """
+    アクセストークンの署名と有効期限を確認し、中身を返す
+
+    失効しているかどうかは確認しない（RevocationList.is_revoked を使う）。
+
+    Args:
+        token (str): トークン
+
+    Returns:
+        TokenClaims: トークンの中身
+
+    Raises:
+        InvalidToken: 形式・署名が正しくないか、有効期限を過ぎている場合
+    """
+    try:
+        header, payload, signature = token.encode("ascii").split(b".")
+    except (UnicodeEncodeError, ValueError):
+        raise InvalidToken("malformed token")
+    if not hmac.compare_digest(header, _HEADER):
+        raise InvalidToken("unsupported header")
+    if not hmac.compare_digest(signature, _sign(header + b"." + payload)):
+        raise InvalidToken("bad signature")
+    try:
+        data = json.loads(base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)))
+        claims = TokenClaims(int(data["sub"]), str(data["jti"]), int(data["iat"]), int(data["exp"]))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken("malformed payload")
+    if claims.expires_at <= time.time():
+        raise InvalidToken("token expired")
+    return claims
+
+
+def _sign(signing_input: bytes) -> bytes:
+    digest = hmac.new(get_secret(), signing_input, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=")
+
+
+class RevocationList:
+    """
+    失効したトークンの一覧（メモリ上）
+
+    トークンIDごとの失効と、ユーザーごとの「この日時以前に発行された全てのトークン」の
+    失効を持つ。有効期限を過ぎたトークンは verify_token で弾かれるため、記録も
+    期限が過ぎたら捨てる。このワーカーで失効させたものは add で即座に、他のワーカーで
+    失効させたものは DB の revoked_tokens を apply で取り込んだときに反映される。
+    """
+
+    def __init__(self):
+        # jti -> 記録が不要になる日時
+        self._jtis: dict[str, int] = {}
+        # user_id -> (失効させた日時, 記録が不要になる日時)
+        self._users: dict[int, tuple[int, int]] = {}
+        # 取り込み済みの revoked_tokens の最大のID
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims: TokenClaims) -> bool:
+        """
+        トークンが失効しているかどうか
+
+        Args:
+            claims (TokenClaims): verify_token で確認したトークンの中身
+
+        Returns:
+            bool: 失効している場合はTrue
+        """
+        if claims.jti in self._jtis:
+            return True
+        revoked = self._users.get(claims.user_id)
+        return revoked is not None and claims.issued_at <= revoked[0]
+
+    def add(self, user_id: int, jti: str | None, revoked_at: int, expires_at: int) -> None:
+        """
+        失効を記録する
+
+        Args:
+            user_id (int): トークンのユーザーID
+            jti (str | None): トークンのID。Noneの場合は revoked_at 以前に発行された user_id の全てのトークン
+            revoked_at (int): 失効させた日時（UNIX秒）
+            expires_at (int): 記録が不要になる日時（UNIX秒）
+        """
+        with self._lock:
+            if jti is not None:
+                self._jtis[jti] = expires_at
+                return
+            current = self._users.get(user_id)
+            if current is None or current[0] < revoked_at:
+                self._users[user_id] = (revoked_at, expires_at)
+
+    def apply(self, rows: Iterable) -> None:
+        """
+        DB から読んだ失効の記録を取り込み、期限が過ぎた記録を捨てる
+
+        Args:
+            rows (Iterable): crud.tokens.get_revoked_tokens の結果
+        """
+        for row in rows:
+            self.add(row["user_id"], row["jti"], row["revoked_at"], row["expires_at"])
+            self.last_id = max(self.last_id, row["id"])
+        now = time.time()
+        with self._lock:
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp >= now}
+            self._users = {
+                user_id: item for user_id, item in self._users.items() if item[1] >= now
+            }
+
+    def stats(self) -> dict[str, int]:
+        """
+        統計情報を返す
+
+        Returns:
+            dict[str, int]: 失効中のトークン数・ユーザー数
+        """
+        return {"tokens": len(self._jtis), "users": len(self._users)}
+
+
+revocations = RevocationList()
@@ -1,5 +1,10 @@
 from .users import *
 from .posts import *
+from .feeds import *
+from .follows import *
+from .likes import *
+from .tokens import *
+from .events import *
 
 __all__ = [
     "create_user",
@@ -9,9 +14,32 @@ __all__ = [
     "update_user",
     "delete_user",
     "create_post",
+    "create_posts_bulk",
+    "find_missing_post_ids",
     "get_all_posts",
+    "get_timeline_posts",
     "get_post_by_id",
+    "get_posts_by_ids",
     "get_posts_by_user_id",
+    "get_post_thread",
+    "search_post_ids",
     "update_post",
     "delete_post",
+    "fan_out_post",
+    "fan_out_posts",
+    "backfill_feed",
+    "trim_feeds",
+    "follow_user",
+    "unfollow_user",
+    "get_following_ids",
+    "filter_following_ids",
+    "get_following",
+    "get_followers",
+    "like_post",
+    "unlike_post",
+    "get_liked_post_ids",
+    "revoke_token",
+    "get_revoked_tokens",
+    "insert_event",
+    "get_events_after",
 ]
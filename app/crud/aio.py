@@ -0,0 +1,67 @@
+import functools
+from types import ModuleType
+from typing import Any, Callable
+import anyio
+import anyio.to_thread
+from app.core.conf import DB_MAX_CONCURRENCY
+from . import events, feeds, follows, likes, posts, tokens, users
+
+# app.crud の非同期版
+#
+# crud 関数は sqlite3 を同期的に呼ぶため、async def のエンドポイントから直接呼ぶと
+# クエリの間イベントループ（= ワーカー全体）が止まる。
+# ここでは同じ関数をスレッドプール上で実行し、await できる形で公開する。
+# 同時に実行するクエリ数は DB_MAX_CONCURRENCY で制限する。
+#
+# Example:
+#     from app.crud import aio
+#     post = await aio.posts.get_post_by_id(conn, post_id)
+
+_limiter = anyio.CapacityLimiter(DB_MAX_CONCURRENCY)
+
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    同期関数をスレッドプールで実行し、結果を待つ
+
+    Args:
+        fn (Callable[..., Any]): 実行する関数
+        *args: fn に渡す引数
+        **kwargs: fn に渡すキーワード引数
+
+    Returns:
+        Any: fn の戻り値
+    """
+    return await anyio.to_thread.run_sync(
+        functools.partial(fn, *args, **kwargs), limiter=_limiter
+    )
+
+
+class AsyncModule:
+    """
+    crud モジュールの関数を、同じ名前・同じ引数の非同期関数として公開する
+    """
+
+    def __init__(self, module: ModuleType):
+        self._module = module
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await run(attr, *args, **kwargs)
+
+        # 次回以降は __getattr__ を通らないようにキャッシュする
+        setattr(self, name, wrapper)
+        return wrapper
+
+
+posts = AsyncModule(posts)
+users = AsyncModule(users)
+feeds = AsyncModule(feeds)
+follows = AsyncModule(follows)
+likes = AsyncModule(likes)
+tokens = AsyncModule(tokens)
+events = AsyncModule(events)
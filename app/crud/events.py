@@ -0,0 +1,67 @@
+import sqlite3
+from app.core.conf import EVENT_RETENTION, EVENT_PRUNE_INTERVAL
+
+# eventsテーブルに対するCRUD操作
+
+# ==================== Create ====================
+def insert_event(
+    conn: sqlite3.Connection,
+    type: str,
+    user_id: int,
+    data: str,
+) -> int:
+    """
+    ポストのイベントを記録する
+
+    EVENT_PRUNE_INTERVAL 件ごとに、直近 EVENT_RETENTION 件より古いイベントをまとめて削除する。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        type (str): イベントの種類（例: "post.created"）
+        user_id (int): 対象ポストの投稿者のユーザーID
+        data (str): 本文のJSON
+
+    Returns:
+        int: イベントID（全ワーカーで共通の連番）
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO events (type, user_id, data) VALUES (?, ?, ?)",
+        (type, user_id, data),
+    )
+    event_id = cursor.lastrowid
+    if event_id % EVENT_PRUNE_INTERVAL == 0:
+        cursor.execute("DELETE FROM events WHERE id <= ?", (event_id - EVENT_RETENTION,))
+    conn.commit()
+    return event_id
+
+# ==================== Read ====================
+def get_events_after(
+    conn: sqlite3.Connection,
+    after_id: int,
+    limit: int,
+) -> list[sqlite3.Row]:
+    """
+    after_id より後のイベントのうち、新しい limit 件を取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        after_id (int): 前回までに取得した最大のID（初回は0）
+        limit (int): 取得件数の上限
+
+    Returns:
+        list[sqlite3.Row]: イベントのリスト（id, type, user_id, data）。ID順
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, type, user_id, data
+        FROM (
+            SELECT id, type, user_id, data
+            FROM events
+            WHERE id > ?
+            ORDER BY id DESC
+            LIMIT ?
+        )
+        ORDER BY id
+    """, (after_id, limit))
+    return cursor.fetchall()
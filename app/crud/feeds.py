@@ -0,0 +1,240 @@
+import sqlite3
+from typing import Iterable
+from app.core.conf import FEED_MAX_LENGTH, FEED_FANOUT_THRESHOLD, FEED_TRIM_SLACK
+
+# feedsテーブル（ホームタイムライン）に対するCRUD操作
+#
+# ポスト作成時に、投稿者自身とフォロワーのフィードへポストIDを書き込む（ファンアウト）。
+# フォロワー数が FEED_FANOUT_THRESHOLD を超えるユーザーのポストはフォロワーには書き込まず、
+# pull_postsテーブルに記録してタイムライン読み込み時に取得する（ハイブリッド方式）。
+# どちらにするかは投稿時に決め、後でフォロワー数が変わってもポストの扱いは変えない。
+#
+# フィードの件数は feed_lengthsテーブルで数え、上限を FEED_TRIM_SLACK 件超えたユーザーの
+# フィードだけ古いポストを削除する。削除では件数を減らさないため実際より多いことがあるが、
+# trim_feeds で実際の件数に数え直す。
+
+# ==================== Create ====================
+def fan_out_post(
+    conn: sqlite3.Connection,
+    post_id: int,
+) -> int:
+    """
+    ポストを投稿者自身とフォロワーのフィードに追加する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_id (int): ポストID
+
+    Returns:
+        int: 追加したフィードの件数
+    """
+    return fan_out_posts(conn, [post_id])
+
+def fan_out_posts(
+    conn: sqlite3.Connection,
+    post_ids: list[int],
+) -> int:
+    """
+    複数のポストをまとめて投稿者自身とフォロワーのフィードに追加する
+
+    フォロワー数が FEED_FANOUT_THRESHOLD を超える投稿者のポストは、フォロワーのフィードではなく
+    pull_posts に追加する。件数が上限を超えたフィードは古いポストを削除する。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_ids (list[int]): ポストIDのリスト
+
+    Returns:
+        int: 追加したフィードの件数
+    """
+    if not post_ids:
+        return 0
+    placeholders = ", ".join("?" * len(post_ids))
+    recipients = f"""
+        SELECT p.user_id, p.id, p.created_at
+        FROM posts p
+        WHERE p.id IN ({placeholders})
+        UNION ALL
+        SELECT f.follower_id, p.id, p.created_at
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        JOIN follows f ON f.following_id = p.user_id
+        WHERE p.id IN ({placeholders}) AND u.follower_count <= ?
+    """
+    params = (*post_ids, *post_ids, FEED_FANOUT_THRESHOLD)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO feeds (user_id, post_id, created_at)
+        {recipients}
+    """, params)
+    inserted = cursor.rowcount
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO pull_posts (user_id, post_id, created_at)
+        SELECT p.user_id, p.id, p.created_at
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE p.id IN ({placeholders}) AND u.follower_count > ?
+    """, (*post_ids, FEED_FANOUT_THRESHOLD))
+    # 書き込んだユーザーのフィードの件数を増やし、上限を超えたものだけ削除する
+    cursor.execute(f"""
+        INSERT INTO feed_lengths (user_id, length)
+        SELECT user_id, COUNT(*) FROM ({recipients}) GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET length = length + excluded.length
+        RETURNING user_id, length
+    """, params)
+    trim_feeds(conn, [
+        user_id for user_id, length in cursor.fetchall()
+        if length > FEED_MAX_LENGTH + FEED_TRIM_SLACK
+    ])
+    return inserted
+
+def backfill_feed(
+    conn: sqlite3.Connection,
+    user_id: int,
+    author_id: int,
+) -> None:
+    """
+    フォローしたユーザーの最近のポストをフィードに追加する
+
+    ファンアウトしなかったポスト（pull_posts にあるもの）は読み込み時に取得するため追加しない。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): フィードの持ち主のユーザーID
+        author_id (int): フォローしたユーザーのID
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO feeds (user_id, post_id, created_at)
+        SELECT ?, p.id, p.created_at
+        FROM posts p
+        WHERE p.user_id = ?
+          AND NOT EXISTS (
+              SELECT 1 FROM pull_posts pp
+              WHERE pp.user_id = p.user_id AND pp.created_at = p.created_at AND pp.post_id = p.id
+          )
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT ?
+    """, (user_id, author_id, FEED_MAX_LENGTH))
+    added = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO feed_lengths (user_id, length) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET length = length + excluded.length
+        RETURNING length
+    """, (user_id, added))
+    if cursor.fetchone()[0] > FEED_MAX_LENGTH + FEED_TRIM_SLACK:
+        trim_feeds(conn, [user_id])
+
+# ==================== Read ====================
+def get_pull_author_ids(
+    conn: sqlite3.Connection,
+    user_id: int,
+) -> list[int]:
+    """
+    フォローしているユーザーのうち、ファンアウトしなかったポストがあるユーザーのIDを取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+
+    Returns:
+        list[int]: ユーザーIDのリスト
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT f.following_id
+        FROM follows f
+        WHERE f.follower_id = ?
+          AND EXISTS (SELECT 1 FROM pull_posts pp WHERE pp.user_id = f.following_id)
+    """, (user_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+# ==================== Delete ====================
+def remove_post_from_feeds(
+    conn: sqlite3.Connection,
+    post_id: int,
+) -> None:
+    """
+    ポストを全てのフィードから削除する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_id (int): ポストID
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM feeds WHERE post_id = ?", (post_id,))
+
+def remove_author_from_feed(
+    conn: sqlite3.Connection,
+    user_id: int,
+    author_id: int,
+) -> None:
+    """
+    フォローを解除したユーザーのポストをフィードから削除する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): フィードの持ち主のユーザーID
+        author_id (int): フォローを解除したユーザーのID
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM feeds
+        WHERE user_id = ? AND post_id IN (
+            SELECT f.post_id
+            FROM feeds f
+            JOIN posts p ON f.post_id = p.id
+            WHERE f.user_id = ? AND p.user_id = ?
+        )
+    """, (user_id, user_id, author_id))
+
+def trim_feeds(
+    conn: sqlite3.Connection,
+    user_ids: Iterable[int] | None = None,
+    max_length: int = FEED_MAX_LENGTH,
+) -> int:
+    """
+    ユーザーのフィードから、新しい順に max_length 件を超えた古いポストを削除する
+
+    ユーザーごとに主キー (user_id, created_at, post_id) を新しい方から
+    max_length 件だけ辿り、それより古い行を削除する（テーブル全体は走査しない）。
+    feed_lengths の件数も実際の件数に合わせる。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_ids (Iterable[int] | None, optional): 対象のユーザーID。Noneの場合はフィードを持つ全てのユーザー
+        max_length (int, optional): 1ユーザーあたりの最大件数。デフォルトはFEED_MAX_LENGTH。
+
+    Returns:
+        int: 削除した件数
+    """
+    cursor = conn.cursor()
+    if user_ids is None:
+        cursor.execute("SELECT DISTINCT user_id FROM feeds")
+        user_ids = [row[0] for row in cursor.fetchall()]
+    deleted = 0
+    for user_id in user_ids:
+        # max_length + 1 件目が無ければ比較が NULL になり、何も削除しない
+        cursor.execute("""
+            DELETE FROM feeds
+            WHERE user_id = ?1
+              AND (created_at, post_id) <= (
+                  SELECT created_at, post_id
+                  FROM feeds
+                  WHERE user_id = ?1
+                  ORDER BY created_at DESC, post_id DESC
+                  LIMIT 1 OFFSET ?2
+              )
+        """, (user_id, max_length))
+        deleted += cursor.rowcount
+        # 削除した場合はちょうど max_length 件残る。削除しなかった場合は実際に数え直す
+        if cursor.rowcount:
+            length = max_length
+        else:
+            cursor.execute("SELECT COUNT(*) FROM feeds WHERE user_id = ?", (user_id,))
+            length = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT OR REPLACE INTO feed_lengths (user_id, length) VALUES (?, ?)",
+            (user_id, length),
+        )
+    return deleted
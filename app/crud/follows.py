@@ -0,0 +1,209 @@
+import sqlite3
+from app.core.conf import DEFAULT_LIMIT
+from .feeds import backfill_feed, remove_author_from_feed
+
+# followsテーブルに対するCRUD操作
+
+# ==================== 共通SQL ====================
+# ResponseUser に合わせたSELECT句。f.created_at はカーソル用のフォロー日時
+BASE_SELECT_FOLLOW_USERS = """
+    SELECT
+        u.id,
+        u.username,
+        u.biography,
+        u.avatar_img,
+        u.created_at,
+        u.follower_count,
+        u.following_count,
+        f.created_at AS followed_at
+    FROM follows f
+"""
+
+def _follow_keyset_condition(
+    column: str,
+    after: tuple[str, int] | None,
+) -> tuple[str, tuple]:
+    """
+    フォロー日時が新しい順の一覧で、カーソルより後ろを取得するための条件を作る
+
+    Args:
+        column (str): 一覧に並べるユーザーIDの列
+        after (tuple[str, int] | None): 前ページ最後の (フォロー日時, ユーザーID)
+
+    Returns:
+        tuple[str, tuple]: (AND から始まるSQL条件, パラメータ)
+    """
+    if after is None:
+        return "", ()
+    return f"AND (f.created_at, {column}) < (?, ?)", after
+
+# ==================== Create ====================
+def follow_user(
+    conn: sqlite3.Connection,
+    follower_id: int,
+    following_id: int,
+) -> bool:
+    """
+    ユーザーをフォローする
+
+    フォローしたユーザーの最近のポストをフォロワーのフィードに追加する。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        follower_id (int): フォローするユーザーのID
+        following_id (int): フォローされるユーザーのID
+
+    Returns:
+        bool: 新しくフォローした場合はTrue。自分自身や既にフォロー済みの場合はFalse。
+    """
+    if follower_id == following_id:
+        return False
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO follows (follower_id, following_id)
+        VALUES (?, ?)
+    """, (follower_id, following_id))
+    if cursor.rowcount == 0:
+        return False
+    backfill_feed(conn, follower_id, following_id)
+    conn.commit()
+    return True
+
+# ==================== Read ====================
+def get_following_ids(
+    conn: sqlite3.Connection,
+    user_id: int,
+    limit: int | None = None,
+) -> set[int]:
+    """
+    フォローしているユーザーのIDを取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        limit (int | None, optional): 取得件数の上限。デフォルトはNone（全件）。
+
+    Returns:
+        set[int]: フォローしているユーザーIDの集合
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT following_id FROM follows WHERE follower_id = ? LIMIT ?",
+        (user_id, -1 if limit is None else limit)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+def filter_following_ids(
+    conn: sqlite3.Connection,
+    user_id: int,
+    candidate_ids: list[int],
+) -> set[int]:
+    """
+    ユーザーIDのうち、フォローしているものを1回のクエリで取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        candidate_ids (list[int]): 調べるユーザーIDのリスト
+
+    Returns:
+        set[int]: candidate_ids のうち、フォローしているユーザーIDの集合
+    """
+    if not candidate_ids:
+        return set()
+    placeholders = ", ".join("?" * len(candidate_ids))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT following_id
+        FROM follows
+        WHERE follower_id = ? AND following_id IN ({placeholders})
+    """, (user_id, *candidate_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+def get_following(
+    conn: sqlite3.Connection,
+    user_id: int,
+    limit: int = DEFAULT_LIMIT,
+    after: tuple[str, int] | None = None,
+) -> list[sqlite3.Row]:
+    """
+    フォローしているユーザーを、フォローした日時が新しい順に取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後の (フォロー日時, ユーザーID)
+
+    Returns:
+        list[sqlite3.Row]: ユーザーのタプルリスト
+    """
+    condition, params = _follow_keyset_condition("f.following_id", after)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        {BASE_SELECT_FOLLOW_USERS}
+        JOIN users u ON f.following_id = u.id
+        WHERE f.follower_id = ? {condition}
+        ORDER BY f.created_at DESC, f.following_id DESC
+        LIMIT ?
+    """, (user_id, *params, limit))
+    return cursor.fetchall()
+
+def get_followers(
+    conn: sqlite3.Connection,
+    user_id: int,
+    limit: int = DEFAULT_LIMIT,
+    after: tuple[str, int] | None = None,
+) -> list[sqlite3.Row]:
+    """
+    フォロワーを、フォローされた日時が新しい順に取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後の (フォロー日時, ユーザーID)
+
+    Returns:
+        list[sqlite3.Row]: ユーザーのタプルリスト
+    """
+    condition, params = _follow_keyset_condition("f.follower_id", after)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        {BASE_SELECT_FOLLOW_USERS}
+        JOIN users u ON f.follower_id = u.id
+        WHERE f.following_id = ? {condition}
+        ORDER BY f.created_at DESC, f.follower_id DESC
+        LIMIT ?
+    """, (user_id, *params, limit))
+    return cursor.fetchall()
+
+# ==================== Delete ====================
+def unfollow_user(
+    conn: sqlite3.Connection,
+    follower_id: int,
+    following_id: int,
+) -> bool:
+    """
+    ユーザーのフォローを解除する
+
+    フォローを解除したユーザーのポストをフォロワーのフィードから削除する。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        follower_id (int): フォローしているユーザーのID
+        following_id (int): フォローされているユーザーのID
+
+    Returns:
+        bool: フォローを解除した場合はTrue。フォローしていなかった場合はFalse。
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM follows
+        WHERE follower_id = ? AND following_id = ?
+    """, (follower_id, following_id))
+    if cursor.rowcount == 0:
+        return False
+    remove_author_from_feed(conn, follower_id, following_id)
+    conn.commit()
+    return True
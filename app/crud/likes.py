@@ -0,0 +1,83 @@
+import sqlite3
+
+# likesテーブルに対するCRUD操作
+
+# ==================== Create ====================
+def like_post(
+    conn: sqlite3.Connection,
+    user_id: int,
+    post_id: int,
+) -> bool:
+    """
+    ポストにいいねする
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): いいねするユーザーのID
+        post_id (int): ポストID
+
+    Returns:
+        bool: 新しくいいねした場合はTrue。既にいいね済みの場合はFalse。
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO likes (user_id, post_id)
+        VALUES (?, ?)
+    """, (user_id, post_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+# ==================== Read ====================
+def get_liked_post_ids(
+    conn: sqlite3.Connection,
+    user_id: int,
+    post_ids: list[int],
+) -> set[int]:
+    """
+    ポストIDのうち、ユーザーがいいねしているものを1回のクエリで取得する
+
+    一覧の is_liked をまとめて解決するために使う。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        post_ids (list[int]): ポストIDのリスト
+
+    Returns:
+        set[int]: いいねしているポストIDの集合
+    """
+    if not post_ids:
+        return set()
+    placeholders = ", ".join("?" * len(post_ids))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT post_id
+        FROM likes
+        WHERE user_id = ? AND post_id IN ({placeholders})
+    """, (user_id, *post_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+# ==================== Delete ====================
+def unlike_post(
+    conn: sqlite3.Connection,
+    user_id: int,
+    post_id: int,
+) -> bool:
+    """
+    ポストのいいねを取り消す
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): いいねしたユーザーのID
+        post_id (int): ポストID
+
+    Returns:
+        bool: いいねを取り消した場合はTrue。いいねしていなかった場合はFalse。
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM likes
+        WHERE user_id = ? AND post_id = ?
+    """, (user_id, post_id))
+    conn.commit()
+    return cursor.rowcount > 0
@@ -1,5 +1,6 @@
 import sqlite3
-from app.core.conf import DEFAULT_LIMIT
+from app.core.conf import DEFAULT_LIMIT, BULK_INSERT_BATCH_SIZE
+from .feeds import fan_out_post, fan_out_posts, get_pull_author_ids, remove_post_from_feeds
 
 # postsテーブルに対するCRUD操作
 
@@ -9,6 +10,7 @@ from app.core.conf import DEFAULT_LIMIT
 BASE_SELECT_POSTS = """
     SELECT
         p.id AS post_id,
+        p.user_id,
         u.username,
         p.content,
         u.avatar_img,
@@ -16,13 +18,38 @@ BASE_SELECT_POSTS = """
         p.reply_to_id,
         p.repost_of_id,
         rp.content AS repost_of_content,
-        (SELECT COUNT(*) FROM posts WHERE reply_to_id = p.id) AS reply_count,
-        (SELECT COUNT(*) FROM posts WHERE repost_of_id = p.id) AS repost_count
+        p.reply_count,
+        p.repost_count,
+        p.like_count,
+        p.version,
+        COALESCE(p.updated_at, p.created_at) AS updated_at,
+        u.version AS user_version,
+        COALESCE(u.updated_at, u.created_at) AS user_updated_at,
+        rp.version AS repost_version
     FROM posts p
     JOIN users u ON p.user_id = u.id
     LEFT JOIN posts rp ON p.repost_of_id = rp.id
 """
 
+# 一覧の並び順（新しい順）。created_at が同じ場合は id で順序を確定させる
+ORDER_BY_POSTS = """
+    ORDER BY p.created_at DESC, p.id DESC
+"""
+
+def _keyset_condition(after: tuple[str, int] | None) -> tuple[str, tuple]:
+    """
+    指定位置より後ろ（古い）のポストに絞り込む条件を返す
+
+    Args:
+        after (tuple[str, int] | None): 前ページ最後のポストの (created_at, post_id)
+
+    Returns:
+        tuple[str, tuple]: WHERE句に AND で連結する条件とそのパラメータ
+    """
+    if after is None:
+        return "", ()
+    return "AND (p.created_at, p.id) < (?, ?)", tuple(after)
+
 # ==================== Create ====================
 def create_post(
     conn: sqlite3.Connection,
@@ -49,28 +76,163 @@ def create_post(
         INSERT INTO posts (user_id, content, reply_to_id, repost_of_id)
         VALUES (?, ?, ?, ?)
     """, (user_id, content, reply_to_id, repost_of_id))
+    post_id = cursor.lastrowid
+    # 投稿者自身とフォロワーのホームタイムラインに追加する
+    fan_out_post(conn, post_id)
+    conn.commit()
+    return post_id
+
+def create_posts_bulk(
+    conn: sqlite3.Connection,
+    user_id: int,
+    new_posts: list[tuple[str, int | None, int | None]],
+) -> list[int]:
+    """
+    ポストをまとめて新規作成する
+
+    BULK_INSERT_BATCH_SIZE 件ずつ複数行の INSERT ... RETURNING で挿入し、
+    最後に1回だけコミットする。返信先・リポスト元の存在確認は呼び出し側で行うこと
+    （find_missing_post_ids を参照）。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): ユーザーID
+        new_posts (list[tuple[str, int | None, int | None]]):
+            (ポスト内容, 返信先のポストID, リポスト元のポストID) のリスト
+
+    Returns:
+        list[int]: 新規作成されたポストのID（new_posts と同じ順）
+    """
+    cursor = conn.cursor()
+    post_ids = []
+    for start in range(0, len(new_posts), BULK_INSERT_BATCH_SIZE):
+        batch = new_posts[start:start + BULK_INSERT_BATCH_SIZE]
+        values = ", ".join(["(?, ?, ?, ?)"] * len(batch))
+        params = [
+            value
+            for content, reply_to_id, repost_of_id in batch
+            for value in (user_id, content, reply_to_id, repost_of_id)
+        ]
+        cursor.execute(f"""
+            INSERT INTO posts (user_id, content, reply_to_id, repost_of_id)
+            VALUES {values}
+            RETURNING id
+        """, params)
+        # RETURNING の順序は保証されないが、IDは VALUES の順に昇順で採番される
+        batch_ids = sorted(row[0] for row in cursor.fetchall())
+        fan_out_posts(conn, batch_ids)
+        post_ids += batch_ids
     conn.commit()
-    return cursor.lastrowid
+    return post_ids
 
 # ==================== Read ====================
+def find_missing_post_ids(
+        conn: sqlite3.Connection,
+        post_ids: set[int],
+    ) -> set[int]:
+    """
+    存在しないポストIDを調べる
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_ids (set[int]): 調べるポストIDの集合
+
+    Returns:
+        set[int]: post_ids のうち、存在しないポストIDの集合
+    """
+    ids = list(post_ids)
+    found = set()
+    cursor = conn.cursor()
+    for start in range(0, len(ids), BULK_INSERT_BATCH_SIZE):
+        batch = ids[start:start + BULK_INSERT_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        cursor.execute(f"SELECT id FROM posts WHERE id IN ({placeholders})", batch)
+        found.update(row[0] for row in cursor.fetchall())
+    return post_ids - found
+
 def get_all_posts(
         conn: sqlite3.Connection,
         limit: int = DEFAULT_LIMIT,
+        after: tuple[str, int] | None = None,
     ) -> list[sqlite3.Row]:
     """
-    全てのポストを取得する（JOINでユーザー情報含む）
+    全てのポストを新しい順に取得する（JOINでユーザー情報含む）
     
     Args:
         conn (sqlite3.Connection): データベース接続
         limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後のポストの (created_at, post_id)。
+            指定した場合はそれより古いポストを取得する。
     
     Returns:
         list[sqlite3.Row]: 全てのポストのリスト
     """
+    condition, params = _keyset_condition(after)
     cursor = conn.cursor()
-    # TODO: データベースから全データを取得する
-    # ヒント：get_posts_by_user_idを参考にすること
-    
+    cursor.execute(
+        BASE_SELECT_POSTS + f"""
+        WHERE 1 = 1 {condition}
+        """ + ORDER_BY_POSTS + """
+        LIMIT ?
+        """,
+        (*params, limit)
+    )
+    return cursor.fetchall()
+
+def get_timeline_posts(
+        conn: sqlite3.Connection,
+        user_id: int,
+        limit: int = DEFAULT_LIMIT,
+        after: tuple[str, int] | None = None,
+    ) -> list[sqlite3.Row]:
+    """
+    ホームタイムライン（自分とフォローしているユーザーのポスト）を新しい順に取得する（JOINでユーザー情報含む）
+
+    事前にファンアウトされたfeedsテーブルから limit 件を読み、
+    フォロワーが多くファンアウトされなかったポストは pull_postsテーブルから取得して合わせる。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): タイムラインを見るユーザーのID
+        limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後のポストの (created_at, post_id)。
+            指定した場合はそれより古いポストを取得する。
+
+    Returns:
+        list[sqlite3.Row]: タイムラインのポストのリスト
+    """
+    feed_condition = "AND (created_at, post_id) < (?, ?)" if after else ""
+    # フィードから limit 件
+    sources = [f"""
+        SELECT post_id FROM (
+            SELECT post_id FROM feeds
+            WHERE user_id = ? {feed_condition}
+            ORDER BY created_at DESC, post_id DESC
+            LIMIT ?
+        )
+    """]
+    params: list = [user_id, *(after or ()), limit]
+    # ファンアウトされなかったポストを、投稿者ごとに limit 件
+    for author_id in get_pull_author_ids(conn, user_id):
+        sources.append(f"""
+            SELECT post_id FROM (
+                SELECT post_id FROM pull_posts
+                WHERE user_id = ? {feed_condition}
+                ORDER BY created_at DESC, post_id DESC
+                LIMIT ?
+            )
+        """)
+        params += [author_id, *(after or ()), limit]
+
+    cursor = conn.cursor()
+    cursor.execute(
+        BASE_SELECT_POSTS + """
+        WHERE p.id IN (""" + " UNION ALL ".join(sources) + """)
+        """ + ORDER_BY_POSTS + """
+        LIMIT ?
+        """,
+        (*params, limit)
+    )
     return cursor.fetchall()
 
 def get_post_by_id(
@@ -96,30 +258,61 @@ def get_post_by_id(
     )
     return cursor.fetchone()
 
+def get_posts_by_ids(
+        conn: sqlite3.Connection,
+        post_ids: list[int],
+    ) -> list[sqlite3.Row]:
+    """
+    複数のIDでポストをまとめて取得する（JOINでユーザー情報含む）
+    
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_ids (list[int]): ポストIDのリスト
+    
+    Returns:
+        list[sqlite3.Row]: post_ids と同じ順に並べたポストのリスト。存在しないIDは含まれない。
+    """
+    if not post_ids:
+        return []
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" * len(post_ids))
+    cursor.execute(
+        BASE_SELECT_POSTS + f"""
+        WHERE p.id IN ({placeholders})
+        """,
+        tuple(post_ids)
+    )
+    rows = {row["post_id"]: row for row in cursor.fetchall()}
+    return [rows[post_id] for post_id in post_ids if post_id in rows]
+
 def get_posts_by_user_id(
         conn: sqlite3.Connection,
         user_id: int,
         limit: int = DEFAULT_LIMIT,
+        after: tuple[str, int] | None = None,
     ) -> list[sqlite3.Row]:
     """
-    ユーザーIDでポストを取得する（JOINでユーザー情報含む）
+    ユーザーIDでポストを新しい順に取得する（JOINでユーザー情報含む）
     
     Args:
         conn (sqlite3.Connection): データベース接続
         user_id (int): ユーザーID
         limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後のポストの (created_at, post_id)。
+            指定した場合はそれより古いポストを取得する。
     
     Returns:
         list[sqlite3.Row]: ユーザーIDで取得したポストのリスト
     """
+    condition, params = _keyset_condition(after)
     cursor = conn.cursor()
     cursor.execute(
-        BASE_SELECT_POSTS + """
-        WHERE p.user_id = ?
-        ORDER BY p.created_at DESC
+        BASE_SELECT_POSTS + f"""
+        WHERE p.user_id = ? {condition}
+        """ + ORDER_BY_POSTS + """
         LIMIT ?
         """,
-        (user_id, limit)
+        (user_id, *params, limit)
     )
     return cursor.fetchall()
 
@@ -127,29 +320,213 @@ def get_post_replies(
         conn: sqlite3.Connection,
         post_id: int,
         limit: int = DEFAULT_LIMIT,
+        after: tuple[str, int] | None = None,
     ) -> list[sqlite3.Row]:
     """
-    ポストへの返信を取得する（JOINでユーザー情報含む）
+    ポストへの返信を新しい順に取得する（JOINでユーザー情報含む）
     
     Args:
         conn (sqlite3.Connection): データベース接続
         post_id (int): ポストID
         limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple[str, int] | None, optional): 前ページ最後のポストの (created_at, post_id)。
+            指定した場合はそれより古いポストを取得する。
     
     Returns:
         list[sqlite3.Row]: 返信ポストのリスト
     """
+    condition, params = _keyset_condition(after)
     cursor = conn.cursor()
     cursor.execute(
-        BASE_SELECT_POSTS + """
-        WHERE p.reply_to_id = ?
-        ORDER BY p.created_at DESC
+        BASE_SELECT_POSTS + f"""
+        WHERE p.reply_to_id = ? {condition}
+        """ + ORDER_BY_POSTS + """
         LIMIT ?
         """,
-        (post_id, limit)
+        (post_id, *params, limit)
     )
     return cursor.fetchall()
 
+def get_post_thread(
+        conn: sqlite3.Connection,
+        post_id: int,
+        max_depth: int,
+        max_breadth: int,
+        max_nodes: int,
+        max_ancestors: int,
+    ) -> list[sqlite3.Row]:
+    """
+    ポストの会話（返信元を遡った祖先と、返信の木）を1回のクエリで取得する
+
+    reply_to_id を WITH RECURSIVE で辿る。返信の木は浅い順（幅優先）に展開し、
+    1ポストあたり古い順に max_breadth 件、全体で max_nodes 件までで打ち切る。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        post_id (int): 起点のポストID
+        max_depth (int): 起点から辿る返信の深さの上限
+        max_breadth (int): 1ポストあたりに展開する返信数の上限
+        max_nodes (int): 起点を含む返信の木のポスト数の上限
+        max_ancestors (int): 遡る祖先の数の上限
+
+    Returns:
+        list[sqlite3.Row]: 祖先・起点・返信のポストのリスト（古い順）
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        WITH RECURSIVE
+        ancestors(id, depth) AS (
+            SELECT reply_to_id, 1
+            FROM posts
+            WHERE id = :post_id AND reply_to_id IS NOT NULL
+            UNION ALL
+            SELECT p.reply_to_id, a.depth + 1
+            FROM ancestors a
+            JOIN posts p ON p.id = a.id
+            WHERE p.reply_to_id IS NOT NULL AND a.depth < :max_ancestors
+        ),
+        descendants(id, depth) AS (
+            SELECT :post_id, 0
+            UNION ALL
+            SELECT c.id, d.depth + 1
+            FROM descendants d
+            JOIN posts c ON c.id IN (
+                SELECT r.id
+                FROM posts r
+                WHERE r.reply_to_id = d.id
+                ORDER BY r.created_at, r.id
+                LIMIT :max_breadth
+            )
+            WHERE d.depth < :max_depth
+            ORDER BY 2
+            LIMIT :max_nodes
+        ),
+        thread(id) AS (
+            SELECT id FROM ancestors
+            UNION ALL
+            SELECT id FROM descendants
+        )
+    """ + BASE_SELECT_POSTS + """
+        JOIN thread t ON t.id = p.id
+        ORDER BY p.created_at, p.id
+    """, {
+        "post_id": post_id,
+        "max_depth": max_depth,
+        "max_breadth": max_breadth,
+        "max_nodes": max_nodes,
+        "max_ancestors": max_ancestors,
+    })
+    return cursor.fetchall()
+
+# ==================== Search ====================
+# trigram トークナイザで索引を使えるのは3文字以上の語だけ
+FTS_MIN_TERM_LENGTH = 3
+
+def _parse_search_query(query: str) -> tuple[str | None, list[str]]:
+    """
+    検索文字列を FTS5 の MATCH 式と、LIKE で絞り込む短い語に分ける
+
+    空白区切りの語は全て含むもの（AND）として扱う。
+    語はそれぞれフレーズとして扱うので、FTS5 の演算子は解釈されない。
+    末尾の * は前方一致の指定として受け付ける（trigram は部分一致なので取り除くだけでよい）。
+
+    Args:
+        query (str): 検索文字列
+
+    Returns:
+        tuple[str | None, list[str]]: (MATCH 式。3文字以上の語がなければNone, 短い語のリスト)
+    """
+    phrases = []
+    short_terms = []
+    for term in query.split():
+        term = term.rstrip("*")
+        if not term:
+            continue
+        if len(term) >= FTS_MIN_TERM_LENGTH:
+            phrases.append('"' + term.replace('"', '""') + '"')
+        else:
+            short_terms.append(term)
+    return (" AND ".join(phrases) or None), short_terms
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_post_ids(
+        conn: sqlite3.Connection,
+        query: str,
+        limit: int = DEFAULT_LIMIT,
+        after: tuple | None = None,
+        sort: str = "relevance",
+    ) -> tuple[str, list[tuple[int, float | None]]]:
+    """
+    本文でポストを検索し、ポストIDを取得する
+
+    3文字以上の語は全文検索インデックス（posts_fts）で検索し、
+    それより短い語は一致したポストを LIKE で絞り込む。
+    短い語だけの検索はインデックスを使えないため、新しい順に走査する。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        query (str): 検索文字列
+        limit (int, optional): 取得件数。デフォルトはDEFAULT_LIMIT。
+        after (tuple | None, optional): 前ページ最後のポストの並び替えキー。
+            relevance では (score, post_id)、recent では (post_id,)。
+        sort (str, optional): "relevance"（関連度順）または "recent"（新しい順）。
+
+    Returns:
+        tuple[str, list[tuple[int, float | None]]]:
+            (実際に使った並び順, (ポストID, 関連度スコア) のリスト)。
+            全文検索を使えない検索では並び順は常に "recent" になる。
+
+    Raises:
+        ValueError: after の形式が並び順と合わない場合
+    """
+    match, short_terms = _parse_search_query(query)
+    if match is None and not short_terms:
+        return "recent", []
+    if match is None:
+        sort = "recent"
+    if after is not None and len(after) != (2 if sort == "relevance" else 1):
+        raise ValueError("Cursor does not match the sort order")
+
+    conditions = []
+    params: list = []
+    if match is not None:
+        conditions.append("posts_fts MATCH ?")
+        params.append(match)
+    for term in short_terms:
+        conditions.append("p.content LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(term))
+
+    if sort == "relevance":
+        if after is not None:
+            conditions.append("(bm25(posts_fts), p.id) > (?, ?)")
+            params += list(after)
+        sql = f"""
+            SELECT p.id, bm25(posts_fts) AS score
+            FROM posts_fts
+            JOIN posts p ON p.id = posts_fts.rowid
+            WHERE {" AND ".join(conditions)}
+            ORDER BY score, p.id
+            LIMIT ?
+        """
+    else:
+        if after is not None:
+            conditions.append("p.id < ?")
+            params += list(after)
+        source = "posts_fts JOIN posts p ON p.id = posts_fts.rowid" if match else "posts p"
+        sql = f"""
+            SELECT p.id, NULL AS score
+            FROM {source}
+            WHERE {" AND ".join(conditions) or "1 = 1"}
+            ORDER BY p.id DESC
+            LIMIT ?
+        """
+    cursor = conn.cursor()
+    cursor.execute(sql, (*params, limit))
+    return sort, [(row[0], row[1]) for row in cursor.fetchall()]
+
 # ==================== Update ====================
 def update_post(
         conn: sqlite3.Connection,
@@ -189,5 +566,6 @@ def delete_post(
     """
     cursor = conn.cursor()
     cursor.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+    remove_post_from_feeds(conn, post_id)
     conn.commit()
     return cursor.rowcount > 0
\ No newline at end of file
@@ -0,0 +1,55 @@
+import sqlite3
+
+# revoked_tokensテーブルに対するCRUD操作
+
+# ==================== Create ====================
+def revoke_token(
+    conn: sqlite3.Connection,
+    user_id: int,
+    jti: str | None,
+    revoked_at: int,
+    expires_at: int,
+) -> None:
+    """
+    アクセストークンを失効させる
+
+    有効期限を過ぎた行は、ここでまとめて削除する（一覧を小さく保つ）。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        user_id (int): トークンのユーザーID
+        jti (str | None): トークンのID。Noneの場合は revoked_at 以前に発行された user_id の全てのトークン
+        revoked_at (int): 失効させた日時（UNIX秒）
+        expires_at (int): 失効の記録が不要になる日時（UNIX秒）。トークンの有効期限
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO revoked_tokens (jti, user_id, revoked_at, expires_at)
+        VALUES (?, ?, ?, ?)
+    """, (jti, user_id, revoked_at, expires_at))
+    cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (revoked_at,))
+    conn.commit()
+
+# ==================== Read ====================
+def get_revoked_tokens(
+    conn: sqlite3.Connection,
+    after_id: int,
+) -> list[sqlite3.Row]:
+    """
+    失効したトークンの記録を、after_id より後のものだけ取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        after_id (int): 前回までに取得した最大のID（初回は0）
+
+    Returns:
+        list[sqlite3.Row]: 記録のリスト（id, jti, user_id, revoked_at, expires_at）。ID順
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, jti, user_id, revoked_at, expires_at
+        FROM revoked_tokens
+        WHERE id > ?
+        ORDER BY id
+    """, (after_id,))
+    return cursor.fetchall()
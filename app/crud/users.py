@@ -54,7 +54,11 @@ def get_all_users(conn: sqlite3.Connection) -> list[sqlite3.Row]:
             username,
             biography,
             avatar_img,
-            created_at
+            created_at,
+            follower_count,
+            following_count,
+            version,
+            COALESCE(updated_at, created_at) AS updated_at
         FROM users
         """
     )
@@ -79,7 +83,11 @@ def get_user_by_id(conn: sqlite3.Connection, user_id: int) -> sqlite3.Row | None
             username,
             biography,
             avatar_img,
-            created_at
+            created_at,
+            follower_count,
+            following_count,
+            version,
+            COALESCE(updated_at, created_at) AS updated_at
         FROM users
         WHERE id = ?
         """,
@@ -106,7 +114,11 @@ def get_user_by_username(conn: sqlite3.Connection, username: str) -> sqlite3.Row
             username,
             biography,
             avatar_img,
-            created_at
+            created_at,
+            follower_count,
+            following_count,
+            version,
+            COALESCE(updated_at, created_at) AS updated_at
         FROM users
         WHERE username = ?
         """,
@@ -119,19 +131,20 @@ def get_user_password_hash_by_username(
     username: str
 ) -> sqlite3.Row | None:
     """
-    ユーザー名でユーザーのパスワードハッシュを取得する
+    ユーザー名でユーザーIDとパスワードハッシュを取得する
     
     Args:
         conn (sqlite3.Connection): データベース接続
         username (str): ユーザー名
     
     Returns:
-        sqlite3.Row | None: パスワードハッシュのタプル。存在しない場合はNone。
+        sqlite3.Row | None: ユーザーIDとパスワードハッシュのタプル。存在しない場合はNone。
     """
     cursor = conn.cursor()
     cursor.execute(
         """
         SELECT
+            id,
             password_hash
         FROM users
         WHERE username = ?
@@ -174,7 +187,9 @@ def update_user(
             username,
             biography,
             avatar_img,
-            created_at
+            created_at,
+            follower_count,
+            following_count
     """, (username, biography, avatar_img, user_id))
     result = cursor.fetchone()
     conn.commit()
@@ -1,17 +1,57 @@
+import logging
 import sqlite3
+import threading
 from contextlib import contextmanager
-from app.core.conf import DB_BASE_PATH
+from app.core.conf import (
+    DB_BASE_PATH,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_PING_INTERVAL,
+    DB_JOURNAL_MODE,
+    DB_SYNCHRONOUS,
+    DB_MMAP_SIZE,
+    DB_CACHE_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_WRITER_BATCH_SIZE,
+    DB_PROFILE_QUERIES,
+)
+from . import migrations
+from .pool import ConnectionPool
+from .profiling import ProfiledConnection
+from .writer import Writer
+
+logger = logging.getLogger(__name__)
 
 class Database:
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, auto_init: bool = True):
+        """
+        DBファイルへの接続もマイグレーションも、ここでは行わない。
+        auto_init が True の場合は、最初に接続を借りたときにマイグレーションを適用する。
+
+        Args:
+            db_name (str): DBファイル名
+            auto_init (bool, optional): 最初の接続時にマイグレーションを適用するか。
+                別のプロセスで適用済みの場合は False にする
+        """
         self.db_name = DB_BASE_PATH + db_name
+        self._initialized = not auto_init
+        self._init_lock = threading.Lock()
+        self.pool = ConnectionPool(
+            self.get_connection,
+            size=DB_POOL_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            ping_interval=DB_POOL_PING_INTERVAL,
+        )
+        # 書き込みは全てこの Writer を経由させる
+        self.writer = Writer(self.get_connection, batch_size=DB_WRITER_BATCH_SIZE)
 
     @contextmanager
     def connect(self):
         """
-        データベースへの接続を開き、使用後に自動で閉じるコンテキストマネージャー
+        コネクションプールから接続を借り、使用後に自動で返却するコンテキストマネージャー
         
-        with文で使用することで、処理完了後に自動的にconnection.close()が呼ばれる。
+        with文で使用することで、処理完了後に自動的に接続がプールへ返却される。
+        接続は閉じずに使い回されるため、リクエストごとの接続コストがかからない。
         DBファイルが存在しない場合は新規作成される。
 
         Yields:
@@ -19,27 +59,34 @@ class Database:
         
         Raises:
             sqlite3.Error: データベース接続エラー
+            PoolTimeoutError: プールから接続を取得できなかった場合
         
         Example:
             with db.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT * FROM users")
         """
-        conn = self.get_connection()
+        if not self._initialized:
+            self.ensure_initialized()
+        conn = self.pool.acquire()
         try:
             yield conn
         except sqlite3.Error as e:
-            print(f"Error connecting to database: {e}")
+            logger.error("Error connecting to database: %s", e)
             raise
         finally:
-            print(f"closing connection to {self.db_name}")
-            conn.close()
+            self.pool.release(conn)
 
     def get_connection(self) -> sqlite3.Connection:
         """
-        DBに接続する
+        DBに新しく接続する
         DBファイルが存在しない場合は新規作成される。
-        with文を使わない場合は、呼び出し側でclose()を呼ぶ必要がある。
+        プールを経由しないため、呼び出し側でclose()を呼ぶ必要がある。
+        通常は connect() を使うこと。
+
+        接続ごとに conf.py のストレージ設定（WALモード、synchronous、mmap_size、
+        cache_size、busy_timeout）を適用する。
+        DB_PROFILE_QUERIES が有効な場合は、実行したSQLを記録する接続を返す。
 
         Returns:
             sqlite3.Connection: データベースへの接続
@@ -49,95 +96,111 @@ class Database:
             cursor.execute("SELECT * FROM users")
             conn.close()
         """
-        print(f"getting connection to {self.db_name}")
-        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        logger.debug("opening connection to %s", self.db_name)
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            # SQLごとの時間・行数を記録する（app.db.profiling）
+            factory=ProfiledConnection if DB_PROFILE_QUERIES else sqlite3.Connection,
+        )
         conn.row_factory = sqlite3.Row
+        # WALモードでは読み込みと書き込みが互いをブロックしない
+        conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = {int(DB_CACHE_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
         return conn
 
+    def close(self) -> None:
+        """
+        書き込みスレッドを止め、コネクションプールの接続をすべて閉じる
+        """
+        self.writer.close()
+        self.pool.close()
+
     def init_db(self) -> None:
         """
         データベースを初期化する
         
-        usersテーブルとpostsテーブルを作成する。
-        テーブルが既に存在する場合は何もしない。
+        未適用のマイグレーションを適用し、スキーマを最新の状態にする。
+        既に最新の場合は何もしない。既存のデータは保持される。
+        """
+        self.migrate()
+        self._initialized = True
+
+    def ensure_initialized(self) -> None:
+        """
+        まだ初期化していなければ init_db() を呼ぶ
+
+        複数のスレッドから同時に呼ばれても、初期化は1回だけ行う。
+        """
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self.init_db()
+
+    def migrate(self) -> list[int]:
+        """
+        未適用のマイグレーションを適用する
+
+        Returns:
+            list[int]: 今回適用したバージョンのリスト
+        """
+        # connect() は初期化を待つため、プールから直接借りる
+        conn = self.pool.acquire()
+        try:
+            return migrations.migrate(conn)
+        finally:
+            self.pool.release(conn)
+
+    def repair_counters(self) -> None:
+        """
+        返信数・リポスト数・いいね数・フォロー数・フォロワー数を再計算する
+
+        トリガーを経由せずにデータを書き換えた場合などに、
+        カウンターを実際の件数に合わせ直すために使う。
         """
         with self.connect() as conn:
             try:
                 cursor = conn.cursor()
-                # テーブルの作成
-                # usersテーブル
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id              INTEGER     PRIMARY KEY,
-                        username        TEXT        NOT NULL UNIQUE,
-                        password_hash   TEXT        NOT NULL,
-                        biography       TEXT        DEFAULT "",
-                        avatar_img      TEXT        DEFAULT "",
-                        created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                # postsテーブル
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS posts (
-                        id              INTEGER     PRIMARY KEY,
-                        user_id         INTEGER     NOT NULL,
-                        content         TEXT        NOT NULL,
-                        reply_to_id     INTEGER     DEFAULT NULL,
-                        repost_of_id    INTEGER     DEFAULT NULL,
-                        created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(id),
-                        FOREIGN KEY (reply_to_id) REFERENCES posts(id),
-                        FOREIGN KEY (repost_of_id) REFERENCES posts(id)
-                    )
-                """)
-                # # likesテーブル
-                # cursor.execute("""
-                #     CREATE TABLE IF NOT EXISTS likes (
-                #         user_id         INTEGER     NOT NULL,
-                #         post_id         INTEGER     NOT NULL,
-                #         created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
-                #         FOREIGN KEY (user_id) REFERENCES users(id),
-                #         FOREIGN KEY (post_id) REFERENCES posts(id),
-                #         PRIMARY KEY (user_id, post_id)
-                #     )
-                # """)
-                # # followsテーブル
-                # cursor.execute("""
-                #     CREATE TABLE IF NOT EXISTS follows (
-                #         follower_id     INTEGER     NOT NULL,
-                #         following_id    INTEGER     NOT NULL,
-                #         created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
-                #         PRIMARY KEY (follower_id, following_id),
-                #         FOREIGN KEY (follower_id) REFERENCES users(id),
-                #         FOREIGN KEY (following_id) REFERENCES users(id)
-                #     )
-                # """)
-
-                # トランザクションのコミット
+                migrations.recount_posts(cursor)
+                migrations.recount_follows(cursor)
+                migrations.recount_likes(cursor)
                 conn.commit()
             except sqlite3.Error as e:
-                print(f"Error initializing database: {e}")
+                logger.error("Error repairing counters: %s", e)
                 raise
 
     def reset_db(self) -> None:
         """
         データベースをリセットする
         
-        usersテーブルとpostsテーブルを削除し、再作成する。
+        マイグレーションで作る全てのテーブル（適用済みのバージョンを記録する schema_version を含む）を
+        削除し、マイグレーションを最初から適用し直す。
         既存のデータはすべて失われる。
         """
         with self.connect() as conn:
             try:
                 cursor = conn.cursor()
                 # テーブルの削除
+                cursor.execute("DROP TABLE IF EXISTS posts_fts")
                 cursor.execute("DROP TABLE IF EXISTS posts")
                 cursor.execute("DROP TABLE IF EXISTS users")
                 cursor.execute("DROP TABLE IF EXISTS likes")
                 cursor.execute("DROP TABLE IF EXISTS follows")
+                cursor.execute("DROP TABLE IF EXISTS feeds")
+                cursor.execute("DROP TABLE IF EXISTS feed_lengths")
+                cursor.execute("DROP TABLE IF EXISTS pull_posts")
+                cursor.execute("DROP TABLE IF EXISTS revoked_tokens")
+                cursor.execute("DROP TABLE IF EXISTS events")
+                cursor.execute("DROP TABLE IF EXISTS schema_version")
                 # トランザクションのコミット
                 conn.commit()
                 # テーブルの再作成
                 self.init_db()
             except sqlite3.Error as e:
-                print(f"Error resetting database: {e}")
+                logger.error("Error resetting database: %s", e)
                 raise
\ No newline at end of file
@@ -0,0 +1,552 @@
+import logging
+import sqlite3
+from typing import Callable
+from app.core.conf import FEED_MAX_LENGTH
+
+# スキーマのマイグレーション
+#
+# MIGRATIONS にバージョン順に手順を並べる。
+# 適用済みのバージョンは schema_version テーブルに記録され、未適用の手順だけが
+# 1つずつトランザクション内で実行される。
+# 手順は途中まで適用された古いDBでも安全に再実行できるよう、冪等に書くこと。
+# 一度リリースした手順は書き換えず、変更は新しいバージョンとして追加する。
+
+logger = logging.getLogger(__name__)
+
+# ==================== Steps ====================
+def _create_base_tables(cursor: sqlite3.Cursor) -> None:
+    """usersテーブルとpostsテーブルを作成する"""
+    # usersテーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id              INTEGER     PRIMARY KEY,
+            username        TEXT        NOT NULL UNIQUE,
+            password_hash   TEXT        NOT NULL,
+            biography       TEXT        DEFAULT "",
+            avatar_img      TEXT        DEFAULT "",
+            created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # postsテーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id              INTEGER     PRIMARY KEY,
+            user_id         INTEGER     NOT NULL,
+            content         TEXT        NOT NULL,
+            reply_to_id     INTEGER     DEFAULT NULL,
+            repost_of_id    INTEGER     DEFAULT NULL,
+            created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (reply_to_id) REFERENCES posts(id),
+            FOREIGN KEY (repost_of_id) REFERENCES posts(id)
+        )
+    """)
+
+def _add_post_counters(cursor: sqlite3.Cursor) -> None:
+    """postsテーブルに返信数・リポスト数のカウンター列とトリガーを追加する"""
+    added = False
+    for column in ("reply_count", "repost_count"):
+        if not _has_column(cursor, "posts", column):
+            cursor.execute(
+                f"ALTER TABLE posts ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+            added = True
+    # 返信数・リポスト数はトリガーで親ポストのカウンターに反映する
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_counters_after_insert
+        AFTER INSERT ON posts
+        BEGIN
+            UPDATE posts SET reply_count = reply_count + 1
+            WHERE id = NEW.reply_to_id;
+            UPDATE posts SET repost_count = repost_count + 1
+            WHERE id = NEW.repost_of_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_counters_after_delete
+        AFTER DELETE ON posts
+        BEGIN
+            UPDATE posts SET reply_count = reply_count - 1
+            WHERE id = OLD.reply_to_id;
+            UPDATE posts SET repost_count = repost_count - 1
+            WHERE id = OLD.repost_of_id;
+        END
+    """)
+    if added:
+        recount_posts(cursor)
+
+def _add_post_indexes(cursor: sqlite3.Cursor) -> None:
+    """postsテーブルの検索・並び替え用インデックスを追加する"""
+    # 昇順のインデックスでも、SQLiteは逆順に走査して ORDER BY ... DESC に使える
+    # ユーザーの投稿一覧（WHERE user_id = ? ORDER BY created_at DESC）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_user_id_created_at
+        ON posts (user_id, created_at)
+    """)
+    # 返信一覧（WHERE reply_to_id = ? ORDER BY created_at DESC）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_reply_to_id_created_at
+        ON posts (reply_to_id, created_at)
+    """)
+    # リポストの参照
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_repost_of_id
+        ON posts (repost_of_id)
+    """)
+    # 全体のタイムライン（ORDER BY created_at DESC）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_created_at
+        ON posts (created_at)
+    """)
+
+def _create_follows_and_feeds(cursor: sqlite3.Cursor) -> None:
+    """フォロー関係のfollowsテーブルと、ホームタイムライン用のfeedsテーブルを作成する"""
+    # followsテーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS follows (
+            follower_id     INTEGER     NOT NULL,
+            following_id    INTEGER     NOT NULL,
+            created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (follower_id, following_id),
+            FOREIGN KEY (follower_id) REFERENCES users(id),
+            FOREIGN KEY (following_id) REFERENCES users(id)
+        )
+    """)
+    # フォロワーの参照（ファンアウト先の取得）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_follows_following_id
+        ON follows (following_id, follower_id)
+    """)
+    # フォロー数・フォロワー数はトリガーでusersテーブルに反映する
+    added = False
+    for column in ("follower_count", "following_count"):
+        if not _has_column(cursor, "users", column):
+            cursor.execute(
+                f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+            )
+            added = True
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS follows_counters_after_insert
+        AFTER INSERT ON follows
+        BEGIN
+            UPDATE users SET following_count = following_count + 1
+            WHERE id = NEW.follower_id;
+            UPDATE users SET follower_count = follower_count + 1
+            WHERE id = NEW.following_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS follows_counters_after_delete
+        AFTER DELETE ON follows
+        BEGIN
+            UPDATE users SET following_count = following_count - 1
+            WHERE id = OLD.follower_id;
+            UPDATE users SET follower_count = follower_count - 1
+            WHERE id = OLD.following_id;
+        END
+    """)
+    if added:
+        recount_follows(cursor)
+    # feedsテーブル（ユーザーごとのホームタイムラインに載るポスト）
+    # 主キーの順にタイムラインを新しい順で読めるよう、created_at を含める
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feeds (
+            user_id         INTEGER     NOT NULL,
+            post_id         INTEGER     NOT NULL,
+            created_at      DATETIME    NOT NULL,
+            PRIMARY KEY (user_id, created_at, post_id)
+        ) WITHOUT ROWID
+    """)
+    # ポスト削除時にfeedsから取り除くためのインデックス
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_feeds_post_id
+        ON feeds (post_id)
+    """)
+    # 既存のポストを、投稿者自身とフォロワーのフィードに載せる
+    cursor.execute("""
+        INSERT OR IGNORE INTO feeds (user_id, post_id, created_at)
+        SELECT user_id, post_id, created_at FROM (
+            SELECT
+                t.user_id,
+                t.post_id,
+                t.created_at,
+                ROW_NUMBER() OVER (
+                    PARTITION BY t.user_id
+                    ORDER BY t.created_at DESC, t.post_id DESC
+                ) AS rn
+            FROM (
+                SELECT p.user_id, p.id AS post_id, p.created_at FROM posts p
+                UNION ALL
+                SELECT f.follower_id, p.id, p.created_at
+                FROM follows f
+                JOIN posts p ON p.user_id = f.following_id
+            ) AS t
+        )
+        WHERE rn <= ?
+    """, (FEED_MAX_LENGTH,))
+    # フィードの件数（古いポストを削除するかどうかの判定に使う）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS feed_lengths (
+            user_id         INTEGER     PRIMARY KEY,
+            length          INTEGER     NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO feed_lengths (user_id, length)
+        SELECT user_id, COUNT(*) FROM feeds GROUP BY user_id
+    """)
+    # フォロワーが多く、ファンアウトしなかったポスト（タイムライン読み込み時に取得する）
+    # 投稿時に決めたものを記録し、後でフォロワー数が変わってもポストが消えないようにする
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pull_posts (
+            user_id         INTEGER     NOT NULL,
+            post_id         INTEGER     NOT NULL,
+            created_at      DATETIME    NOT NULL,
+            PRIMARY KEY (user_id, created_at, post_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_pull_posts_after_delete
+        AFTER DELETE ON posts
+        BEGIN
+            DELETE FROM pull_posts
+            WHERE user_id = OLD.user_id AND created_at = OLD.created_at AND post_id = OLD.id;
+        END
+    """)
+
+def _create_posts_fts(cursor: sqlite3.Cursor) -> None:
+    """ポスト本文の全文検索用のFTS5インデックスを作成する"""
+    # 本文はpostsテーブルを参照する外部コンテンツ方式（本文を二重に持たない）
+    # trigram トークナイザは3文字単位で索引を作るため、空白で区切られない日本語でも
+    # 部分一致で検索できる
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            content,
+            content = 'posts',
+            content_rowid = 'id',
+            tokenize = 'trigram'
+        )
+    """)
+    # postsテーブルの変更をトリガーでインデックスに反映する
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_after_insert
+        AFTER INSERT ON posts
+        BEGIN
+            INSERT INTO posts_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_after_delete
+        AFTER DELETE ON posts
+        BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, content)
+            VALUES ('delete', OLD.id, OLD.content);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_after_update
+        AFTER UPDATE OF content ON posts
+        BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, content)
+            VALUES ('delete', OLD.id, OLD.content);
+            INSERT INTO posts_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+    """)
+    # 既存のポストからインデックスを作り直す
+    cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+def _create_likes(cursor: sqlite3.Cursor) -> None:
+    """いいねのlikesテーブルと、postsテーブルのいいね数カウンターを作成する"""
+    # likesテーブル
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS likes (
+            user_id         INTEGER     NOT NULL,
+            post_id         INTEGER     NOT NULL,
+            created_at      DATETIME    DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (post_id) REFERENCES posts(id),
+            PRIMARY KEY (user_id, post_id)
+        ) WITHOUT ROWID
+    """)
+    # ポスト削除時にいいねを取り除くためのインデックス
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_likes_post_id
+        ON likes (post_id)
+    """)
+    # いいね数はトリガーでpostsテーブルに反映する
+    added = not _has_column(cursor, "posts", "like_count")
+    if added:
+        cursor.execute(
+            "ALTER TABLE posts ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0"
+        )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS likes_counters_after_insert
+        AFTER INSERT ON likes
+        BEGIN
+            UPDATE posts SET like_count = like_count + 1
+            WHERE id = NEW.post_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS likes_counters_after_delete
+        AFTER DELETE ON likes
+        BEGIN
+            UPDATE posts SET like_count = like_count - 1
+            WHERE id = OLD.post_id;
+        END
+    """)
+    # ポストが削除されたら、そのポストへのいいねも削除する
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_likes_after_delete
+        AFTER DELETE ON posts
+        BEGIN
+            DELETE FROM likes WHERE post_id = OLD.id;
+        END
+    """)
+    if added:
+        recount_likes(cursor)
+
+def _add_follow_list_indexes(cursor: sqlite3.Cursor) -> None:
+    """フォロー一覧・フォロワー一覧用のインデックスと、ユーザー削除時のトリガーを追加する"""
+    # フォロー一覧（WHERE follower_id = ? ORDER BY created_at DESC）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_follows_follower_id_created_at
+        ON follows (follower_id, created_at, following_id)
+    """)
+    # フォロワー一覧（WHERE following_id = ? ORDER BY created_at DESC）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_follows_following_id_created_at
+        ON follows (following_id, created_at, follower_id)
+    """)
+    # ユーザーが削除されたら、そのユーザーのフォロー関係も削除する
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_follows_after_delete
+        AFTER DELETE ON users
+        BEGIN
+            DELETE FROM follows
+            WHERE follower_id = OLD.id OR following_id = OLD.id;
+        END
+    """)
+    cursor.execute("""
+        DELETE FROM follows
+        WHERE follower_id NOT IN (SELECT id FROM users)
+           OR following_id NOT IN (SELECT id FROM users)
+    """)
+
+def _add_row_versions(cursor: sqlite3.Cursor) -> None:
+    """postsテーブルとusersテーブルに、HTTPキャッシュの検証用のバージョン列と更新日時列を追加する"""
+    for table in ("posts", "users"):
+        if not _has_column(cursor, table, "version"):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        # 更新されていない行は NULL のままにし、読み込み時に created_at で補う
+        if not _has_column(cursor, table, "updated_at"):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME")
+        # 行が更新されるたびにバージョンを上げる。カウンター列の更新（いいね・返信・
+        # フォローなど）もレスポンスを変えるため対象にする。
+        # トリガー自身の UPDATE では version が変わるので、WHEN で再実行を防ぐ
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_after_update
+            AFTER UPDATE ON {table}
+            WHEN NEW.version = OLD.version
+            BEGIN
+                UPDATE {table}
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.id;
+            END
+        """)
+
+def _create_events(cursor: sqlite3.Cursor) -> None:
+    """ワーカー間でポストのイベントを配るためのeventsテーブルを作成する"""
+    # 各ワーカーは id の続きから差分を読み、そのまま SSE のイベントIDとして送る。
+    # AUTOINCREMENT で id の再利用を防ぎ、再起動をまたいでも Last-Event-ID が巻き戻らないようにする。
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id              INTEGER     PRIMARY KEY AUTOINCREMENT,
+            type            TEXT        NOT NULL,
+            user_id         INTEGER     NOT NULL,
+            data            TEXT        NOT NULL
+        )
+    """)
+
+def _create_revoked_tokens(cursor: sqlite3.Cursor) -> None:
+    """ログアウト・ユーザー削除で失効したアクセストークンのrevoked_tokensテーブルを作成する"""
+    # jti が NULL の行は、user_id の revoked_at 以前に発行された全てのトークンを失効させる。
+    # 各ワーカーは id の続きから差分を読むため、AUTOINCREMENT で id の再利用を防ぐ。
+    # 削除済みのユーザーの行も残すため、usersテーブルへの外部キーは付けない。
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            id              INTEGER     PRIMARY KEY AUTOINCREMENT,
+            jti             TEXT        UNIQUE,
+            user_id         INTEGER     NOT NULL,
+            revoked_at      INTEGER     NOT NULL,
+            expires_at      INTEGER     NOT NULL
+        )
+    """)
+    # 有効期限を過ぎた行の削除用
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at
+        ON revoked_tokens (expires_at)
+    """)
+
+# (バージョン, 説明, 手順)
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "create users and posts tables", _create_base_tables),
+    (2, "add reply/repost counters to posts", _add_post_counters),
+    (3, "add indexes on posts", _add_post_indexes),
+    (4, "create follows and feeds tables", _create_follows_and_feeds),
+    (5, "create full-text search index on posts", _create_posts_fts),
+    (6, "create likes table", _create_likes),
+    (7, "add follow list indexes", _add_follow_list_indexes),
+    (8, "add row versions to posts and users", _add_row_versions),
+    (9, "create events table", _create_events),
+    (10, "create revoked_tokens table", _create_revoked_tokens),
+]
+
+
+# ==================== Runner ====================
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    適用済みの最新バージョンを取得する
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+
+    Returns:
+        int: 最新バージョン。未適用の場合は0。
+    """
+    _create_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(conn: sqlite3.Connection) -> list[int]:
+    """
+    未適用のマイグレーションをバージョン順に適用する
+
+    手順ごとにトランザクションを張り、失敗した場合はその手順をロールバックして
+    例外を送出する。それまでに適用した手順はコミット済みのまま残る。
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+
+    Returns:
+        list[int]: 今回適用したバージョンのリスト
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # DDLも含めて1つのトランザクションで実行する
+            conn.execute("BEGIN IMMEDIATE")
+            # 他のプロセスが先に適用した場合はスキップする
+            if conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone():
+                conn.rollback()
+                continue
+            step(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error("Error applying migration %d (%s): %s", version, description, e)
+            raise
+        logger.info("applied migration %d: %s", version, description)
+        applied.append(version)
+    return applied
+
+# ==================== OTHER ====================
+def recount_posts(cursor: sqlite3.Cursor) -> None:
+    """
+    返信数・リポスト数を集計し直してカウンター列に書き込む
+
+    Args:
+        cursor (sqlite3.Cursor): データベースカーソル
+    """
+    cursor.execute("UPDATE posts SET reply_count = 0, repost_count = 0")
+    cursor.execute("""
+        UPDATE posts SET reply_count = c.n
+        FROM (
+            SELECT reply_to_id AS id, COUNT(*) AS n
+            FROM posts
+            WHERE reply_to_id IS NOT NULL
+            GROUP BY reply_to_id
+        ) AS c
+        WHERE posts.id = c.id
+    """)
+    cursor.execute("""
+        UPDATE posts SET repost_count = c.n
+        FROM (
+            SELECT repost_of_id AS id, COUNT(*) AS n
+            FROM posts
+            WHERE repost_of_id IS NOT NULL
+            GROUP BY repost_of_id
+        ) AS c
+        WHERE posts.id = c.id
+    """)
+
+def recount_follows(cursor: sqlite3.Cursor) -> None:
+    """
+    フォロー数・フォロワー数を集計し直してカウンター列に書き込む
+
+    Args:
+        cursor (sqlite3.Cursor): データベースカーソル
+    """
+    cursor.execute("UPDATE users SET follower_count = 0, following_count = 0")
+    cursor.execute("""
+        UPDATE users SET follower_count = c.n
+        FROM (
+            SELECT following_id AS id, COUNT(*) AS n
+            FROM follows
+            GROUP BY following_id
+        ) AS c
+        WHERE users.id = c.id
+    """)
+    cursor.execute("""
+        UPDATE users SET following_count = c.n
+        FROM (
+            SELECT follower_id AS id, COUNT(*) AS n
+            FROM follows
+            GROUP BY follower_id
+        ) AS c
+        WHERE users.id = c.id
+    """)
+
+def recount_likes(cursor: sqlite3.Cursor) -> None:
+    """
+    いいね数を集計し直してカウンター列に書き込む
+
+    Args:
+        cursor (sqlite3.Cursor): データベースカーソル
+    """
+    cursor.execute("UPDATE posts SET like_count = 0")
+    cursor.execute("""
+        UPDATE posts SET like_count = c.n
+        FROM (
+            SELECT post_id AS id, COUNT(*) AS n
+            FROM likes
+            GROUP BY post_id
+        ) AS c
+        WHERE posts.id = c.id
+    """)
+
+def _create_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version         INTEGER     PRIMARY KEY,
+            description     TEXT        NOT NULL,
+            applied_at      DATETIME    DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+def _has_column(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
+    return any(
+        row[1] == column for row in cursor.execute(f"PRAGMA table_info({table})")
+    )
@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """プールから接続を取得できずにタイムアウトした場合のエラー"""
+
+
+class ConnectionPool:
+    """
+    sqlite3.Connection のコネクションプール
+
+    接続を使い回すことで、リクエストごとの接続・切断コストをなくす。
+    空き接続は LIFO で払い出すため、直前に使われた「温まった」接続が
+    優先的に再利用される。
+
+    - 同時に貸し出せる接続数は size で制限される
+    - 上限に達している場合は timeout 秒まで返却を待つ
+    - 一定時間使われていない接続は払い出し前にヘルスチェックする
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], sqlite3.Connection],
+        size: int,
+        timeout: float,
+        ping_interval: float,
+    ):
+        """
+        Args:
+            factory (Callable[[], sqlite3.Connection]): 新しい接続を作成する関数
+            size (int): プールの最大接続数
+            timeout (float): 接続取得の待ち時間の上限（秒）
+            ping_interval (float): この秒数以上使われていない接続はヘルスチェックする
+        """
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        # (接続, 最後に返却された時刻) のスタック
+        self._idle: list[tuple[sqlite3.Connection, float]] = []
+        self._num_connections = 0
+        self._in_use = 0
+        self._closed = False
+
+        # 統計情報
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+
+    # ==================== Checkout / Release ====================
+    def acquire(self) -> sqlite3.Connection:
+        """
+        プールから接続を借りる
+
+        空き接続があればそれを返し、なければ上限まで新規作成する。
+        上限に達している場合は他のリクエストの返却を待つ。
+
+        Returns:
+            sqlite3.Connection: データベースへの接続
+
+        Raises:
+            PoolTimeoutError: timeout 秒以内に接続を取得できなかった場合
+        """
+        deadline = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._num_connections < self.size:
+                    # 接続作成中も上限を守るため、先に枠を確保しておく
+                    self._num_connections += 1
+                    conn, released_at = None, None
+                    break
+
+                if deadline is None:
+                    self._waits += 1
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+
+        try:
+            if conn is None:
+                conn = self._factory()
+            elif time.monotonic() - released_at >= self.ping_interval \
+                    and not self._is_healthy(conn):
+                conn = self._replace(conn)
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._num_connections -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """
+        接続をプールに返却する
+
+        未コミットのトランザクションが残っている場合はロールバックしてから返却する。
+
+        Args:
+            conn (sqlite3.Connection): acquire() で借りた接続
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # 壊れた接続はプールに戻さずに破棄する
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._num_connections -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        """
+        プールを閉じ、空き接続をすべて閉じる
+
+        貸し出し中の接続は返却時に閉じられる。
+        """
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                conn.close()
+            self._num_connections -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    # ==================== Stats ====================
+    def stats(self) -> dict[str, int]:
+        """
+        プールの統計情報を返す
+
+        Returns:
+            dict[str, int]: 接続数・貸し出し数・待ち回数・タイムアウト回数など
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "connections": self._num_connections,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+            }
+
+    # ==================== OTHER ====================
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            with self._cond:
+                self._health_check_failures += 1
+            return False
+
+    def _replace(self, conn: sqlite3.Connection) -> sqlite3.Connection:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        return self._factory()
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._in_use -= 1
+            self._num_connections -= 1
+            self._cond.notify()
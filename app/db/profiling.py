@@ -0,0 +1,286 @@
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any
+from app.core.conf import (
+    SLOW_QUERY_MS,
+    SLOW_QUERY_EXPLAIN,
+    QUERY_STATS_MAX_RECORDS,
+)
+
+# SQLの計測
+#
+# ProfiledConnection / ProfiledCursor は実行した文ごとに、SQL・所要時間
+# （execute と fetch の合計）・取得行数・呼び出し元の関数を記録する。
+# 記録は ContextVar の QueryStats に溜まり、リクエストごとに集計される
+# （app.core.profiling のミドルウェアが Server-Timing ヘッダーに出す）。
+# SLOW_QUERY_MS 以上かかった文は、EXPLAIN QUERY PLAN の結果とともにログに出す。
+#
+# Example:
+#     stats = QueryStats()
+#     token = query_stats.set(stats)
+#     try:
+#         posts.get_timeline_posts(conn, user_id, 30)
+#     finally:
+#         query_stats.reset(token)
+#     print(stats.count, stats.total)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecord:
+    """実行した1つの文の記録"""
+
+    __slots__ = ("sql", "caller", "duration", "rows", "logged")
+
+    def __init__(self, sql: str, caller: str):
+        self.sql = sql
+        # 呼び出し元（例: "crud.posts.get_timeline_posts"）
+        self.caller = caller
+        # execute と fetch にかかった合計時間（秒）
+        self.duration = 0.0
+        self.rows = 0
+        self.logged = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "sql": normalize_sql(self.sql),
+            "caller": self.caller,
+            "duration_ms": round(self.duration * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+class QueryStats:
+    """
+    1リクエスト（または任意の処理単位）で実行した文の集計
+
+    ContextVar はスレッドプール・書き込みスレッドにもコピーされて渡るため、
+    同じ集計に複数のスレッドから書き込まれる。更新と読み出しはロックで守る。
+    """
+
+    def __init__(self, max_records: int = QUERY_STATS_MAX_RECORDS):
+        """
+        Args:
+            max_records (int, optional): 保持する記録の上限。超えた分は件数と時間のみ数える
+        """
+        self.max_records = max_records
+        self.records: list[QueryRecord] = []
+        self.count = 0
+        # DBにかかった合計時間（秒）
+        self.total = 0.0
+        # 文ごとの実行回数（N+1 の検出に使う）
+        self.statements: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, record: QueryRecord) -> None:
+        with self._lock:
+            self.count += 1
+            self.statements[record.sql] += 1
+            if len(self.records) < self.max_records:
+                self.records.append(record)
+
+    def add_time(self, elapsed: float) -> None:
+        with self._lock:
+            self.total += elapsed
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        threshold 回以上実行された文を返す
+
+        Args:
+            threshold (int): 回数の下限
+
+        Returns:
+            list[tuple[str, int]]: (正規化したSQL, 回数) のリスト。回数の多い順
+        """
+        with self._lock:
+            statements = self.statements.most_common()
+        return [
+            (normalize_sql(sql), n)
+            for sql, n in statements
+            if n >= threshold
+        ]
+
+    def by_caller(self) -> dict[str, dict[str, float]]:
+        """
+        呼び出し元の関数ごとに件数と時間を集計する
+
+        Returns:
+            dict[str, dict[str, float]]: {呼び出し元: {"count": 件数, "duration_ms": 時間}}
+        """
+        summary: dict[str, dict[str, float]] = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            item = summary.setdefault(record.caller, {"count": 0, "duration_ms": 0.0})
+            item["count"] += 1
+            item["duration_ms"] += record.duration * 1000
+        return summary
+
+
+# 現在の処理の集計先。None の場合は集計しない（スロークエリログは出す）
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """実行した文を記録するカーソル"""
+
+    _record: QueryRecord | None = None
+    _params: Any = None
+
+    def execute(self, sql: str, parameters: Any = (), /) -> "ProfiledCursor":
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(time.perf_counter() - started, 0)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> "ProfiledCursor":
+        self._start(sql, None)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(time.perf_counter() - started, 0)
+
+    def executescript(self, sql_script: str, /) -> "ProfiledCursor":
+        self._start(sql_script, None)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._finish(time.perf_counter() - started, 0)
+
+    def fetchone(self) -> Any:
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._finish(time.perf_counter() - started, row is not None)
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list:
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._finish(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self) -> list:
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._finish(time.perf_counter() - started, len(rows))
+        return rows
+
+    def __next__(self) -> Any:
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish(time.perf_counter() - started, 0)
+            raise
+        self._finish(time.perf_counter() - started, 1)
+        return row
+
+    # ==================== OTHER ====================
+    def _start(self, sql: str, parameters: Any) -> None:
+        # リクエストの外（書き込みスレッドのバッチ制御・マイグレーションなど）でも
+        # スロークエリログの対象にするため、記録は常に作る
+        self._record = QueryRecord(sql, _caller())
+        self._params = parameters
+        stats = query_stats.get()
+        if stats is not None:
+            stats.add(self._record)
+
+    def _finish(self, elapsed: float, rows: int) -> None:
+        record = self._record
+        if record is None:
+            return
+        record.duration += elapsed
+        record.rows += rows
+        stats = query_stats.get()
+        if stats is not None:
+            stats.add_time(elapsed)
+        if not record.logged and record.duration * 1000 >= SLOW_QUERY_MS:
+            record.logged = True
+            _log_slow_query(self.connection, record, self._params)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    ProfiledCursor を使う接続
+
+    sqlite3.connect(..., factory=ProfiledConnection) で作る。
+    conn.execute() も cursor() を経由させて記録の対象にする。
+    """
+
+    def cursor(self, factory: type = ProfiledCursor) -> sqlite3.Cursor:
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script: str, /) -> sqlite3.Cursor:
+        return self.cursor().executescript(sql_script)
+
+
+def normalize_sql(sql: str) -> str:
+    """SQLの空白・改行を詰めて1行にする"""
+    return " ".join(sql.split())
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters: Any = ()) -> list[str]:
+    """
+    EXPLAIN QUERY PLAN の結果を、入れ子を字下げした行のリストで返す
+
+    Args:
+        conn (sqlite3.Connection): データベース接続
+        sql (str): 対象のSQL
+        parameters (Any, optional): SQLのパラメータ
+
+    Returns:
+        list[str]: 実行計画の各行（例: "SEARCH p USING INDEX idx_posts_user_id ..."）
+    """
+    cursor = conn.cursor(sqlite3.Cursor)
+    rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    depths = {0: -1}
+    lines = []
+    for row in rows:
+        node_id, parent = row[0], row[1]
+        depths[node_id] = depths.get(parent, -1) + 1
+        lines.append("  " * depths[node_id] + row[3])
+    return lines
+
+
+def _caller() -> str:
+    # このモジュールの外で最初に見つかったフレームを呼び出し元とする
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    module = frame.f_globals.get("__name__", "")
+    return f"{module.removeprefix('app.')}.{frame.f_code.co_name}"
+
+
+def _log_slow_query(conn: sqlite3.Connection, record: QueryRecord, parameters: Any) -> None:
+    plan: list[str] = []
+    # executemany・executescript は実行計画を取らない
+    if SLOW_QUERY_EXPLAIN and parameters is not None:
+        try:
+            plan = explain(conn, record.sql, parameters)
+        except sqlite3.Error as e:
+            plan = [f"(EXPLAIN failed: {e})"]
+    logger.warning(
+        "slow query: %.1f ms in %s: %s%s",
+        record.duration * 1000,
+        record.caller,
+        normalize_sql(record.sql),
+        "".join("\n    " + line for line in plan),
+    )
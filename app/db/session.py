@@ -1,20 +1,56 @@
 from .database import Database
-from app.core.conf import DB_NAME
+from app.core.conf import DB_NAME, DB_INIT_DONE
+from app.core.log import setup_logging
 
-db = Database(DB_NAME)
-db.init_db()
+# import してもDBには触れない。マイグレーションは起動時（app.main の lifespan）か、
+# 最初に接続を借りたときに適用される。
+# ランチャー（app.serve）が親プロセスで適用済みの場合、ワーカーはDDLを実行しない
+db = Database(DB_NAME, auto_init=not DB_INIT_DONE)
 
 def get_db():
     with db.connect() as conn:
         yield conn
 
+def call_with_db(fn, *args, **kwargs):
+    """
+    接続を借りて fn(conn, *args, **kwargs) を実行し、すぐに返却する
+
+    プールからの取得は待つことがあるため、イベントループ上では呼ばず、
+    aio.run でスレッドプールから呼ぶ。接続を持ち続けたくない処理（bcrypt の検証・長時間のストリームなど）で使う。
+
+    Example:
+        rows = await aio.run(call_with_db, posts.get_posts_by_user_id, user_id)
+    """
+    with db.connect() as conn:
+        return fn(conn, *args, **kwargs)
+
+def get_writer():
+    db.ensure_initialized()
+    return db.writer
+
 
 # ==================== OTHER ====================
+# 以下は Makefile から呼ぶコマンド。ログを出すためにそれぞれで設定する
 def reset_db():
     """
     データベースをリセットする
     
-    usersテーブルとpostsテーブルを削除し、再作成する。
+    マイグレーションで作る全てのテーブルを削除し、マイグレーションを最初から適用し直す。
     既存のデータはすべて失われる。
     """
-    db.reset_db()
\ No newline at end of file
+    setup_logging()
+    db.reset_db()
+
+def migrate():
+    """
+    未適用のマイグレーションを適用する
+    """
+    setup_logging()
+    db.migrate()
+
+def repair_counters():
+    """
+    返信数・リポスト数・いいね数・フォロー数・フォロワー数を再計算する
+    """
+    setup_logging()
+    db.repair_counters()
@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class _GroupCommitConnection:
+    """
+    Writer のジョブに渡す接続のラッパー
+
+    crud 関数が呼ぶ commit() を無視し、コミットを Writer にまとめて任せる。
+    それ以外の属性はそのまま元の接続に委譲する。
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def commit(self) -> None:
+        # バッチの最後に Writer がまとめてコミットする
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+
+class Writer:
+    """
+    書き込み専用スレッド
+
+    全ての書き込みを1本の接続・1本のスレッドで直列に実行する。
+    キューに溜まったジョブは1つのトランザクションにまとめてコミット（グループコミット）
+    するため、書き込みが集中しても "database is locked" にならず、fsync の回数も減る。
+    ジョブごとに SAVEPOINT を切るので、失敗したジョブだけがロールバックされる。
+
+    Example:
+        post_id = db.writer.run(posts.create_post, user_id, "hello")
+        post_id = await db.writer.run_async(posts.create_post, user_id, "hello")
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], sqlite3.Connection],
+        batch_size: int,
+    ):
+        """
+        Args:
+            factory (Callable[[], sqlite3.Connection]): 書き込み用の接続を作成する関数
+            batch_size (int): 1回のコミットにまとめるジョブの最大数
+        """
+        self._factory = factory
+        self.batch_size = batch_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    # ==================== Submit ====================
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        書き込みジョブをキューに積む
+
+        fn は fn(conn, *args, **kwargs) の形で書き込みスレッド上で呼ばれる。
+        app.crud の関数をそのまま渡すことができる。
+
+        Args:
+            fn (Callable[..., Any]): 第1引数に接続を受け取る関数
+            *args: fn に渡す引数
+            **kwargs: fn に渡すキーワード引数
+
+        Returns:
+            Future: コミット完了後に fn の戻り値が設定される Future
+        """
+        self._ensure_started()
+        future: Future = Future()
+        # 呼び出し元のコンテキスト（リクエストごとのSQLの集計など）でジョブを実行する
+        context = contextvars.copy_context()
+        self._queue.put((future, context, fn, args, kwargs))
+        return future
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        書き込みジョブを実行し、コミットされるまで待つ
+
+        Args:
+            fn (Callable[..., Any]): 第1引数に接続を受け取る関数
+            *args: fn に渡す引数
+            **kwargs: fn に渡すキーワード引数
+
+        Returns:
+            Any: fn の戻り値
+
+        Raises:
+            Exception: fn またはコミットで発生した例外
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run_async(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        書き込みジョブを実行し、イベントループを止めずにコミットまで待つ
+
+        Args:
+            fn (Callable[..., Any]): 第1引数に接続を受け取る関数
+            *args: fn に渡す引数
+            **kwargs: fn に渡すキーワード引数
+
+        Returns:
+            Any: fn の戻り値
+
+        Raises:
+            Exception: fn またはコミットで発生した例外
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        """
+        キューに積まれたジョブを全て処理してから書き込みスレッドを止める
+        """
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    # ==================== OTHER ====================
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _loop(self) -> None:
+        conn = self._factory()
+        # トランザクションは BEGIN / COMMIT で明示的に管理する
+        conn.isolation_level = None
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                batch = [job]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._run_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        wrapped = _GroupCommitConnection(conn)
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, context, fn, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = context.run(fn, wrapped, *args, **kwargs)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    results.append((future, None, e))
+                else:
+                    conn.execute("RELEASE job")
+                    results.append((future, result, None))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("Error committing write batch: %s", e)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for future, *_ in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+
+        # コミット後に結果を返すことで、呼び出し側は直後の読み込みで変更を参照できる
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
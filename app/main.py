@@ -1,9 +1,113 @@
+import time
+
+# 起動時間の内訳を出すため、他の import より前に時刻を取る
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import uvicorn
 from app.api import api_router
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.conf import (
+    COMPRESSION_MINIMUM_SIZE,
+    GZIP_COMPRESSLEVEL,
+    BROTLI_QUALITY,
+    DB_PROFILE_QUERIES,
+    QUERY_REPEAT_WARNING,
+    TOKEN_REVOCATION_REFRESH_INTERVAL,
+    EVENT_POLL_INTERVAL,
+)
+from app.core.dependencies import (
+    user_cache,
+    post_cache,
+    following_cache,
+    refresh_revocations,
+    refresh_events,
+)
+from app.core.events import event_bus
+from app.core.log import setup_logging
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.core.password import password_hasher
+from app.core.profiling import QueryProfilingMiddleware
+from app.core.tokens import get_secret, revocations
+from app.db.session import db
+
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+_import_finished = time.perf_counter()
+
+
+async def refresh_revocations_periodically() -> None:
+    """
+    他のワーカーで失効させたトークンを TOKEN_REVOCATION_REFRESH_INTERVAL ごとに取り込む
+    """
+    while True:
+        await asyncio.sleep(TOKEN_REVOCATION_REFRESH_INTERVAL)
+        try:
+            await refresh_revocations()
+        except Exception:
+            logger.exception("failed to refresh revoked tokens")
+
+
+async def refresh_events_periodically() -> None:
+    """
+    他のワーカーで記録したイベント（ポストのイベントとキャッシュの無効化）を
+    EVENT_POLL_INTERVAL ごとに取り込む
+    """
+    while True:
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+        try:
+            await refresh_events()
+        except Exception:
+            logger.exception("failed to refresh events")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    起動時にDBを初期化し、停止時に書き込みの完了を待ってから後片付けをする
+
+    import 時には何もしないため、ツールやテストは app を import するだけならDBに触れない。
+    """
+    started = time.perf_counter()
+    # マイグレーションの確認（適用済みなら1クエリ）。最初のリクエストに待たせない
+    await anyio.to_thread.run_sync(db.ensure_initialized)
+    # 再起動前に失効させたトークンを読み込んでから、リクエストを受け付ける
+    await refresh_revocations()
+    # 再起動をまたいで Last-Event-ID から再開できるよう、直近のイベントを読み込む
+    await refresh_events()
+    db_ready = time.perf_counter()
+    # 署名鍵のファイルが無ければここで作る
+    get_secret()
+    refresher = asyncio.create_task(refresh_revocations_periodically())
+    event_poller = asyncio.create_task(refresh_events_periodically())
+    # bcrypt のバックエンドは裏で読み込み、起動を待たせない
+    password_hasher.warm_up()
+    logger.info(
+        "startup: import %.1f ms, database %.1f ms, ready in %.1f ms",
+        (_import_finished - _import_started) * 1000,
+        (db_ready - started) * 1000,
+        (time.perf_counter() - started) * 1000,
+    )
+    try:
+        yield
+    finally:
+        refresher.cancel()
+        event_poller.cancel()
+        # 書き込みスレッドに積まれたジョブを全てコミットしてから接続を閉じる
+        await anyio.to_thread.run_sync(db.close)
+        password_hasher.close()
+        registry.flush()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,11 +117,59 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    gzip_level=GZIP_COMPRESSLEVEL,
+    brotli_quality=BROTLI_QUALITY,
+)
+
+# 最後に追加したミドルウェアが最も外側になるため、圧縮を含めた時間を計測できる
+if DB_PROFILE_QUERIES:
+    app.add_middleware(QueryProfilingMiddleware, repeat_warning=QUERY_REPEAT_WARNING)
+
+app.add_middleware(MetricsMiddleware, registry=registry)
+
+# スクレイプ時に各コンポーネントの統計情報をメトリクスとして集める
+registry.register_stats(
+    "db_pool", db.pool.stats, "コネクションプール",
+    counters=("checkouts", "waits", "timeouts", "health_check_failures"),
+)
+registry.register_stats(
+    "user_cache", user_cache.stats, "ユーザー情報キャッシュ",
+    counters=("hits", "misses", "evictions", "invalidations", "errors", "loads", "coalesced"),
+)
+registry.register_stats(
+    "post_cache", post_cache.stats, "ポストのキャッシュ",
+    counters=("hits", "misses", "evictions", "invalidations", "errors", "loads", "coalesced"),
+)
+registry.register_stats(
+    "following_cache", following_cache.stats, "フォロー中ユーザーIDのキャッシュ",
+    counters=("hits", "misses", "evictions", "invalidations"),
+)
+registry.register_stats(
+    "password_hasher", password_hasher.stats, "パスワードのハッシュ計算",
+    counters=("completed", "rejected"),
+)
+registry.register_stats(
+    "revoked_tokens", revocations.stats, "失効したアクセストークン",
+)
+registry.register_stats(
+    "event_bus", event_bus.stats, "ポストのイベント配信",
+    counters=("received", "overflows"),
+)
+
 app.include_router(api_router)
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """メトリクスを Prometheus のテキスト形式で返す"""
+    # 値の更新と同じイベントループ上で読み出すため、集計中に値が変わらない
+    return PlainTextResponse(registry.expose(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -3,7 +3,13 @@ from .posts import (
     UpdatePost,
     ResponsePost,
     ResponsePosts,
+    ResponseBulkPosts,
+    ResponseThreadPost,
+    ResponseThread,
     row_to_response_post,
+    row_to_post_dict,
+    rows_to_response_posts,
+    rows_to_response_thread,
 )
 from .users import (
     Signup,
@@ -11,6 +17,7 @@ from .users import (
     UpdateUser,
     UpdatePassword,
     ResponseUser,
+    ResponseUsers,
     ResponseToken,
     row_to_response_user,
 )
@@ -20,12 +27,19 @@ __all__ = [
     "UpdatePost",
     "ResponsePost",
     "ResponsePosts",
+    "ResponseBulkPosts",
+    "ResponseThreadPost",
+    "ResponseThread",
     "row_to_response_post",
+    "row_to_post_dict",
+    "rows_to_response_posts",
+    "rows_to_response_thread",
     "Signup",
     "Login",
     "UpdateUser",
     "UpdatePassword",
     "ResponseUser",
+    "ResponseUsers",
     "ResponseToken",
     "row_to_response_user",
 ]
\ No newline at end of file
@@ -45,27 +45,219 @@ class ResponsePost(BaseModel):
     reply_to_id: Optional[int]
 
 class ResponsePosts(BaseModel):
+    """
+    ポスト一覧のレスポンス構造
+
+    posts (list[ResponsePost]) : ポストのリスト
+    total_posts (int) : このページに含まれるポスト数
+    next_cursor (str, optional) : 次ページ取得用のカーソル。最後のページではNone
+    """
     posts: list[ResponsePost]
     total_posts: int
+    next_cursor: Optional[str] = None
+
+class ResponseThreadPost(ResponsePost):
+    """
+    会話の木の1ポストのレスポンス構造（ResponsePost に以下を追加）
+
+    depth (int) : 起点のポストからの深さ（起点は0）
+    replies (list[ResponseThreadPost]) : 返信のリスト（format=flat の場合は常に空）
+    """
+    depth: int
+    replies: list["ResponseThreadPost"] = []
+
+class ResponseThread(BaseModel):
+    """
+    会話のレスポンス構造
+
+    ancestors (list[ResponsePost]) : 起点のポストの返信元を遡ったポストのリスト（古い順）
+    posts (list[ResponseThreadPost]) : format=nested の場合は起点のポストのみ（返信は replies に入れ子）、
+        format=flat の場合は起点と全ての返信（会話の順）
+    total_posts (int) : 祖先を除く、返したポスト数
+    """
+    ancestors: list[ResponsePost]
+    posts: list[ResponseThreadPost]
+    total_posts: int
+
+class ResponseBulkPosts(BaseModel):
+    """
+    一括投稿のレスポンス構造
+
+    post_ids (list[int]) : 作成されたポストIDのリスト（リクエストと同じ順）
+    total_posts (int) : 作成されたポスト数
+    """
+    post_ids: list[int]
+    total_posts: int
 
 
 # ==================== OTHER ====================
 import sqlite3
 
 # sqlite3のRowをResponsePostに変換する関数
-def row_to_response_post(row: sqlite3.Row) -> ResponsePost:
+def row_to_response_post(
+    row: sqlite3.Row,
+    is_liked: bool = False,
+    is_following: bool = False,
+) -> ResponsePost:
     return ResponsePost(
         post_id=row["post_id"],
         username=row["username"],
         content=row["content"],
         avatar_img=row["avatar_img"],
-        is_following=False,
+        is_following=is_following,
         created_at=row["created_at"],
         repost_count=row["repost_count"],
-        like_count=0,
+        like_count=row["like_count"],
         reply_count=row["reply_count"],
-        is_liked=False,
+        is_liked=is_liked,
         repost_of_id=row["repost_of_id"],
         repost_of_content=row["repost_of_content"],
         reply_to_id=row["reply_to_id"],
-    )
\ No newline at end of file
+    )
+
+# ==================== 高速シリアライズ ====================
+# 一覧のレスポンスでは、行ごとに ResponsePost を作って検証し、
+# さらに FastAPI が response_model で再検証・再シリアライズするコストが大きい。
+# ここでは sqlite3.Row から JSON にそのまま書ける dict を直接作る。
+# キーの順序と値の表現は ResponsePost を経由した場合と同じになるようにしている。
+
+def format_datetime(value: str) -> str:
+    """
+    SQLiteの日時文字列を、pydantic の datetime と同じISO 8601形式に変換する
+
+    Args:
+        value (str): SQLiteの日時文字列（例: "2024-01-01 12:00:00"）
+
+    Returns:
+        str: ISO 8601形式の文字列（例: "2024-01-01T12:00:00"）
+    """
+    # CURRENT_TIMESTAMP の形式は文字の置き換えだけで済ませる
+    if len(value) == 19 and value[10] == " ":
+        return value[:10] + "T" + value[11:]
+    return datetime.fromisoformat(value).isoformat()
+
+def row_to_post_dict(
+    row: sqlite3.Row,
+    is_liked: bool = False,
+    is_following: bool = False,
+) -> dict:
+    """
+    sqlite3のRowを、ResponsePost のJSON表現と同じdictに変換する
+
+    Args:
+        row (sqlite3.Row): BASE_SELECT_POSTS で取得した行
+        is_liked (bool, optional): 閲覧者がいいねしているかどうか
+        is_following (bool, optional): 閲覧者が投稿者をフォローしているかどうか
+
+    Returns:
+        dict: JSONレスポンスにそのまま使えるdict
+    """
+    return {
+        "post_id": row["post_id"],
+        "username": row["username"],
+        "content": row["content"],
+        "avatar_img": row["avatar_img"],
+        "is_following": is_following,
+        "created_at": format_datetime(row["created_at"]),
+        "repost_count": row["repost_count"],
+        "like_count": row["like_count"],
+        "reply_count": row["reply_count"],
+        "is_liked": is_liked,
+        "repost_of_id": row["repost_of_id"],
+        "repost_of_content": row["repost_of_content"],
+        "reply_to_id": row["reply_to_id"],
+    }
+
+def rows_to_response_posts(
+    rows: list[sqlite3.Row],
+    next_cursor: str | None = None,
+    liked_post_ids: set[int] = frozenset(),
+    following_ids: set[int] = frozenset(),
+) -> dict:
+    """
+    sqlite3のRowのリストを、ResponsePosts のJSON表現と同じdictに変換する
+
+    Args:
+        rows (list[sqlite3.Row]): BASE_SELECT_POSTS で取得した行のリスト
+        next_cursor (str | None, optional): 次ページ取得用のカーソル
+        liked_post_ids (set[int], optional): 閲覧者がいいねしているポストIDの集合
+        following_ids (set[int], optional): 閲覧者がフォローしているユーザーIDの集合
+
+    Returns:
+        dict: JSONレスポンスにそのまま使えるdict
+    """
+    return {
+        "posts": [
+            row_to_post_dict(
+                row,
+                row["post_id"] in liked_post_ids,
+                row["user_id"] in following_ids,
+            )
+            for row in rows
+        ],
+        "total_posts": len(rows),
+        "next_cursor": next_cursor,
+    }
+
+def rows_to_response_thread(
+    rows: list[sqlite3.Row],
+    post_id: int,
+    nested: bool = True,
+    liked_post_ids: set[int] = frozenset(),
+    following_ids: set[int] = frozenset(),
+) -> dict:
+    """
+    会話のポストのリストを、ResponseThread のJSON表現と同じdictに変換する
+
+    Args:
+        rows (list[sqlite3.Row]): get_post_thread で取得した行のリスト（古い順）
+        post_id (int): 起点のポストID
+        nested (bool, optional): Trueなら返信を replies に入れ子にし、Falseなら会話の順に平坦に並べる
+        liked_post_ids (set[int], optional): 閲覧者がいいねしているポストIDの集合
+        following_ids (set[int], optional): 閲覧者がフォローしているユーザーIDの集合
+
+    Returns:
+        dict: JSONレスポンスにそのまま使えるdict
+    """
+    def to_dict(row: sqlite3.Row) -> dict:
+        return row_to_post_dict(
+            row, row["post_id"] in liked_post_ids, row["user_id"] in following_ids
+        )
+
+    # 古い順に並んでいるので、返信より先に返信元が現れる
+    nodes: dict[int, dict] = {}
+    ancestors = []
+    for row in rows:
+        if row["post_id"] == post_id:
+            node = to_dict(row)
+            node["depth"] = 0
+        elif row["reply_to_id"] in nodes:
+            node = to_dict(row)
+            node["depth"] = nodes[row["reply_to_id"]]["depth"] + 1
+        else:
+            ancestors.append(to_dict(row))
+            continue
+        node["replies"] = []
+        nodes[row["post_id"]] = node
+        if node["depth"] > 0:
+            nodes[row["reply_to_id"]]["replies"].append(node)
+
+    root = nodes.get(post_id)
+    if root is None:
+        posts = []
+    elif nested:
+        posts = [root]
+    else:
+        # 深さ優先で会話の順に並べ、入れ子を外す
+        posts = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            posts.append(node)
+            stack.extend(reversed(node["replies"]))
+            node["replies"] = []
+    return {
+        "ancestors": ancestors,
+        "posts": posts,
+        "total_posts": len(nodes),
+    }
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 # ==================== Request ====================
 class Signup(BaseModel):
@@ -20,7 +21,10 @@ class UpdatePassword(BaseModel):
 
 # ==================== Response ====================
 class ResponseToken(BaseModel):
-    # access_token: str
+    access_token: str
+    token_type: str = "bearer"
+    # 有効期限までの秒数
+    expires_in: int
     username: str
 
 class ResponseUser(BaseModel):
@@ -28,6 +32,20 @@ class ResponseUser(BaseModel):
     biography: str
     avatar_img: str
     created_at: datetime
+    follower_count: int = 0
+    following_count: int = 0
+
+class ResponseUsers(BaseModel):
+    """
+    ユーザー一覧のレスポンス構造
+
+    users (list[ResponseUser]) : ユーザーのリスト
+    total_users (int) : このページに含まれるユーザー数
+    next_cursor (str, optional) : 次ページ取得用のカーソル。最後のページではNone
+    """
+    users: list[ResponseUser]
+    total_users: int
+    next_cursor: Optional[str] = None
 
 # ==================== OTHER ====================
 import sqlite3
@@ -39,4 +57,6 @@ def row_to_response_user(row: sqlite3.Row) -> ResponseUser:
         biography=row["biography"],
         avatar_img=row["avatar_img"],
         created_at=row["created_at"],
+        follower_count=row["follower_count"],
+        following_count=row["following_count"],
     )
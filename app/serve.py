@@ -0,0 +1,119 @@
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uvicorn
+from app.core.conf import (
+    DB_NAME,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_GRACEFUL_TIMEOUT,
+)
+from app.core.log import setup_logging
+from app.db.database import Database
+
+# 本番用のランチャー
+#
+# マイグレーションを親プロセスで1回だけ適用してから、uvicorn のワーカーを
+# workers 個起動する。ワーカーには SNS_DB_INIT_DONE=1 を渡し、起動時のDDLを
+# スキップさせる（ワーカー同士が同時にスキーマを書き換えようとして競合しない）。
+# コネクションプール・キャッシュ・書き込みスレッドはワーカーごとに持つ。
+# ポストのイベント（/posts/stream）は eventsテーブルを通して全ワーカーに配る。
+#
+# 親プロセス（uvicorn のスーパーバイザー）へのシグナル:
+#   SIGHUP          ワーカーを1つずつ再起動する（処理中のリクエストは完了を待つ）
+#   SIGTTIN/SIGTTOU ワーカーを1つ増やす/減らす
+#   SIGINT/SIGTERM  処理中のリクエストの完了を待ってから停止する
+#
+# Example:
+#     python -m app.serve --workers 4 --port 8000
+
+# python -m で実行すると __name__ が "__main__" になるため、名前を固定する
+logger = logging.getLogger("app.serve")
+
+
+def prepare_database() -> None:
+    """
+    未適用のマイグレーションを適用する
+
+    ワーカーを起動する前に親プロセスで1回だけ呼ぶ。
+    """
+    started = time.perf_counter()
+    db = Database(DB_NAME)
+    try:
+        applied = db.migrate()
+    finally:
+        db.close()
+    logger.info(
+        "database ready in %.1f ms (applied migrations: %s)",
+        (time.perf_counter() - started) * 1000,
+        applied or "none",
+    )
+
+
+def prepare_metrics_dir(workers: int) -> str | None:
+    """
+    ワーカー間でメトリクスを合算するためのディレクトリを用意する
+
+    METRICS_DIR が指定されていれば前回の実行のファイルを消して使い、
+    指定が無く複数ワーカーの場合は一時ディレクトリを作る。
+
+    Returns:
+        str | None: 終了時に削除する一時ディレクトリ。削除不要な場合はNone
+    """
+    directory = os.environ.get("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for filename in os.listdir(directory):
+            if filename.endswith((".json", ".tmp")):
+                os.remove(os.path.join(directory, filename))
+        return None
+    if workers <= 1:
+        return None
+    directory = tempfile.mkdtemp(prefix="sns-metrics-")
+    os.environ["METRICS_DIR"] = directory
+    return directory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.serve")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT,
+        help="seconds to wait for in-flight requests on shutdown or reload",
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=None,
+        help="restart a worker after this many requests",
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    setup_logging()
+    prepare_database()
+    os.environ["SNS_DB_INIT_DONE"] = "1"
+    metrics_dir = prepare_metrics_dir(args.workers)
+
+    logger.info("starting %d worker(s) on %s:%d", args.workers, args.host, args.port)
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            limit_max_requests=args.max_requests,
+            log_level=args.log_level,
+        )
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
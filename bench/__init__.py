@@ -0,0 +1,8 @@
+# ベンチマーク
+#
+# 合成データを投入した使い捨てのDBに対して、アプリに実際のHTTPリクエストを送り、
+# シナリオごとのレイテンシ（p50/p95/p99）とスループットを計測する。
+#
+# Example:
+#     python -m bench run --users 1000 --posts 50000 --requests 5000
+#     python -m bench compare bench_results/a.json bench_results/b.json
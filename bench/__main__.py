@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from . import report, seed
+from .driver import DEFAULT_MIX, drive
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """
+    "timeline=50,create_post=10" 形式のシナリオの重みを読む
+    """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name.strip()}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir: Path, port: int, workers: int) -> subprocess.Popen:
+    """
+    作業ディレクトリで uvicorn を起動し、応答するまで待つ
+
+    Raises:
+        RuntimeError: 起動しなかった場合
+    """
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+def run(args: argparse.Namespace) -> None:
+    output = args.output.resolve() if args.output else None
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="sns-bench-")).resolve()
+    (workdir / "data").mkdir(parents=True, exist_ok=True)
+    if any((workdir / "data").iterdir()):
+        sys.exit(f"{workdir / 'data'} is not empty")
+
+    # app はカレントディレクトリの ./data/ にDBを作るため、import する前に移動する
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+    params = {
+        "mode": args.mode,
+        "users": args.users,
+        "posts": args.posts,
+        "follows_per_user": args.follows_per_user,
+        "reply_ratio": args.reply_ratio,
+        "repost_ratio": args.repost_ratio,
+        "zipf_s": args.zipf_s,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "workers": args.workers if args.mode == "uvicorn" else None,
+        "mix": args.mix,
+        "seed": args.seed,
+    }
+    server = None
+    try:
+        from app.db.session import db
+
+        print(f"seeding {args.users} users and {args.posts} posts in {workdir}", file=sys.stderr)
+        seeded = seed.seed(
+            db,
+            users=args.users,
+            posts=args.posts,
+            follows_per_user=args.follows_per_user,
+            reply_ratio=args.reply_ratio,
+            repost_ratio=args.repost_ratio,
+            zipf_s=args.zipf_s,
+            seed=args.seed,
+        )
+        print(f"seeded in {seeded['seconds']:.1f}s", file=sys.stderr)
+        tokens = seed.issue_tokens(db, args.users)
+
+        if args.mode == "inprocess":
+            from app.main import app
+
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://bench"
+            )
+        else:
+            db.close()
+            port = args.port or free_port()
+            server = start_server(workdir, port, args.workers)
+            client = httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}",
+                limits=httpx.Limits(max_connections=args.concurrency),
+                timeout=60,
+            )
+
+        async def main():
+            async with client:
+                return await drive(
+                    client,
+                    tokens=tokens,
+                    posts=args.posts,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    warmup=args.warmup,
+                    mix=args.mix,
+                    zipf_s=args.zipf_s,
+                    seed=args.seed,
+                )
+
+        samples, seconds = asyncio.run(main())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        os.chdir(REPO_ROOT)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "meta": report.environment(REPO_ROOT),
+        "params": params,
+        "seed": seeded,
+        **report.summarize(samples, seconds),
+    }
+    report.print_result(result)
+    path = report.save(result, output, REPO_ROOT)
+    print(f"saved to {path}", file=sys.stderr)
+
+
+def compare(args: argparse.Namespace) -> None:
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    report.compare(base, head)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="seed a database and measure the API")
+    run_parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--posts", type=int, default=50000)
+    run_parser.add_argument("--follows-per-user", type=int, default=50)
+    run_parser.add_argument("--reply-ratio", type=float, default=0.2)
+    run_parser.add_argument("--repost-ratio", type=float, default=0.1)
+    run_parser.add_argument("--zipf-s", type=float, default=1.1)
+    run_parser.add_argument("--requests", type=int, default=5000)
+    run_parser.add_argument("--warmup", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    run_parser.add_argument("--port", type=int, help="uvicorn port (default: a free port)")
+    run_parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--workdir", help="directory for the database (default: a temp dir)")
+    run_parser.add_argument("--keep", action="store_true", help="keep the workdir")
+    run_parser.add_argument("--output", type=Path, help="result JSON path")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+import httpx
+from .seed import SEED_PASSWORD, seed_username, zipf_weights
+
+# 負荷の生成
+#
+# concurrency 個のワーカーが、重み付きのシナリオ表から1つずつ選んで
+# 合計 requests 回のリクエストを送る。シナリオごとに1リクエストの所要時間を記録する。
+# bcrypt を通るログイン・サインアップは重いため、重みを小さくしている。
+
+# シナリオ名と重み
+DEFAULT_MIX = {
+    "timeline": 35,
+    "user_posts": 20,
+    "replies": 15,
+    "get_post": 15,
+    "create_post": 10,
+    "login": 3,
+    "signup": 2,
+}
+
+
+def auth_headers(token: str) -> dict[str, str]:
+    """
+    認証ヘッダーを作る
+
+    認証方式が変わった場合はここだけを書き換える。
+
+    Args:
+        token (str): アクセストークン
+
+    Returns:
+        dict[str, str]: リクエストヘッダー
+    """
+    return {"Authorization": f"Bearer {token}"}
+
+
+class Samples:
+    """シナリオごとの計測結果"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, Counter] = {}
+
+    def record(self, scenario: str, seconds: float, status_code: int) -> None:
+        self.latencies.setdefault(scenario, []).append(seconds)
+        if status_code >= 400:
+            self.errors.setdefault(scenario, Counter())[status_code] += 1
+
+
+class Workload:
+    """
+    シナリオの実装
+
+    各シナリオは1回のHTTPリクエストを送り、そのステータスコードを返す。
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        tokens: list[str],
+        posts: int,
+        zipf_s: float,
+    ):
+        """
+        Args:
+            client (httpx.AsyncClient): アプリに接続済みのクライアント
+            tokens (list[str]): 投入済みのユーザーのアクセストークン（seed.issue_tokens）
+            posts (int): 投入済みのポスト数
+            zipf_s (float): 閲覧対象のユーザーを選ぶジップ分布の指数
+        """
+        self.client = client
+        self.tokens = tokens
+        self.users = len(tokens)
+        self.posts = posts
+        self.weights = list(itertools.accumulate(zipf_weights(self.users, zipf_s)))
+        self._signups = itertools.count()
+
+    def viewer(self, rng: random.Random) -> dict[str, str]:
+        """ランダムに選んだユーザーの認証ヘッダー"""
+        return auth_headers(self.tokens[rng.randrange(self.users)])
+
+    def popular_user(self, rng: random.Random) -> str:
+        index = rng.choices(range(self.users), cum_weights=self.weights)[0]
+        return seed_username(index)
+
+    def post_id(self, rng: random.Random) -> int:
+        # 新しいポストほど閲覧されやすい
+        return max(1, self.posts - int(rng.expovariate(1 / (self.posts / 10 + 1))))
+
+    async def timeline(self, rng: random.Random) -> int:
+        headers = self.viewer(rng)
+        response = await self.client.get("/posts/", headers=headers)
+        # 一部のユーザーは2ページ目まで読む
+        if response.status_code == 200 and rng.random() < 0.2:
+            next_cursor = response.json().get("next_cursor")
+            if next_cursor:
+                response = await self.client.get(
+                    "/posts/", params={"cursor": next_cursor}, headers=headers
+                )
+        return response.status_code
+
+    async def user_posts(self, rng: random.Random) -> int:
+        response = await self.client.get(
+            f"/posts/{self.popular_user(rng)}/posts",
+            headers=self.viewer(rng),
+        )
+        return response.status_code
+
+    async def replies(self, rng: random.Random) -> int:
+        response = await self.client.get(
+            f"/posts/{self.post_id(rng)}/replies",
+            headers=self.viewer(rng),
+        )
+        return response.status_code
+
+    async def get_post(self, rng: random.Random) -> int:
+        response = await self.client.get(
+            f"/posts/{self.post_id(rng)}",
+            headers=self.viewer(rng),
+        )
+        return response.status_code
+
+    async def create_post(self, rng: random.Random) -> int:
+        body = {"content": f"bench {rng.random():.6f}"}
+        if rng.random() < 0.3:
+            body["reply_to_id"] = self.post_id(rng)
+        response = await self.client.post(
+            "/posts/", json=body, headers=self.viewer(rng)
+        )
+        return response.status_code
+
+    async def login(self, rng: random.Random) -> int:
+        response = await self.client.post(
+            "/users/login",
+            json={"username": seed_username(rng.randrange(self.users)), "password": SEED_PASSWORD},
+        )
+        return response.status_code
+
+    async def signup(self, rng: random.Random) -> int:
+        username = f"bench{next(self._signups):06d}_{rng.randrange(1 << 30):x}"
+        response = await self.client.post(
+            "/users/signup",
+            json={"username": username, "password": SEED_PASSWORD},
+        )
+        return response.status_code
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    tokens: list[str],
+    posts: int,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    mix: dict[str, int],
+    zipf_s: float,
+    seed: int,
+) -> tuple[Samples, float]:
+    """
+    負荷をかけて計測する
+
+    Args:
+        client (httpx.AsyncClient): アプリに接続済みのクライアント
+        tokens (list[str]): 投入済みのユーザーのアクセストークン
+        posts (int): 投入済みのポスト数
+        requests (int): 計測するリクエスト数
+        concurrency (int): 同時に実行するリクエスト数
+        warmup (int): 計測前に捨てるリクエスト数
+        mix (dict[str, int]): シナリオ名と重み
+        zipf_s (float): ジップ分布の指数
+        seed (int): 乱数のシード
+
+    Returns:
+        tuple[Samples, float]: 計測結果と、計測区間の経過秒数
+    """
+    workload = Workload(client, tokens, posts, zipf_s)
+    names = list(mix)
+    scenarios: list[Callable[[random.Random], Awaitable[int]]] = [
+        getattr(workload, name) for name in names
+    ]
+    cum_weights = list(itertools.accumulate(mix[name] for name in names))
+
+    async def run(total: int, samples: Samples | None) -> None:
+        remaining = itertools.count()
+
+        async def worker(index: int) -> None:
+            rng = random.Random(seed * 1000 + index)
+            while next(remaining) < total:
+                i = rng.choices(range(len(names)), cum_weights=cum_weights)[0]
+                started = time.perf_counter()
+                try:
+                    status_code = await scenarios[i](rng)
+                except httpx.HTTPError:
+                    status_code = 599
+                if samples is not None:
+                    samples.record(names[i], time.perf_counter() - started, status_code)
+
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+
+    await run(warmup, None)
+    samples = Samples()
+    started = time.perf_counter()
+    await run(requests, samples)
+    return samples, time.perf_counter() - started
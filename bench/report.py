@@ -0,0 +1,183 @@
+import json
+import math
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from .driver import Samples
+
+# 計測結果の集計・保存・比較
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    最近傍順位法でパーセンタイルを求める
+
+    Args:
+        sorted_values (list[float]): 昇順に並んだ値
+        p (float): パーセンタイル（0〜100）
+
+    Returns:
+        float: パーセンタイル値。値が無い場合は0
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: Samples, seconds: float) -> dict:
+    """
+    計測結果をシナリオごとに集計する
+
+    Args:
+        samples (Samples): 計測結果
+        seconds (float): 計測区間の経過秒数
+
+    Returns:
+        dict: 全体のスループットと、シナリオごとの件数・エラー数・レイテンシ（ミリ秒）
+    """
+    scenarios = {}
+    total = errors = 0
+    for name, latencies in sorted(samples.latencies.items()):
+        values = sorted(latencies)
+        error_counts = samples.errors.get(name, {})
+        scenarios[name] = {
+            "count": len(values),
+            "errors": sum(error_counts.values()),
+            "error_status": {str(code): n for code, n in sorted(error_counts.items())},
+            "throughput": round(len(values) / seconds, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+        total += len(values)
+        errors += scenarios[name]["errors"]
+    return {
+        "summary": {
+            "requests": total,
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "throughput": round(total / seconds, 2),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def environment(repo_root: Path) -> dict:
+    """
+    結果を比較するための実行環境の情報を集める
+
+    Args:
+        repo_root (Path): リポジトリのルート
+
+    Returns:
+        dict: コミット、時刻、Python・SQLite のバージョンなど
+    """
+    def git(*args: str) -> str | None:
+        try:
+            result = subprocess.run(
+                ["git", *args], cwd=repo_root, capture_output=True, text=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip()
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def save(result: dict, output: Path | None, repo_root: Path) -> Path:
+    """
+    結果をJSONで保存する
+
+    Args:
+        result (dict): 結果
+        output (Path | None): 保存先。Noneの場合は bench_results/<時刻>_<コミット>.json
+        repo_root (Path): リポジトリのルート
+
+    Returns:
+        Path: 保存したファイルのパス
+    """
+    if output is None:
+        meta = result["meta"]
+        stamp = meta["timestamp"].replace("-", "").replace(":", "")
+        output = repo_root / "bench_results" / f"{stamp}_{meta['commit'] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
+    return output
+
+
+def print_result(result: dict, file=sys.stdout) -> None:
+    """結果を表形式で表示する"""
+    summary = result["summary"]
+    print(
+        f"{summary['requests']} requests in {summary['seconds']:.2f}s "
+        f"({summary['throughput']:.1f} req/s, {summary['errors']} errors)",
+        file=file,
+    )
+    print(
+        f"{'scenario':<12} {'count':>7} {'err':>5} {'req/s':>8} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+        file=file,
+    )
+    for name, s in result["scenarios"].items():
+        print(
+            f"{name:<12} {s['count']:>7} {s['errors']:>5} {s['throughput']:>8.1f} "
+            f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}",
+            file=file,
+        )
+
+
+def compare(base: dict, head: dict, file=sys.stdout) -> None:
+    """
+    2つの結果を比較して、シナリオごとのレイテンシの変化率を表示する
+
+    Args:
+        base (dict): 比較元の結果
+        head (dict): 比較先の結果
+    """
+    def change(old: float, new: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(
+        f"base: {base['meta']['commit']} ({base['meta']['timestamp']})  "
+        f"head: {head['meta']['commit']} ({head['meta']['timestamp']})",
+        file=file,
+    )
+    if base.get("params") != head.get("params"):
+        print("warning: parameters differ between the two runs", file=file)
+    print(
+        f"throughput: {base['summary']['throughput']:.1f} -> "
+        f"{head['summary']['throughput']:.1f} req/s "
+        f"({change(base['summary']['throughput'], head['summary']['throughput'])})",
+        file=file,
+    )
+    print(
+        f"{'scenario':<12} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20}",
+        file=file,
+    )
+    for name in sorted(set(base["scenarios"]) | set(head["scenarios"])):
+        old = base["scenarios"].get(name)
+        new = head["scenarios"].get(name)
+        if old is None or new is None:
+            print(f"{name:<12} only in {'head' if old is None else 'base'}", file=file)
+            continue
+        cells = [
+            f"{old[key]:.2f}->{new[key]:.2f} {change(old[key], new[key]):>7}"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"{name:<12} " + " ".join(f"{cell:>20}" for cell in cells), file=file)
@@ -0,0 +1,172 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+# 合成データの投入
+#
+# N人のユーザー、フォロー関係、M件のポスト（返信・リポストを含む）を直接DBに書き込む。
+# 投稿者・フォロー先はジップ分布で選ぶため、少数の人気ユーザーにポストと
+# フォロワーが集中する（人気ユーザーはファンアウトしない経路も通る）。
+# API を経由しないので、数十万件でも数秒〜数十秒で投入できる。
+
+# 全ての合成ユーザーのパスワード
+SEED_PASSWORD = "password"
+# 1つの INSERT にまとめる行数
+SEED_BATCH_SIZE = 500
+
+
+def seed_username(index: int) -> str:
+    """合成ユーザーのユーザー名"""
+    return f"user{index:06d}"
+
+
+def zipf_weights(n: int, s: float) -> list[float]:
+    """
+    順位 1..n のジップ分布の重みを返す
+
+    Args:
+        n (int): 要素数
+        s (float): 指数（大きいほど上位に集中する）
+
+    Returns:
+        list[float]: 重みのリスト（正規化しない）
+    """
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def seed(
+    db,
+    users: int,
+    posts: int,
+    follows_per_user: int,
+    reply_ratio: float,
+    repost_ratio: float,
+    zipf_s: float,
+    seed: int,
+) -> dict:
+    """
+    合成データを投入する
+
+    Args:
+        db (app.db.database.Database): 投入先のデータベース（マイグレーション済み）
+        users (int): ユーザー数
+        posts (int): ポスト数
+        follows_per_user (int): 1ユーザーあたりのフォロー数
+        reply_ratio (float): ポストのうち返信の割合
+        repost_ratio (float): ポストのうちリポストの割合
+        zipf_s (float): 投稿者・フォロー先を選ぶジップ分布の指数
+        seed (int): 乱数のシード
+
+    Returns:
+        dict: 投入した件数と所要時間
+    """
+    from app.core.password import get_pwd_context
+    from app.crud import feeds
+
+    rng = random.Random(seed)
+    weights = zipf_weights(users, zipf_s)
+    started = time.perf_counter()
+
+    # bcrypt は1回に数百ミリ秒かかるため、全員で同じハッシュを使う
+    password_hash = get_pwd_context().hash(SEED_PASSWORD)
+    with db.connect() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+            ((seed_username(i), password_hash) for i in range(users)),
+        )
+        user_ids = [row[0] for row in cursor.execute("SELECT id FROM users ORDER BY id")]
+
+        # 人気ユーザーほど多くのフォロワーを持つ
+        edges = set()
+        for follower in user_ids:
+            targets = rng.choices(user_ids, weights=weights, k=follows_per_user)
+            edges.update((follower, target) for target in targets if target != follower)
+        cursor.executemany(
+            "INSERT INTO follows (follower_id, following_id) VALUES (?, ?)",
+            sorted(edges),
+        )
+        conn.commit()
+
+        # ポストは過去30日に散らばらせ、古い順に挿入する
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        span = timedelta(days=30).total_seconds()
+        offsets = sorted((rng.random() * span for _ in range(posts)), reverse=True)
+        authors = rng.choices(user_ids, weights=weights, k=posts)
+        post_ids: list[int] = []
+        replies = reposts = 0
+        for start in range(0, posts, SEED_BATCH_SIZE):
+            rows = []
+            for offset, author in zip(
+                offsets[start:start + SEED_BATCH_SIZE],
+                authors[start:start + SEED_BATCH_SIZE],
+            ):
+                created_at = (now - timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+                reply_to_id = repost_of_id = None
+                roll = rng.random()
+                if post_ids and roll < reply_ratio:
+                    # 返信は新しいポストに集まりやすい
+                    reply_to_id = post_ids[-1 - int(rng.expovariate(1 / 50)) % len(post_ids)]
+                    replies += 1
+                elif post_ids and roll < reply_ratio + repost_ratio:
+                    repost_of_id = rng.choice(post_ids)
+                    reposts += 1
+                content = f"post {start + len(rows)} by {author} " + rng.choice(_WORDS)
+                rows.append((author, content, reply_to_id, repost_of_id, created_at))
+            values = ", ".join(["(?, ?, ?, ?, ?)"] * len(rows))
+            cursor.execute(
+                f"""
+                INSERT INTO posts (user_id, content, reply_to_id, repost_of_id, created_at)
+                VALUES {values}
+                RETURNING id
+                """,
+                [value for row in rows for value in row],
+            )
+            batch_ids = sorted(row[0] for row in cursor.fetchall())
+            feeds.fan_out_posts(conn, batch_ids)
+            post_ids += batch_ids
+        feeds.trim_feeds(conn)
+        conn.commit()
+        cursor.execute("PRAGMA optimize")
+
+    return {
+        "users": users,
+        "follows": len(edges),
+        "posts": posts,
+        "replies": replies,
+        "reposts": reposts,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+_WORDS = [
+    "今日はいい天気ですね",
+    "ランチに行ってきた",
+    "新しいリリースが出ました",
+    "週末は何をしようかな",
+    "hello world",
+    "benchmark run",
+    "コーヒーがおいしい",
+    "電車が遅れている",
+]
+
+
+def issue_tokens(db, users: int) -> list[str]:
+    """
+    合成ユーザーのアクセストークンを発行する
+
+    ログインAPIを通すと bcrypt の検証だけで準備に時間がかかるため、
+    サーバーと同じ署名鍵（作業ディレクトリの鍵ファイル）で直接発行する。
+
+    Args:
+        db (app.db.database.Database): 投入済みのデータベース
+        users (int): ユーザー数
+
+    Returns:
+        list[str]: seed_username(i) のトークンを i 番目に持つリスト
+    """
+    from app.core.tokens import issue_token
+
+    with db.connect() as conn:
+        user_ids = dict(conn.execute("SELECT username, id FROM users").fetchall())
+    return [issue_token(user_ids[seed_username(i)])[0] for i in range(users)]